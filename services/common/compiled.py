@@ -0,0 +1,111 @@
+"""Precompiled schema loads for the responses of the backend services.
+
+Handlers build their responses from database rows and load them through the response schemas to
+get the wire format (fullAddress, normalized dates and UUIDs). By default (TRUSTED_INTERNAL_PAYLOADS)
+that load runs a plan compiled once per schema: the declared fields, each with the cheapest
+conversion giving the value marshmallow would, then the schema's post_load hooks. Validators are
+skipped; the output, and so the JSON, is the same as schema.load() gives. A payload the plan cannot
+convert is loaded by the schema itself.
+"""
+
+import os
+import uuid
+from datetime import date, datetime
+
+from marshmallow import INCLUDE, fields, missing
+
+ISO_DATE_FORMATS = (None, "iso", "iso8601", "%Y-%m-%d")
+# The backend responses are built from database rows: their loads only shape them. false validates them field by field
+TRUSTED_INTERNAL_PAYLOADS = os.environ.get("TRUSTED_INTERNAL_PAYLOADS", "true").lower() == "true"
+
+
+def _to_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+
+
+def _date_converter(field):
+    if field.format in ISO_DATE_FORMATS:
+        return lambda value: date.fromisoformat(value)
+    return lambda value: datetime.strptime(value, field.format).date()
+
+
+def _converter(field):
+    """Callable turning a raw value into the loaded one, or None when the value is kept as is"""
+    if isinstance(field, fields.Nested):
+        plan = _compile(field.schema)
+        if plan is None:
+            return field.deserialize
+        if field.many:
+            return lambda value: [plan(item) for item in value]
+        return plan
+    if isinstance(field, fields.List):
+        inner = _converter(field.inner)
+        return (lambda value: [inner(item) for item in value]) if inner else list
+    if isinstance(field, fields.UUID):
+        return _to_uuid
+    if isinstance(field, fields.String):
+        return None
+    if isinstance(field, fields.Integer):
+        return int
+    if isinstance(field, fields.Float):
+        return float
+    if isinstance(field, fields.Date):
+        return _date_converter(field)
+    # Anything else (booleans, datetimes, decimals...) is rare here, marshmallow converts it
+    return field.deserialize
+
+
+def _compile(schema):
+    """Loader of one object for `schema`, or None if the schema uses features the plan does not cover"""
+    hooks = []
+    for tag, processors in schema._hooks.items():
+        if tag in ("pre_load", "validates_schema") and processors:
+            return None
+        if tag != "post_load":
+            continue
+        for attr_name, pass_many, kwargs in processors:
+            if pass_many or kwargs.get("pass_original"):
+                return None
+            hooks.append(getattr(schema, attr_name))
+    if schema.unknown == INCLUDE:
+        return None
+
+    plan = []
+    for name, field in schema.load_fields.items():
+        default = field.load_default
+        plan.append((field.data_key or name, field.attribute or name, _converter(field), default))
+
+    def load(data):
+        result = {}
+        for key, attribute, convert, default in plan:
+            if key in data:
+                value = data[key]
+                result[attribute] = value if convert is None or value is None else convert(value)
+            elif default is not missing:
+                result[attribute] = default() if callable(default) else default
+        for hook in hooks:
+            result = hook(result, many=False, partial=None)
+        return result
+
+    return load
+
+
+class CompiledSchema:
+    """Drop-in for schema.load() on trusted payloads; `trusted=False` validates with the schema"""
+
+    def __init__(self, schema, trusted=TRUSTED_INTERNAL_PAYLOADS):
+        self.schema = schema
+        self.many = schema.many
+        plan = _compile(schema) if trusted else None
+        self._plan = plan
+        if plan is not None and schema.many:
+            self._plan = lambda data: [plan(item) for item in data]
+
+    def load(self, data):
+        if self._plan is None:
+            return self.schema.load(data)
+        try:
+            return self._plan(data)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # Not what our services send: let marshmallow report it
+            return self.schema.load(data)
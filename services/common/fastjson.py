@@ -0,0 +1,72 @@
+"""JSON provider of the backend services' Flask apps (jsonify, request.get_json).
+
+Encodes with orjson when it is installed and with the standard library otherwise, with the same output
+either way: compact UTF-8 with sorted keys, UUIDs as strings and dates and datetimes in ISO 8601
+("2026-03-01"), so handlers can return the values the response schemas loaded as they are.
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date
+from enum import Enum
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encodes the same output more slowly
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps_bytes(value):
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(value):
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    dumps_bytes = _stdlib_dumps_bytes
+    loads = json.loads
+
+
+def dumps(value):
+    return dumps_bytes(value).decode()
+
+
+class FastJSONProvider(JSONProvider):
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Explicit json.dumps options (indent, ...) are only honoured by the standard library
+            kwargs.setdefault("default", _default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
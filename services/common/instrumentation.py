@@ -0,0 +1,133 @@
+"""Metrics, span timings and request deadlines of the backend services' Flask apps.
+
+init_app() registers on an app:
+
+- request and SQL statement latency histograms, served in the Prometheus text format at /manage/metrics
+- request IDs and span timings in the gateway's span format, appended to TRACE_FILE
+  (read with the gateway's python -m src.utils.critical_path)
+- the remaining time budget of the calling gateway request: requests it has stopped waiting for are
+  answered 504 right away, and database statements are bounded by the time left
+"""
+
+import json
+import os
+import time
+
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+# gunicorn workers share their samples through files in PROMETHEUS_MULTIPROC_DIR (see the Dockerfiles)
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency, by statement type", ["statement"], buckets=LATENCY_BUCKETS)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+# Remaining time budget of the calling gateway request, in milliseconds
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# Postgres query_canceled, raised when statement_timeout fires
+QUERY_CANCELED = "57014"
+_span_fd = None
+
+
+def init_app(app, db, service_name):
+    """Instrument `app` and its database `db`; spans are recorded under `service_name`"""
+    app.config.setdefault("SERVICE_NAME", service_name)
+    app.config.setdefault("TRACING_ENABLED", os.environ.get("TRACING_ENABLED", "true").lower() == "true")
+    app.config.setdefault("TRACE_FILE", os.environ.get("TRACE_FILE", f"/tmp/{service_name}.spans"))
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+        if app.config["TRACING_ENABLED"]:
+            g.request_id = request.headers.get(REQUEST_ID_HEADER) or os.urandom(8).hex()
+            g.span_id = os.urandom(8).hex()
+            g.spans = []
+
+    @app.after_request
+    def record_request(response):
+        started_at = g.pop("request_started_at", None)
+        if started_at is None:
+            return response
+        duration = time.perf_counter() - started_at
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(duration)
+        if "spans" in g:
+            status = "error" if response.status_code >= 500 else "ok"
+            record_span(g.span_id, request.headers.get(PARENT_SPAN_HEADER), f"{request.method} {route}", time.time() - duration, duration, status)
+            write_spans(app.config["TRACE_FILE"], g.pop("spans"))
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.route("/manage/metrics", methods=["GET"])
+    def metrics():
+        registry = REGISTRY
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+    @app.before_request
+    def check_deadline():
+        """Skip work the gateway has stopped waiting for, and bound database statements by the time left"""
+        budget = request.headers.get(DEADLINE_HEADER, type=int)
+        if budget is None:
+            return None
+        if budget <= 0:
+            return jsonify({"message": "Deadline exceeded"}), 504
+        if db.engine.dialect.name == "postgresql":
+            # Transaction-local, like SET LOCAL
+            db.session.execute(db.text("SELECT set_config('statement_timeout', :timeout, true)"), {"timeout": str(budget)})
+        return None
+
+    @app.errorhandler(OperationalError)
+    def handle_operational_error(e):
+        db.session.rollback()
+        if getattr(e.orig, "pgcode", None) == QUERY_CANCELED:
+            return jsonify({"message": "Deadline exceeded"}), 504
+        raise e
+
+
+def record_span(span_id, parent_id, name, started_at, duration, status="ok"):
+    """Buffered in the request, written by write_spans"""
+    service_name = current_app.config["SERVICE_NAME"]
+    g.spans.append([g.request_id, span_id, parent_id, service_name, name, int(started_at * 1e6), int(duration * 1e6), status])
+
+
+def write_spans(path, records):
+    global _span_fd
+    try:
+        if _span_fd is None:
+            _span_fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # One O_APPEND write per request, so workers never interleave lines
+        os.write(_span_fd, b"".join(json.dumps(record, separators=(",", ":")).encode() + b"\n" for record in records))
+    except OSError:
+        pass
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info["query_started_at"].pop()
+    duration = time.perf_counter() - started_at
+    statement_type = statement.split(None, 1)[0].upper()
+    QUERY_SECONDS.labels(statement_type).observe(duration)
+    if has_request_context() and "spans" in g:
+        record_span(os.urandom(8).hex(), g.span_id, f"db {statement_type}", time.time() - duration, duration)
+
+
+@event.listens_for(Engine, "handle_error")
+def drop_query_timer(context):
+    started = context.connection.info.get("query_started_at") if context.connection is not None else None
+    if started:
+        started.pop()
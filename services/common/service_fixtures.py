@@ -0,0 +1,75 @@
+"""pytest fixtures of the backend services, imported by their tests/conftest.py.
+
+The service under test is the app.py of the directory pytest runs from.
+"""
+
+import os
+import re
+
+# SQLite stand-in by default; point DATABASE_URL at a scratch Postgres database to check its planner too
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import event
+
+from app import app as flask_app, db, migrate
+from serving import upgrade_database
+
+# SQLite reports a full table scan as "SCAN <table>" ("SCAN TABLE <table>" before 3.36), without "USING ... INDEX"
+SQLITE_SCAN = re.compile(r"^SCAN (TABLE )?\w+( AS \w+)?$")
+PLANNED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+@pytest.fixture
+def app():
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        # Build the schema through the migrations, so the test covers the indexes they create
+        upgrade_database(flask_app, migrate.directory)
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def explain(statement, parameters):
+    """Plan lines of a captured statement, with sequential scans discouraged on Postgres so any usable index wins"""
+    with db.engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        return [row[0] for row in connection.exec_driver_sql("EXPLAIN " + statement, parameters)]
+
+
+def is_sequential_scan(line):
+    return bool(SQLITE_SCAN.match(line)) or "Seq Scan" in line
+
+
+@pytest.fixture
+def sequential_scans(app):
+    """Runs `action` and returns (statement, plan) for every statement it issued that scans a whole table"""
+
+    def run(action):
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(PLANNED_STATEMENTS):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            action()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        assert statements, "the action issued no query"
+        plans = [(statement, explain(statement, parameters)) for statement, parameters in statements]
+        return [(statement, plan) for statement, plan in plans if any(is_sequential_scan(line) for line in plan)]
+
+    return run
@@ -0,0 +1,53 @@
+"""Database upgrades and production server of the backend services' Flask apps."""
+
+import os
+import shutil
+
+from flask_migrate import stamp, upgrade
+
+
+def upgrade_database(app, directory):
+    """Apply the pending migrations in `directory`, in an app context. Databases bootstrapped by the former
+    db.create_all() have the schema but no alembic_version table, so they are stamped at the initial revision first."""
+    db = app.extensions["sqlalchemy"]
+    inspector = db.inspect(db.engine)
+    if not inspector.has_table("alembic_version") and any(inspector.has_table(table) for table in db.metadata.tables):
+        stamp(directory=directory, revision="0001_initial")
+    upgrade(directory=directory)
+
+
+def serve(app, db, port):
+    """gunicorn with WEB_WORKERS prefork workers of WEB_THREADS threads each, whose workers are
+    restarted gracefully on SIGHUP. SERVER=development runs Flask's single-process server."""
+    if os.environ.get("SERVER", "gunicorn") == "development":
+        app.run(host="0.0.0.0", port=port)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        "bind": f"0.0.0.0:{port}",
+        "workers": int(os.environ.get("WEB_WORKERS", str(min(os.cpu_count() or 1, 4)))),
+        "threads": int(os.environ.get("WEB_THREADS", "4")),
+        "worker_class": "gthread",
+        "timeout": int(os.environ.get("WEB_TIMEOUT", "60")),
+        "graceful_timeout": int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30")),
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for name, value in options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return app
+
+    # Connections opened by the migrations must not be shared by the forked workers
+    with app.app_context():
+        db.engine.dispose()
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        # Samples of a previous run
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+    Application().run()
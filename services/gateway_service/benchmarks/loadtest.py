@@ -0,0 +1,337 @@
+"""Load test of the gateway against local stub services.
+
+Starts benchmarks/stubs.py and benchmarks/local_gateway.py, drives every /api/v1 route at a fixed
+request rate and reports p50/p95/p99 latency and throughput per route. Results are saved as JSON
+under benchmarks/results/, named after the time and the commit, so runs can be compared:
+
+    python benchmarks/loadtest.py run [--rps 200] [--duration 30] [--latency 5] [--error-rate 0.01] [--outage payment:10-20]
+    python benchmarks/loadtest.py compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Requests are sent open loop: each one is scheduled at a fixed time and its latency is measured
+from then, so a slow gateway shows up as latency rather than as a lower request rate. --gateway-url
+drives an already running gateway instead (the stub options then have no effect).
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [GATEWAY_DIR, os.path.join(os.path.dirname(GATEWAY_DIR), "common")]
+
+from benchmarks import stubs  # noqa: E402
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCHMARKS_DIR)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+# route: weight in the request mix
+DEFAULT_MIX = {
+    "GET /hotels": 30,
+    "GET /hotels?after": 5,
+    "GET /reservations": 15,
+    "GET /reservations/<uid>": 15,
+    "POST /reservations": 10,
+    "DELETE /reservations/<uid>": 5,
+    "GET /me": 10,
+    "GET /loyalty": 10,
+}
+
+
+def hotel_uid(index):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"hotel/{index}"))
+
+
+def send(session, base_url, route, username):
+    """One request of `route` for `username`; returns the response status"""
+    headers = {"X-User-Name": username}
+    if route == "GET /hotels":
+        response = session.get(f"{base_url}/api/v1/hotels", params={"page": random.randint(1, 10), "size": 10})
+    elif route == "GET /hotels?after":
+        response = session.get(f"{base_url}/api/v1/hotels", params={"after": hotel_uid(random.randrange(stubs.HOTEL_COUNT)), "size": 10})
+    elif route == "GET /reservations":
+        response = session.get(f"{base_url}/api/v1/reservations", headers=headers)
+    elif route == "GET /reservations/<uid>":
+        reservation_uid = random.choice(stubs.reservation_uids(username))
+        response = session.get(f"{base_url}/api/v1/reservations/{reservation_uid}", headers=headers)
+    elif route == "POST /reservations":
+        body = {"hotelUid": hotel_uid(random.randrange(stubs.HOTEL_COUNT)), "startDate": "2026-01-01", "endDate": "2026-01-04"}
+        response = session.post(f"{base_url}/api/v1/reservations", json=body, headers=dict(headers, **{"Idempotency-Key": str(uuid.uuid4())}))
+    elif route == "DELETE /reservations/<uid>":
+        reservation_uid = random.choice(stubs.reservation_uids(username))
+        response = session.delete(
+            f"{base_url}/api/v1/reservations/{reservation_uid}", headers=dict(headers, **{"Idempotency-Key": str(uuid.uuid4())})
+        )
+    elif route == "GET /me":
+        response = session.get(f"{base_url}/api/v1/me", headers=headers)
+    elif route == "GET /loyalty":
+        response = session.get(f"{base_url}/api/v1/loyalty", headers=headers)
+    else:
+        raise ValueError(f"unknown route {route}")
+    return response.status_code
+
+
+def parse_mix(value):
+    """"GET /hotels=3,GET /me=1" -> {"GET /hotels": 3, "GET /me": 1}"""
+    mix = {}
+    for item in value.split(","):
+        route, weight = item.rsplit("=", 1)
+        if route not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown route {route}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[route] = float(weight)
+    return mix
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(int(round(fraction * len(ordered) + 0.5)) - 1, 0))]
+
+
+def summarize(samples, duration):
+    """samples: [(latency seconds, status or None on a connection error)]"""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 500)
+    summary = {"requests": len(samples), "errors": errors, "throughput": round(len(samples) / duration, 1)}
+    for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+        value = percentile(latencies, fraction)
+        summary[name] = None if value is None else round(value * 1000, 2)
+    return summary
+
+
+class LoadGenerator:
+    def __init__(self, base_url, mix, rps, users, concurrency):
+        self.base_url = base_url
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.rps = rps
+        self.users = [f"user-{index}" for index in range(users)]
+        self.concurrency = concurrency
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+        return session
+
+    def _request(self, route, scheduled_at, record):
+        try:
+            status = send(self.session(), self.base_url, route, random.choice(self.users))
+        except requests.RequestException:
+            status = None
+        if record:
+            latency = time.perf_counter() - scheduled_at
+            with self._lock:
+                self.samples.setdefault(route, []).append((latency, status))
+
+    def run(self, duration, warmup=0.0):
+        """Send requests for warmup + duration seconds; only those scheduled after the warmup count"""
+        total = int((warmup + duration) * self.rps)
+        warmup_requests = int(warmup * self.rps)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as executor:
+            started_at = time.perf_counter()
+            for index in range(total):
+                scheduled_at = started_at + index / self.rps
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                route = random.choices(self.routes, self.weights)[0]
+                executor.submit(self._request, route, scheduled_at, index >= warmup_requests)
+        return self.samples
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout} s")
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=SERVICE_DIR, capture_output=True, text=True).stdout.strip()
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+class LocalStack:
+    """Stub services and the gateway as child processes"""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.workdir = tempfile.mkdtemp(prefix="gateway-loadtest-")
+
+    def __enter__(self):
+        args = self.args
+        stub_command = [sys.executable, os.path.join(BENCHMARKS_DIR, "stubs.py"), "--latency", str(args.latency), "--jitter", str(args.jitter)]
+        stub_command += ["--error-rate", str(args.error_rate)]
+        for service, start, end in args.outage:
+            # Outage windows are relative to the start of the measurement
+            stub_command += ["--outage", f"{service}:{start + args.warmup}-{end + args.warmup}"]
+        for service, port in stubs.ports_from(args).items():
+            stub_command += [f"--{service}-port", str(port)]
+        self.processes.append(subprocess.Popen(stub_command, stdout=subprocess.DEVNULL))
+
+        env = dict(
+            os.environ,
+            GATEWAY_HOST="127.0.0.1",
+            GATEWAY_PORT=str(args.gateway_port),
+            GATEWAY_WORKERS=str(args.workers),
+            RESERVATION_SERVICE_URL=f"http://127.0.0.1:{args.reservation_port}",
+            PAYMENT_SERVICE_URL=f"http://127.0.0.1:{args.payment_port}",
+            LOYALTY_SERVICE_URL=f"http://127.0.0.1:{args.loyalty_port}",
+            CIRCUIT_BREAKER_STATE_DIR=self.workdir,
+            IDEMPOTENCY_DB_PATH=os.path.join(self.workdir, "idempotency.sqlite3"),
+            LOYALTY_CACHE_VERSIONS_PATH=os.path.join(self.workdir, "loyalty-cache.versions"),
+            TRACE_FILE=os.path.join(self.workdir, "gateway.spans"),
+            PROMETHEUS_MULTIPROC_DIR=os.path.join(self.workdir, "metrics"),
+        )
+        log = open(os.path.join(self.workdir, "gateway.log"), "w")
+        self.processes.append(
+            subprocess.Popen([sys.executable, os.path.join(BENCHMARKS_DIR, "local_gateway.py")], cwd=SERVICE_DIR, env=env, stdout=log, stderr=log)
+        )
+        log.close()
+        for service, port in stubs.ports_from(args).items():
+            wait_until_up(f"http://127.0.0.1:{port}/manage/health")
+        wait_until_up(f"http://127.0.0.1:{args.gateway_port}/manage/health")
+        return f"http://127.0.0.1:{args.gateway_port}"
+
+    def __exit__(self, *exc_info):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def print_summary(result):
+    print(f"{'route':<28}{'requests':>9}{'errors':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, summary in list(result["routes"].items()) + [("total", result["total"])]:
+        print(
+            f"{route:<28}{summary['requests']:>9}{summary['errors']:>8}{summary['throughput']:>8}"
+            + "".join(f"{summary[name]:>9}" for name in ("p50", "p95", "p99", "max"))
+        )
+
+
+def run(args):
+    mix = args.mix or DEFAULT_MIX
+    stack = None if args.gateway_url else LocalStack(args)
+    base_url = stack.__enter__() if stack else args.gateway_url
+    try:
+        generator = LoadGenerator(base_url, mix, args.rps, args.users, args.concurrency)
+        samples = generator.run(args.duration, args.warmup)
+        queue_stats = requests.get(f"{base_url}/manage/queue", timeout=5).json()
+    finally:
+        if stack:
+            stack.__exit__(None, None, None)
+
+    result = {
+        "commit": git_commit(),
+        "label": args.label,
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "rps": args.rps,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "workers": None if args.gateway_url else args.workers,
+            "mix": mix,
+            "stubs": None
+            if args.gateway_url
+            else {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate, "outages": args.outage},
+        },
+        "routes": {route: summarize(samples.get(route, []), args.duration) for route in mix},
+        "total": summarize([sample for route_samples in samples.values() for sample in route_samples], args.duration),
+        "retry_queue": queue_stats,
+    }
+    print_summary(result)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['commit']}{'-' + args.label if args.label else ''}.json"
+    path = os.path.join(args.output_dir, name)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved to {path}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["config"] != candidate["config"]:
+        print("Warning: the runs used different settings\n", file=sys.stderr)
+
+    print(f"{baseline['commit']} -> {candidate['commit']}\n")
+    print(f"{'route':<28}{'metric':>8}{'before':>10}{'after':>10}{'change':>10}")
+    routes = list(baseline["routes"]) + [route for route in candidate["routes"] if route not in baseline["routes"]]
+    for route in routes + ["total"]:
+        before = baseline["total"] if route == "total" else baseline["routes"].get(route)
+        after = candidate["total"] if route == "total" else candidate["routes"].get(route)
+        if not before or not after:
+            continue
+        for metric in ("p50", "p95", "p99", "throughput", "errors"):
+            old, new = before[metric], after[metric]
+            change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ""
+            print(f"{route:<28}{metric:>8}{old if old is not None else '-':>10}{new if new is not None else '-':>10}{change:>10}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a load test and save its results")
+    run_parser.add_argument("--rps", type=float, default=200, help="target request rate")
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    run_parser.add_argument("--users", type=int, default=100)
+    run_parser.add_argument("--concurrency", type=int, default=64, help="client threads, the most requests in flight")
+    run_parser.add_argument("--mix", type=parse_mix, help="route=weight,... (default: every route, see DEFAULT_MIX)")
+    run_parser.add_argument("--workers", type=int, default=2, help="gateway worker processes")
+    run_parser.add_argument("--gateway-port", type=int, default=18080)
+    run_parser.add_argument("--gateway-url", help="load an already running gateway instead")
+    run_parser.add_argument("--label", help="appended to the result file name")
+    run_parser.add_argument("--output-dir", default=RESULTS_DIR)
+    stubs.add_arguments(run_parser)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""The gateway under gunicorn, as in production, with an in-memory stand-in for RabbitMQ.
+
+    python benchmarks/local_gateway.py
+
+Reads the usual gateway settings from the environment; point RESERVATION_SERVICE_URL,
+PAYMENT_SERVICE_URL and LOYALTY_SERVICE_URL at benchmarks/stubs.py. Retry operations are counted
+by LocalBroker instead of being sent to a broker, see /manage/queue. No retry worker is started.
+"""
+
+import os
+import sys
+import threading
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [GATEWAY_DIR, os.path.join(os.path.dirname(GATEWAY_DIR), "common")]
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+from src import create_app  # noqa: E402
+from src.metrics import RETRY_PUBLISHED  # noqa: E402
+from src.queue.publisher import RetryPublisher  # noqa: E402
+from src.serving import gunicorn_options  # noqa: E402
+
+
+class LocalBroker:
+    """Accepts retry operations in place of RetryPublisher and keeps per-operation counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def publish(self, operation_type, payload, username, idempotency_key=None):
+        with self._lock:
+            self.operations[operation_type] = self.operations.get(operation_type, 0) + 1
+        RETRY_PUBLISHED.labels("accepted").inc()
+        return True
+
+    def stats(self):
+        with self._lock:
+            operations = dict(self.operations)
+        return {"accepted": sum(operations.values()), "operations": operations, "pid": os.getpid(), "connected": False}
+
+    def flush(self, timeout=5):
+        return True
+
+    def close(self, timeout=5):
+        pass
+
+    @classmethod
+    def install(cls):
+        with RetryPublisher._shared_lock:
+            RetryPublisher._shared = cls()
+            RetryPublisher._shared_pid = os.getpid()
+
+
+class LocalGatewayApplication(BaseApplication):
+    def load_config(self):
+        for name, value in gunicorn_options().items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        # Runs in each worker after the fork, like RetryPublisher.shared()
+        LocalBroker.install()
+        return create_app()
+
+
+if __name__ == "__main__":
+    LocalGatewayApplication().run()
@@ -0,0 +1,275 @@
+"""CPU cost of the gateway's per-request hot paths, each run in isolation on realistic payloads.
+
+Covers the marshmallow loads of downstream responses (HotelInfoSchema.create_full_address, the
+date round trip of ReservationResponseSchema.change_dates_to_str, HotelPaginationSchema) and their
+precompiled plans (src/schemas/compiled.py), payment enrichment of reservation lists and the
+overhead of circuit_breaker_request around a request answered in-process, next to the bare
+session call and schema load it wraps.
+
+    python benchmarks/micro.py run [--filter reservation] [--save benchmarks/baselines/micro.json]
+    python benchmarks/micro.py compare [--baseline benchmarks/baselines/micro.json] [--threshold 0.2] [results.json]
+
+compare runs the suite (or reads a saved run) and exits with 1 if a case got slower than its
+baseline by more than the threshold. Timings depend on the machine: refresh the baseline with
+`run --save` on the machine the comparisons run on.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+
+os.environ.setdefault("CIRCUIT_BREAKER_STATE_DIR", tempfile.mkdtemp())
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [GATEWAY_DIR, os.path.join(os.path.dirname(GATEWAY_DIR), "common")]
+
+import requests  # noqa: E402
+from requests.adapters import BaseAdapter  # noqa: E402
+
+from src.pool.session import SessionFactory  # noqa: E402
+from src.schemas.compiled import CompiledSchema  # noqa: E402
+from src.schemas.hotel import HotelInfoSchema, HotelPaginationSchema  # noqa: E402
+from src.schemas.loyalty import LoyaltySchema  # noqa: E402
+from src.schemas.payment import PaymentSchema  # noqa: E402
+from src.schemas.reservation import ReservationResponseSchema  # noqa: E402
+from src.services.base import BaseServiceClient  # noqa: E402
+from src.services.reservation import ReservationService  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+BENCH_URL = "http://bench.invalid"
+# Reservation lists of a typical, a heavy and an extreme user
+LIST_SIZES = (10, 100, 1000)
+
+
+def hotel(index):
+    return {
+        "hotelUid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"hotel/{index}")),
+        "name": f"Ararat Park Hyatt {index}",
+        "country": "Россия",
+        "city": "Москва",
+        "address": f"Неглинная ул., {index}",
+        "stars": index % 5 + 1,
+        "price": 10000 + index,
+    }
+
+
+def reservation(index):
+    return {
+        "reservationUid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"reservation/{index}")),
+        "hotel": {key: value for key, value in hotel(index).items() if key != "price"},
+        "startDate": "2026-03-01",
+        "endDate": "2026-03-05",
+    }
+
+
+def payment(index):
+    return {"paymentUid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"payment/{index}")), "status": "PAID", "price": 9000 + index}
+
+
+class CannedAdapter(BaseAdapter):
+    """Answers every request with the same JSON body, without any I/O"""
+
+    def __init__(self, body):
+        super().__init__()
+        self.body = json.dumps(body).encode()
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = self.body
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class CannedPayments:
+    """PaymentService answering the bulk lookup from memory"""
+
+    def __init__(self, reservations):
+        self.items = {str(item["reservationUid"]): payment(index) for index, item in enumerate(reservations)}
+
+    def get_payments(self, username, reservation_uids):
+        # A fresh dict per payment, as decoding the response body would give
+        return {uid: dict(self.items[uid]) for uid in reservation_uids}
+
+
+def canned_session(service_name, body):
+    session = SessionFactory.get_session(service_name)
+    session.mount(BENCH_URL, CannedAdapter(body))
+    return session
+
+
+def cases():
+    """name -> zero-argument callable"""
+    cases = {}
+
+    hotel_info = HotelInfoSchema()
+    cases["HotelInfoSchema.load"] = lambda: hotel_info.load(reservation(0)["hotel"])
+
+    single = ReservationResponseSchema()
+    cases["ReservationResponseSchema.load"] = lambda: single.load(reservation(0))
+    many = ReservationResponseSchema(many=True)
+    for size in LIST_SIZES:
+        payload = [reservation(index) for index in range(size)]
+        cases[f"ReservationResponseSchema.load many={size}"] = lambda payload=payload: many.load(payload)
+    compiled_many = CompiledSchema(many)
+    for size in LIST_SIZES:
+        payload = [reservation(index) for index in range(size)]
+        cases[f"CompiledSchema(ReservationResponseSchema) many={size}"] = lambda payload=payload: compiled_many.load(payload)
+
+    pagination = HotelPaginationSchema()
+    for size in (10, 100):
+        page = {"page": 1, "pageSize": size, "totalElements": 1000, "items": [hotel(index) for index in range(size)], "nextCursor": None}
+        cases[f"HotelPaginationSchema.load size={size}"] = lambda page=page: pagination.load(page)
+        compiled_pagination = CompiledSchema(pagination)
+        cases[f"CompiledSchema(HotelPaginationSchema) size={size}"] = lambda page=page: compiled_pagination.load(page)
+
+    payment_schema, loyalty_schema = PaymentSchema(), LoyaltySchema()
+    cases["PaymentSchema.load"] = lambda: payment_schema.load(payment(0))
+    cases["LoyaltySchema.load"] = lambda: loyalty_schema.load({"status": "GOLD", "discount": 10, "reservationCount": 25})
+
+    for size in LIST_SIZES:
+        loaded = many.load([reservation(index) for index in range(size)])
+        service = ReservationService(payment_service=CannedPayments(loaded), loyalty_service=object(), idempotency_store=object())
+        cases[f"ReservationService._enrich_reservations n={size}"] = lambda service=service, loaded=loaded: service._enrich_reservations(
+            "bench", loaded
+        )
+
+    # The same in-process request bare and through circuit_breaker_request (breaker, deadline,
+    # trace headers, metrics), with and without the schema load
+    client = BaseServiceClient()
+    session = canned_session("bench-loyalty", {"status": "GOLD", "discount": 10, "reservationCount": 25})
+    url = f"{BENCH_URL}/loyalty"
+    headers = {"X-User-Name": "bench"}
+    cases["session.request"] = lambda: session.request("GET", url, headers=headers, timeout=(2, 10)).json()
+    cases["session.request + LoyaltySchema.load"] = lambda: loyalty_schema.load(
+        session.request("GET", url, headers=headers, timeout=(2, 10)).json()
+    )
+    cases["circuit_breaker_request"] = lambda: client.circuit_breaker_request("bench-loyalty", "GET", url, headers=headers)
+    cases["circuit_breaker_request + LoyaltySchema.load"] = lambda: client.circuit_breaker_request(
+        "bench-loyalty", "GET", url, headers=headers, schema=loyalty_schema
+    )
+    return cases
+
+
+def calibrate(timer, min_time):
+    """Loops per timed run, so that a run takes at least `min_time` seconds"""
+    loops = 1
+    while timer.timeit(loops) < min_time:
+        loops *= 2
+    return loops
+
+
+def run_suite(name_filter=None, repeat=7, min_time=0.2):
+    """Best and median time per call in microseconds of every case, over `repeat` timed runs.
+    Runs go round-robin over the cases, so a burst of noise does not hit every run of one case."""
+    timers = {name: timeit.Timer(func) for name, func in cases().items() if not name_filter or name_filter.lower() in name.lower()}
+    loops = {name: calibrate(timer, min_time) for name, timer in timers.items()}
+    runs = {name: [] for name in timers}
+    for _ in range(repeat):
+        for name, timer in timers.items():
+            runs[name].append(timer.timeit(loops[name]) / loops[name] * 1e6)
+
+    results = {}
+    for name in timers:
+        results[name] = {"best_us": round(min(runs[name]), 3), "median_us": round(statistics.median(runs[name]), 3), "loops": loops[name]}
+        print(f"{name:<52}{results[name]['best_us']:>12.1f} us{results[name]['median_us']:>12.1f} us")
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": results,
+    }
+
+
+def regressions(baseline, candidate, threshold):
+    """[(case, baseline us, candidate us, change)] slower than baseline by more than `threshold`"""
+    slower = []
+    for name, result in candidate["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        change = result["best_us"] / before["best_us"] - 1
+        if change > threshold:
+            slower.append((name, before["best_us"], result["best_us"], change))
+    return slower
+
+
+def run(args):
+    print(f"{'case':<52}{'best':>15}{'median':>15}")
+    result = run_suite(args.filter, args.repeat, args.min_time)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nSaved to {args.save}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.results:
+        with open(args.results) as f:
+            candidate = json.load(f)
+    else:
+        print(f"{'case':<52}{'best':>15}{'median':>15}")
+        candidate = run_suite(args.filter, args.repeat, args.min_time)
+        print()
+    if (baseline["python"], baseline["machine"]) != (candidate["python"], candidate["machine"]):
+        print(f"Warning: baseline from Python {baseline['python']} on {baseline['machine']}\n", file=sys.stderr)
+
+    print(f"{'case':<52}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, result in candidate["cases"].items():
+        before = baseline["cases"].get(name)
+        change = f"{result['best_us'] / before['best_us'] - 1:+.1%}" if before else "new"
+        print(f"{name:<52}{before['best_us'] if before else '-':>12}{result['best_us']:>12}{change:>10}")
+
+    slower = regressions(baseline, candidate, args.threshold)
+    if slower:
+        print(f"\n{len(slower)} case(s) slower than the baseline by more than {args.threshold:.0%}:")
+        for name, before, after, change in slower:
+            print(f"  {name}: {before} -> {after} us ({change:+.1%})")
+        return 1
+    print(f"\nNo case slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_suite_arguments(command):
+        command.add_argument("--filter", help="only cases whose name contains this")
+        command.add_argument("--repeat", type=int, default=7, help="timed runs per case")
+        command.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timed run")
+
+    run_parser = commands.add_parser("run", help="run the suite")
+    add_suite_arguments(run_parser)
+    run_parser.add_argument("--save", help="write the results to this file, e.g. the baseline")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against the baseline")
+    add_suite_arguments(compare_parser)
+    compare_parser.add_argument("results", nargs="?", help="saved run to compare instead of running the suite")
+    compare_parser.add_argument("--baseline", default=BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
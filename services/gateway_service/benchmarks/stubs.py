@@ -0,0 +1,253 @@
+"""Local stand-ins for the reservation, payment and loyalty services.
+
+They answer the API subset the gateway calls, from memory, with tunable latency, error rate and
+outage windows, so the gateway can be load tested without databases:
+
+    python benchmarks/stubs.py [--latency 20] [--jitter 5] [--error-rate 0.01] [--outage payment:10-20]
+
+Latency is in milliseconds, outage windows in seconds since start; during an outage the service
+answers 503. Every user has a few seeded reservations, see reservation_uids().
+"""
+
+import argparse
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+SERVICES = ("reservation", "payment", "loyalty")
+DEFAULT_PORTS = {"reservation": 18070, "payment": 18060, "loyalty": 18050}
+HOTEL_COUNT = 100
+RESERVATIONS_PER_USER = 5
+
+
+def reservation_uids(username):
+    """Seeded reservations of a user, stable across runs"""
+    return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{username}/{index}")) for index in range(RESERVATIONS_PER_USER)]
+
+
+def parse_outage(value):
+    """"payment:10-20" -> ("payment", 10.0, 20.0)"""
+    service, window = value.split(":", 1)
+    start, end = window.split("-", 1)
+    if service not in SERVICES:
+        raise argparse.ArgumentTypeError(f"unknown service {service}")
+    return service, float(start), float(end)
+
+
+class Behaviour:
+    """Latency, errors and outages of one stub service"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, outages=(), started_at=None):
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.outages = list(outages)
+        self.started_at = time.monotonic() if started_at is None else started_at
+
+    def in_outage(self):
+        elapsed = time.monotonic() - self.started_at
+        return any(start <= elapsed < end for start, end in self.outages)
+
+    def apply(self):
+        """None to answer normally, or the error response to send instead"""
+        if self.in_outage():
+            return jsonify({"message": "Service unavailable (stub outage)"}), 503
+        delay = max(random.gauss(self.latency, self.jitter), 0) if self.jitter else self.latency
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return jsonify({"message": "Internal error (stub)"}), 500
+        return None
+
+
+def create_stub(service, behaviour):
+    app = Flask(f"stub-{service}")
+    lock = threading.Lock()
+
+    @app.before_request
+    def misbehave():
+        if request.path != "/manage/health":
+            return behaviour.apply()
+        return None
+
+    @app.route("/manage/health")
+    def health():
+        return jsonify({"status": "OK"})
+
+    if service == "reservation":
+        hotels = [
+            {
+                "hotelUid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"hotel/{index}")),
+                "name": f"Hotel {index}",
+                "country": "Россия",
+                "city": "Москва",
+                "address": f"ул. Тверская, {index}",
+                "stars": index % 5 + 1,
+                "price": 1000 + index * 100,
+            }
+            for index in range(HOTEL_COUNT)
+        ]
+        hotels_by_uid = {hotel["hotelUid"]: hotel for hotel in hotels}
+        created = {}
+
+        def reservation(reservation_uid, hotel):
+            start = date(2026, 1, 1)
+            return {
+                "reservationUid": reservation_uid,
+                "hotel": {key: hotel[key] for key in ("hotelUid", "name", "country", "city", "address", "stars")},
+                "startDate": start.isoformat(),
+                "endDate": (start + timedelta(days=3)).isoformat(),
+            }
+
+        def user_reservations(username):
+            return [reservation(uid, hotels[index]) for index, uid in enumerate(reservation_uids(username))]
+
+        @app.route("/hotels")
+        def get_hotels():
+            page = request.args.get("page", 1, type=int)
+            size = request.args.get("size", 10, type=int)
+            items = hotels[(page - 1) * size : page * size]
+            return jsonify({"page": page, "pageSize": size, "totalElements": len(hotels), "items": items, "nextCursor": None})
+
+        @app.route("/hotels/<hotel_uid>")
+        def get_hotel(hotel_uid):
+            hotel = hotels_by_uid.get(hotel_uid)
+            return (jsonify(hotel), 200) if hotel else (jsonify({"message": "Hotel not found"}), 404)
+
+        @app.route("/reservations", methods=["GET", "POST"])
+        def reservations():
+            username = request.headers.get("X-User-Name")
+            if request.method == "GET":
+                return jsonify(user_reservations(username))
+            data = request.json or {}
+            hotel = hotels_by_uid.get(data.get("hotelUid"))
+            if hotel is None:
+                return jsonify({"message": "Hotel not found"}), 404
+            reservation_uid = str(uuid.uuid4())
+            with lock:
+                created[reservation_uid] = (username, hotel)
+            return jsonify(
+                {
+                    "reservationUid": reservation_uid,
+                    "hotelUid": hotel["hotelUid"],
+                    "price": hotel["price"],
+                    "startDate": data.get("startDate", "2026-01-01"),
+                    "endDate": data.get("endDate", "2026-01-04"),
+                }
+            )
+
+        @app.route("/reservations/<reservation_uid>", methods=["GET", "DELETE"])
+        def get_reservation(reservation_uid):
+            username = request.headers.get("X-User-Name")
+            seeded = reservation_uids(username)
+            with lock:
+                known = reservation_uid in seeded or reservation_uid in created
+            if not known:
+                return jsonify({"message": "Reservation not found"}), 404
+            if request.method == "DELETE":
+                return jsonify({"message": "Reservation canceled"}), 204
+            hotel = hotels[seeded.index(reservation_uid)] if reservation_uid in seeded else created[reservation_uid][1]
+            return jsonify(reservation(reservation_uid, hotel))
+
+    elif service == "payment":
+
+        def payment(reservation_uid):
+            return {"paymentUid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"payment/{reservation_uid}")), "status": "PAID", "price": 3000}
+
+        @app.route("/payment", methods=["POST"])
+        def create_payment():
+            data = request.json or {}
+            return jsonify(dict(payment(data.get("reservationUid")), price=data.get("price", 3000)))
+
+        @app.route("/payment/batch", methods=["POST"])
+        def get_payments():
+            uids = (request.json or {}).get("reservationUids", [])
+            return jsonify({"items": {uid: payment(uid) for uid in uids}})
+
+        @app.route("/payment/<uid>", methods=["GET"])
+        def get_payment(uid):
+            return jsonify(payment(uid))
+
+        @app.route("/payment/<uid>", methods=["DELETE"])
+        def cancel_payment(uid):
+            return jsonify({"message": "Payment canceled"}), 204
+
+    else:
+        counts = {}
+
+        def loyalty(count):
+            status, discount = ("GOLD", 10) if count >= 20 else ("SILVER", 7) if count >= 10 else ("BRONZE", 5)
+            return {"status": status, "discount": discount, "reservationCount": count}
+
+        @app.route("/loyalty", methods=["GET", "POST"])
+        def get_loyalty():
+            username = request.headers.get("X-User-Name")
+            with lock:
+                if request.method == "POST":
+                    counts[username] = counts.get(username, 0) + 1
+                count = counts.get(username, 0)
+            return jsonify(loyalty(count))
+
+        @app.route("/loyalty/decrease", methods=["POST"])
+        def decrease_loyalty():
+            username = request.headers.get("X-User-Name")
+            with lock:
+                counts[username] = max(counts.get(username, 0) - 1, 0)
+                count = counts[username]
+            return jsonify(loyalty(count))
+
+    return app
+
+
+def serve(ports=None, latency=0.0, jitter=0.0, error_rate=0.0, outages=(), host="127.0.0.1"):
+    """Run the three stubs on threaded servers until interrupted"""
+    ports = dict(DEFAULT_PORTS, **(ports or {}))
+    # One access log line per request would cost more than the stubs themselves
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    started_at = time.monotonic()
+    servers = []
+    for service in SERVICES:
+        windows = [(start, end) for name, start, end in outages if name == service]
+        behaviour = Behaviour(latency, jitter, error_rate, windows, started_at)
+        servers.append(make_server(host, ports[service], create_stub(service, behaviour), threaded=True))
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=5, help="mean stub latency in ms")
+    parser.add_argument("--jitter", type=float, default=2, help="standard deviation of the stub latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub requests answered with 500")
+    parser.add_argument("--outage", type=parse_outage, action="append", default=[], help="service:start-end, in seconds (503 meanwhile)")
+    for service in SERVICES:
+        parser.add_argument(f"--{service}-port", type=int, default=DEFAULT_PORTS[service])
+
+
+def ports_from(args):
+    return {service: getattr(args, f"{service}_port") for service in SERVICES}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    serve(ports_from(args), args.latency, args.jitter, args.error_rate, args.outage)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,32 @@
 from flask import Flask
+from src import logs
+from src.fastjson import FastJSONProvider
 from src.config import Config
 from src.api.routes import register_routes
+from src.utils.executor import FanOutExecutor
 
 
 def create_app(config_class=Config):
+    logs.configure(config_class)
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config_class)
+    app.extensions["fan_out"] = FanOutExecutor.from_config(app.config)
 
     register_routes(app)
 
     return app
+
+
+def create_async_app(config_class=Config):
+    from quart import Quart
+    from src.api.async_routes import register_async_routes
+
+    logs.configure(config_class)
+    app = Quart(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(config_class)
+
+    register_async_routes(app)
+
+    return app
@@ -0,0 +1,242 @@
+import asyncio
+from functools import wraps
+from http import HTTPStatus
+
+import aiohttp
+from quart import Response, g, jsonify, make_response, request
+from src.api import conditional
+from src.api.decorators import recordable
+from src.api.exceptions import SchemaValidationError
+from src.cache.idempotency import IDEMPOTENCY_HEADER, RESPONSE, IdempotencyStore, request_key
+from src.schemas.error import ErrorSchema, ValidationErrorSchema
+from src.services.aio import AsyncHotelService, AsyncLoyaltyService, AsyncReservationService, AsyncSessionFactory
+from src.services.base import BaseServiceClient
+from src.queue.publisher import RetryPublisher
+from src.utils import deadline, tracing
+from src import metrics
+
+
+def handle_service_error_async(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except SchemaValidationError as e:
+            error_schema = ValidationErrorSchema()
+            return jsonify(error_schema.dump({"message": str(e), "errors": e.errors})), HTTPStatus.BAD_REQUEST
+        except aiohttp.ClientConnectionError:
+            error_schema = ErrorSchema()
+            return jsonify(error_schema.dump({"message": "Service temporarily unavailable"})), HTTPStatus.SERVICE_UNAVAILABLE
+        except aiohttp.ClientError:
+            error_schema = ErrorSchema()
+            return jsonify(error_schema.dump({"message": "Internal service error"})), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    return wrapper
+
+
+def idempotent_async(func):
+    """Async counterpart of src.api.decorators.idempotent"""
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return await func(*args, **kwargs)
+
+        store = IdempotencyStore.shared()
+        g.idempotency_key = request_key(request.headers.get("X-User-Name"), request.method, request.path, key)
+        # The store's SQLite calls wait up to the busy timeout while another process writes
+        recorded = await asyncio.to_thread(store.get, g.idempotency_key, RESPONSE)
+        if recorded is None:
+            token = await asyncio.to_thread(store.claim, g.idempotency_key)
+            if token is None:
+                response = await make_response(
+                    jsonify(ErrorSchema().dump({"message": "A request with this Idempotency-Key is in progress"})), HTTPStatus.CONFLICT
+                )
+                response.headers["Retry-After"] = "1"
+                return response
+            try:
+                recorded = await asyncio.to_thread(store.get, g.idempotency_key, RESPONSE)
+                if recorded is None:
+                    response = await make_response(await func(*args, **kwargs))
+                    body = await response.get_json(silent=True)
+                    if recordable(body, response.status_code):
+                        await asyncio.to_thread(store.put, g.idempotency_key, RESPONSE, [body, response.status_code])
+                    return response
+            finally:
+                await asyncio.to_thread(store.release, g.idempotency_key, token)
+
+        body, status_code = recorded
+        response = await make_response(jsonify(body), status_code)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    return wrapper
+
+
+def register_async_routes(app):
+    """Same routes and responses as register_routes, served by Quart with asyncio service clients"""
+    hotel_service = AsyncHotelService()
+    reservation_service = AsyncReservationService()
+    loyalty_service = AsyncLoyaltyService()
+
+    @app.after_serving
+    async def close_sessions():
+        await AsyncSessionFactory.close_all()
+
+    @app.before_request
+    async def start_deadline():
+        # Each request runs in its own task and context, nothing to reset afterwards
+        deadline.start(
+            app.config["GATEWAY_REQUEST_BUDGET"], request.headers.get(deadline.DEADLINE_HEADER), app.config["GATEWAY_MIN_REQUEST_BUDGET"]
+        )
+        g.request_timer = metrics.Timer()
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.trace_root = tracing.start_trace(
+            f"{request.method} {route}", request.headers.get(tracing.REQUEST_ID_HEADER), request.headers.get(tracing.PARENT_SPAN_HEADER)
+        )
+
+    @app.after_request
+    async def record_latency(response):
+        timer = g.pop("request_timer", None)
+        if timer is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(timer.elapsed())
+        root = g.pop("trace_root", None)
+        if root is not None:
+            response.headers[tracing.REQUEST_ID_HEADER] = root.trace.request_id
+            tracing.finish_trace(root, "error" if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR else "ok")
+        return response
+
+    @app.after_request
+    async def compress_response(response):
+        if app.config["RESPONSE_COMPRESSION"] and isinstance(response.response, response.data_body_class):
+            body = await response.get_data()
+            conditional.compress(response, body, request.headers.get("Accept-Encoding"), app.config["RESPONSE_COMPRESSION_MIN_SIZE"])
+        return response
+
+    def not_modified(etag, per_user=False):
+        response = Response("", status=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag} if etag else None)
+        if app.config["RESPONSE_COMPRESSION"]:
+            response.vary.add("Accept-Encoding")
+        if per_user:
+            conditional.per_user(response)
+        return response
+
+    async def conditional_json(payload, status_code=HTTPStatus.OK):
+        """Async counterpart of conditional_json in register_routes"""
+        response = conditional.per_user(jsonify(payload))
+        response.status_code = status_code
+        if status_code != HTTPStatus.OK:
+            return response
+        etag = conditional.content_etag(await response.get_data())
+        current = conditional.match(request.headers.get("If-None-Match"), etag)
+        if current:
+            return not_modified(current, per_user=True)
+        response.headers["ETag"] = etag
+        return response
+
+    @app.route("/manage/metrics", methods=["GET"])
+    async def metrics_page():
+        body, content_type = metrics.exposition()
+        return Response(body, content_type=content_type)
+
+    @app.route("/manage/health", methods=["GET"])
+    async def health_check():
+        return jsonify({"status": "OK"}), 200
+
+    @app.route("/manage/queue", methods=["GET"])
+    async def queue_stats():
+        return jsonify(RetryPublisher.shared().stats()), 200
+
+    @app.route("/manage/cache", methods=["GET"])
+    async def cache_stats():
+        return (
+            jsonify(
+                {
+                    "hotels": hotel_service.cache.stats() if hotel_service.cache else None,
+                    "loyalty": loyalty_service.cache.stats() if loyalty_service.cache else None,
+                }
+            ),
+            200,
+        )
+
+    @app.route("/manage/pools", methods=["GET"])
+    async def pool_stats():
+        return jsonify(AsyncSessionFactory.stats()), 200
+
+    @app.route("/api/v1/hotels", methods=["GET"])
+    @handle_service_error_async
+    async def get_hotels():
+        page = request.args.get("page", 1, type=int)
+        size = request.args.get("size", 10, type=int)
+        after = request.args.get("after")
+        if_none_match = request.headers.get("If-None-Match")
+        meta = {}
+        hotels_data = await hotel_service.get_hotels(page, size, after, validators=conditional.upstream_etags(if_none_match), meta=meta)
+        etag = conditional.hotel_etag(meta["etag"])
+        current = conditional.match(if_none_match, etag)
+        if current or meta["not_modified"]:
+            return not_modified(current or etag)
+        response = jsonify(hotels_data)
+        if etag:
+            response.headers["ETag"] = etag
+        return response, HTTPStatus.OK
+
+    @app.route("/api/v1/reservations", methods=["GET"])
+    @handle_service_error_async
+    async def get_reservations():
+        username = BaseServiceClient.check_user_header(request.headers)
+        user_reservations = await reservation_service.get_user_reservations(username)
+        return await conditional_json(user_reservations)
+
+    @app.route("/api/v1/reservations", methods=["POST"])
+    @handle_service_error_async
+    @idempotent_async
+    async def create_reservation():
+        username = BaseServiceClient.check_user_header(request.headers)
+        data = await request.get_json()
+        reservation = await reservation_service.create_reservation(username, data, g.get("idempotency_key"))
+        if reservation:
+            status_code = reservation.get("status_code", 200)
+            if status_code != 200:
+                return jsonify(reservation), status_code
+            return jsonify(reservation), HTTPStatus.OK
+        return jsonify({}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    @app.route("/api/v1/reservations/<string:reservation_uid>", methods=["GET"])
+    @handle_service_error_async
+    async def get_reservation(reservation_uid):
+        username = BaseServiceClient.check_user_header(request.headers)
+        reservation = await reservation_service.get_reservation(username, reservation_uid)
+        return jsonify(reservation), HTTPStatus.OK
+
+    @app.route("/api/v1/reservations/<string:reservation_uid>", methods=["DELETE"])
+    @handle_service_error_async
+    @idempotent_async
+    async def cancel_reservation(reservation_uid):
+        username = BaseServiceClient.check_user_header(request.headers)
+        success = await reservation_service.delete_reservation(username, reservation_uid, g.get("idempotency_key"))
+        if success:
+            return jsonify({"message": "Reservation canceled"}), HTTPStatus.NO_CONTENT
+        return jsonify({"message": "Failed to cancel reservation"}), HTTPStatus.BAD_REQUEST
+
+    @app.route("/api/v1/me", methods=["GET"])
+    @handle_service_error_async
+    async def get_user_info():
+        username = BaseServiceClient.check_user_header(request.headers)
+        user_reservations, (loyalty, status_code) = await asyncio.gather(
+            reservation_service.get_user_reservations(username),
+            loyalty_service.get_loyalty(username),
+        )
+        user_info = {"reservations": user_reservations, "loyalty": loyalty}
+
+        return jsonify(user_info), HTTPStatus.OK
+
+    @app.route("/api/v1/loyalty", methods=["GET"])
+    @handle_service_error_async
+    async def get_loyalty():
+        username = BaseServiceClient.check_user_header(request.headers)
+        loyalty_info, status_code = await loyalty_service.get_loyalty(username, direct=True)
+
+        return await conditional_json(loyalty_info, status_code)
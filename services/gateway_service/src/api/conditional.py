@@ -0,0 +1,119 @@
+"""Conditional GETs and response compression for the read endpoints.
+
+Hotel pages carry a strong ETag derived from the reservation service's ETag for the same page, so a
+matching If-None-Match is answered with 304 from the cached entry without rendering it. When the page
+is not cached, the client's validators are passed upstream and an unchanged page costs a 304 on both
+hops. Reservations and loyalty carry a hash of the rendered body; they differ per X-User-Name, so they
+are marked private and vary on it, and no shared cache hands one user's copy to another.
+
+JSON bodies of at least RESPONSE_COMPRESSION_MIN_SIZE bytes are compressed with brotli (when the
+brotli package is installed) or gzip, as the client's Accept-Encoding allows. Each coding is a
+different representation, so its strong ETag gets a "-gzip"/"-br" suffix, which is ignored again when
+comparing If-None-Match.
+"""
+
+import gzip
+import hashlib
+
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# Bump whenever the gateway changes how it renders a hotel payload: clients' ETags must not match anymore
+HOTEL_REPRESENTATION = "gw1"
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _strip_encoding(tag):
+    for encoding in ENCODINGS:
+        if tag.endswith(f"-{encoding}"):
+            return tag[: -len(encoding) - 1]
+    return tag
+
+
+def _client_tags(if_none_match):
+    etags = parse_etags(if_none_match)
+    if etags.star_tag:
+        return None
+    return etags.as_set(include_weak=True)
+
+
+def match(if_none_match, etag):
+    """The client's form of this (quoted) ETag, coding suffix included, when its copy is not modified; else None.
+
+    If-None-Match compares weakly (RFC 9110), and every coding of a representation counts as a match.
+    """
+    if not if_none_match or not etag:
+        return None
+    tags = _client_tags(if_none_match)
+    if tags is None:
+        return etag
+    opaque = etag.strip('"')
+    for tag in tags:
+        if _strip_encoding(tag) == opaque:
+            return f'"{tag}"'
+    return None
+
+
+def content_etag(body):
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def per_user(response):
+    """Mark a response rendered for the caller's X-User-Name. Works on Flask and Quart responses."""
+    response.cache_control.private = True
+    response.vary.add("X-User-Name")
+    return response
+
+
+def hotel_etag(upstream_etag):
+    """Gateway ETag of a hotel payload with this reservation service ETag; None for weak or missing ones"""
+    if not upstream_etag or upstream_etag.startswith("W/"):
+        return None
+    tag = upstream_etag.strip('"')
+    return f'"{HOTEL_REPRESENTATION}-{tag}"'
+
+
+def upstream_etags(if_none_match):
+    """Reservation service ETags a client's hotel ETags were derived from, to revalidate with upstream"""
+    if not if_none_match:
+        return []
+    prefix = f"{HOTEL_REPRESENTATION}-"
+    tags = {_strip_encoding(tag) for tag in _client_tags(if_none_match) or ()}
+    return sorted(f'"{tag[len(prefix):]}"' for tag in tags if tag.startswith(prefix))
+
+
+def negotiate(accept_encoding):
+    """Preferred coding the client accepts, or None for the identity"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best = max(ENCODINGS, key=accepted.quality)
+    return best if accepted.quality(best) > 0 else None
+
+
+def compress(response, body, accept_encoding, min_size):
+    """Encode a rendered JSON response in place. Works on Flask and Quart responses; `body` is its data."""
+    if response.status_code != 200 or response.mimetype != "application/json" or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(accept_encoding)
+    if encoding is None or len(body) < min_size:
+        return response
+    if encoding == "br":
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        # No timestamp in the header: the same body always encodes to the same bytes
+        data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        tag = etag.strip('"')
+        response.headers["ETag"] = f'"{tag}-{encoding}"'
+    return response
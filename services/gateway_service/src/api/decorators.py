@@ -1,9 +1,10 @@
 from functools import wraps
 from http import HTTPStatus
-from flask import request, jsonify
+from flask import g, request, jsonify, make_response
 from marshmallow import ValidationError
 import requests
 from src.api.exceptions import SchemaValidationError
+from src.cache.idempotency import IDEMPOTENCY_HEADER, RESPONSE, IdempotencyStore, request_key
 from src.schemas.error import ErrorSchema, ValidationErrorSchema
 
 
@@ -41,3 +42,58 @@ def handle_service_error(func):
             return jsonify(error_schema.dump({"message": "Internal service error"})), HTTPStatus.INTERNAL_SERVER_ERROR
 
     return wrapper
+
+
+def idempotent(func):
+    """Honour an Idempotency-Key header: the first response for a key is recorded and returned for
+    every repeat. 5xx and PENDING responses are not recorded, so a repeat runs again; the services
+    then skip the downstream steps that already succeeded under the same key.
+    A repeat arriving while the key is claimed by another request or a queued retry gets 409."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return func(*args, **kwargs)
+
+        store = IdempotencyStore.shared()
+        g.idempotency_key = request_key(request.headers.get("X-User-Name"), request.method, request.path, key)
+        recorded = store.get(g.idempotency_key, RESPONSE)
+        if recorded is None:
+            token = store.claim(g.idempotency_key)
+            if token is None:
+                return in_progress_response()
+            try:
+                # The request that held the claim until now may have recorded its response
+                recorded = store.get(g.idempotency_key, RESPONSE)
+                if recorded is None:
+                    response = make_response(func(*args, **kwargs))
+                    body = response.get_json(silent=True)
+                    if recordable(body, response.status_code):
+                        store.put(g.idempotency_key, RESPONSE, [body, response.status_code])
+                    return response
+            finally:
+                store.release(g.idempotency_key, token)
+
+        body, status_code = recorded
+        response = make_response(jsonify(body), status_code)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    return wrapper
+
+
+def recordable(body, status_code):
+    pending = isinstance(body, dict) and body.get("status") == "PENDING"
+    return status_code < HTTPStatus.INTERNAL_SERVER_ERROR and not pending
+
+
+def in_progress_response():
+    response = make_response(jsonify(ErrorSchema().dump({"message": "A request with this Idempotency-Key is in progress"})), HTTPStatus.CONFLICT)
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def idempotency_key():
+    """Scoped idempotency key of the current request, set by @idempotent"""
+    return g.get("idempotency_key")
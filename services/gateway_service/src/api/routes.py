@@ -1,42 +1,148 @@
 from http import HTTPStatus
-from flask import jsonify, request
-from src.api.decorators import handle_service_error
+from flask import Response, g, jsonify, request
+from src.api import conditional
+from src.api.decorators import handle_service_error, idempotent, idempotency_key
 from src.services.hotel import HotelService
 from src.services.reservation import ReservationService
 from src.services.loyalty import LoyaltyService
 from src.services.base import BaseServiceClient
+from src.queue.publisher import RetryPublisher
+from src.pool.session import SessionFactory
+from src.utils import deadline, tracing
+from src import metrics
 
 
 def register_routes(app):
     hotel_service = HotelService()
     reservation_service = ReservationService()
     loyalty_service = LoyaltyService()
+    fan_out = app.extensions["fan_out"]
+
+    @app.before_request
+    def start_deadline():
+        g.deadline_token = deadline.start(
+            app.config["GATEWAY_REQUEST_BUDGET"], request.headers.get(deadline.DEADLINE_HEADER), app.config["GATEWAY_MIN_REQUEST_BUDGET"]
+        )
+
+    @app.teardown_request
+    def end_deadline(exc):
+        token = g.pop("deadline_token", None)
+        if token is not None:
+            deadline.reset(token)
+
+    @app.before_request
+    def start_timer():
+        g.request_timer = metrics.Timer()
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.trace_root = tracing.start_trace(
+            f"{request.method} {route}", request.headers.get(tracing.REQUEST_ID_HEADER), request.headers.get(tracing.PARENT_SPAN_HEADER)
+        )
+
+    @app.after_request
+    def record_latency(response):
+        timer = g.pop("request_timer", None)
+        if timer is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(timer.elapsed())
+        root = g.get("trace_root")
+        if root is not None:
+            response.headers[tracing.REQUEST_ID_HEADER] = root.trace.request_id
+            g.trace_status = "error" if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR else "ok"
+        return response
+
+    @app.teardown_request
+    def end_trace(exc):
+        tracing.finish_trace(g.pop("trace_root", None), "error" if exc is not None else g.get("trace_status", "ok"))
+
+    @app.after_request
+    def compress_response(response):
+        if app.config["RESPONSE_COMPRESSION"] and not response.direct_passthrough:
+            conditional.compress(response, response.get_data(), request.headers.get("Accept-Encoding"), app.config["RESPONSE_COMPRESSION_MIN_SIZE"])
+        return response
+
+    def not_modified(etag, per_user=False):
+        response = Response(status=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag} if etag else None)
+        if app.config["RESPONSE_COMPRESSION"]:
+            response.vary.add("Accept-Encoding")
+        if per_user:
+            conditional.per_user(response)
+        return response
+
+    def conditional_json(payload, status_code=HTTPStatus.OK):
+        """Per-user read response with a hash of its body as ETag, or 304 when the client's copy has the same hash"""
+        response = conditional.per_user(jsonify(payload))
+        response.status_code = status_code
+        if status_code != HTTPStatus.OK:
+            return response
+        etag = conditional.content_etag(response.get_data())
+        current = conditional.match(request.headers.get("If-None-Match"), etag)
+        if current:
+            return not_modified(current, per_user=True)
+        response.headers["ETag"] = etag
+        return response
+
+    @app.route("/manage/metrics", methods=["GET"])
+    def metrics_page():
+        body, content_type = metrics.exposition()
+        return Response(body, content_type=content_type)
 
     @app.route("/manage/health", methods=["GET"])
     def health_check():
         return jsonify({"status": "OK"}), 200
 
+    @app.route("/manage/queue", methods=["GET"])
+    def queue_stats():
+        return jsonify(RetryPublisher.shared().stats()), 200
+
+    @app.route("/manage/cache", methods=["GET"])
+    def cache_stats():
+        return (
+            jsonify(
+                {
+                    "hotels": hotel_service.cache.stats() if hotel_service.cache else None,
+                    "loyalty": loyalty_service.cache.stats() if loyalty_service.cache else None,
+                }
+            ),
+            200,
+        )
+
+    @app.route("/manage/pools", methods=["GET"])
+    def pool_stats():
+        return jsonify(SessionFactory.stats()), 200
+
     @app.route("/api/v1/hotels", methods=["GET"])
     @handle_service_error
     def get_hotels():
         page = request.args.get("page", 1, type=int)
         size = request.args.get("size", 10, type=int)
-        hotels_data = hotel_service.get_hotels(page, size)
-        return jsonify(hotels_data), HTTPStatus.OK
+        after = request.args.get("after")
+        if_none_match = request.headers.get("If-None-Match")
+        meta = {}
+        hotels_data = hotel_service.get_hotels(page, size, after, validators=conditional.upstream_etags(if_none_match), meta=meta)
+        etag = conditional.hotel_etag(meta["etag"])
+        current = conditional.match(if_none_match, etag)
+        if current or meta["not_modified"]:
+            # Answered from the cached page's ETag or by the reservation service, nothing rendered
+            return not_modified(current or etag)
+        response = jsonify(hotels_data)
+        if etag:
+            response.headers["ETag"] = etag
+        return response, HTTPStatus.OK
 
     @app.route("/api/v1/reservations", methods=["GET"])
     @handle_service_error
     def get_reservations():
         username = BaseServiceClient.check_user_header(request.headers)
         user_reservations = reservation_service.get_user_reservations(username)
-        return jsonify(user_reservations), HTTPStatus.OK
+        return conditional_json(user_reservations)
 
     @app.route("/api/v1/reservations", methods=["POST"])
     @handle_service_error
+    @idempotent
     def create_reservation():
         username = BaseServiceClient.check_user_header(request.headers)
         data = request.json
-        reservation = reservation_service.create_reservation(username, data)
+        reservation = reservation_service.create_reservation(username, data, idempotency_key())
         if reservation:
             response = jsonify(reservation)
             status_code = response.get_json().get("status_code", 200)
@@ -54,9 +160,10 @@ def register_routes(app):
 
     @app.route("/api/v1/reservations/<string:reservation_uid>", methods=["DELETE"])
     @handle_service_error
+    @idempotent
     def cancel_reservation(reservation_uid):
         username = BaseServiceClient.check_user_header(request.headers)
-        success = reservation_service.delete_reservation(username, reservation_uid)
+        success = reservation_service.delete_reservation(username, reservation_uid, idempotency_key())
         if success:
             return jsonify({"message": "Reservation canceled"}), HTTPStatus.NO_CONTENT
         return jsonify({"message": "Failed to cancel reservation"}), HTTPStatus.BAD_REQUEST
@@ -65,8 +172,10 @@ def register_routes(app):
     @handle_service_error
     def get_user_info():
         username = BaseServiceClient.check_user_header(request.headers)
-        user_reservations = reservation_service.get_user_reservations(username)
-        loyalty, status_code = loyalty_service.get_loyalty(username)
+        user_reservations, (loyalty, status_code) = fan_out.run(
+            lambda: reservation_service.get_user_reservations(username),
+            lambda: loyalty_service.get_loyalty(username),
+        )
         user_info = {"reservations": user_reservations, "loyalty": loyalty}
         if status_code != 200:
             jsonify(user_info), status_code
@@ -79,4 +188,4 @@ def register_routes(app):
         username = BaseServiceClient.check_user_header(request.headers)
         loyalty_info, status_code = loyalty_service.get_loyalty(username)
 
-        return jsonify(loyalty_info), status_code
+        return conditional_json(loyalty_info, status_code)
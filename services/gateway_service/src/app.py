@@ -1,7 +1,9 @@
-import multiprocessing
+import sys
 
-from src import create_app
+from src import logs, metrics
+from src.config import Config
 from src.queue.worker import RetryWorker
+from src.serving import Supervisor, web_server
 
 import logging
 
@@ -14,14 +16,14 @@ def start_worker():
 
 
 def main():
-    # Start the worker in a separate process
-    worker_process = multiprocessing.Process(target=start_worker)
-    worker_process.start()
-    logger.info("Started retry worker process")
-
-    # Start the Flask app
-    app = create_app()
-    app.run(host="0.0.0.0", port=8080,debug=True)
+    logs.configure()
+    metrics.reset_multiprocess_dir()
+    supervisor = Supervisor(graceful_timeout=Config.GATEWAY_GRACEFUL_TIMEOUT)
+    # The retry worker runs in its own process and is restarted if it dies
+    supervisor.add("retry-worker", start_worker, restart=True)
+    supervisor.add("web", web_server(), restart=False)
+    logger.info("Serving gateway in %s mode", Config.GATEWAY_SERVING_MODE)
+    sys.exit(supervisor.run())
 
 
 if __name__ == "__main__":
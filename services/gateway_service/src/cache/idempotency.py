@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.config import Config
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Steps recorded for a whole request or operation, next to the per-call steps of the services
+RESPONSE = "response"
+OPERATION_DONE = "done"
+# Claim of a key by the request or retry currently running its operation
+IN_PROGRESS = "in_progress"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT NOT NULL,
+    step TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (key, step)
+);
+CREATE INDEX IF NOT EXISTS ix_idempotency_created_at ON idempotency (created_at);
+"""
+
+
+def request_key(username, method, path, key):
+    """Client keys are only unique per user and endpoint"""
+    return f"{username}:{method}:{path}:{key}"
+
+
+class IdempotencyStore:
+    """Results recorded per idempotency key and step, in a local SQLite file.
+
+    The file is shared by the gateway processes and the retry worker, so a replayed operation sees
+    what an earlier attempt (in any of them) already did. Records expire after `ttl` seconds and the
+    oldest are evicted beyond `max_entries`.
+
+    A request or retry first claims its key, so that two of them never run the same operation at
+    once; steps are only recorded under a held claim.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path, ttl, max_entries, evict_every=256, claim_lease=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.claim_lease = claim_lease
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    Config.IDEMPOTENCY_DB_PATH,
+                    ttl=Config.IDEMPOTENCY_TTL,
+                    max_entries=Config.IDEMPOTENCY_MAX_ENTRIES,
+                    claim_lease=Config.IDEMPOTENCY_CLAIM_LEASE,
+                )
+            return cls._shared
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or forks
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key, step):
+        """The recorded value, or None"""
+        row = self._connection().execute(
+            "SELECT value FROM idempotency WHERE key = ? AND step = ? AND created_at >= ?", (key, step, time.time() - self.ttl)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, step, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO idempotency (key, step, value, created_at) VALUES (?, ?, ?, ?)", (key, step, json.dumps(value), time.time())
+        )
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def forget(self, key, step):
+        self._connection().execute("DELETE FROM idempotency WHERE key = ? AND step = ?", (key, step))
+
+    def claim(self, key):
+        """Claim `key` for the caller's operation. Returns a token for release(), or None while another
+        request or retry holds it. A claim left by a crashed holder lapses after claim_lease seconds."""
+        now = time.time()
+        token = uuid.uuid4().hex
+        connection = self._connection()
+        connection.execute("DELETE FROM idempotency WHERE key = ? AND step = ? AND created_at < ?", (key, IN_PROGRESS, now - self.claim_lease))
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO idempotency (key, step, value, created_at) VALUES (?, ?, ?, ?)", (key, IN_PROGRESS, json.dumps(token), now)
+        )
+        return token if cursor.rowcount == 1 else None
+
+    def release(self, key, token):
+        # Only our own claim: after a lapse, another holder may have taken the key over
+        self._connection().execute("DELETE FROM idempotency WHERE key = ? AND step = ? AND value = ?", (key, IN_PROGRESS, json.dumps(token)))
+
+    def step(self, key, step, func, succeeded=bool):
+        """Run `func` once per key: a recorded result is returned instead of calling it again.
+        Only results passing `succeeded` are recorded, so failed steps run again on the next attempt.
+        The caller holds the claim of `key`."""
+        if key is None:
+            return func()
+        value = self.get(key, step)
+        if value is None:
+            value = func()
+            if succeeded(value):
+                self.put(key, step, value)
+        return value
+
+    async def step_coroutine(self, key, step, call, succeeded=bool):
+        """Asyncio counterpart of step(): `call` returns the awaitable to run. The reads and writes,
+        which wait up to the busy timeout while another process writes, run off the event loop."""
+        if key is None:
+            return await call()
+        value = await asyncio.to_thread(self.get, key, step)
+        if value is None:
+            value = await call()
+            if succeeded(value):
+                await asyncio.to_thread(self.put, key, step, value)
+        return value
+
+    def evict(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM idempotency WHERE created_at < ?", (time.time() - self.ttl,))
+        connection.execute(
+            "DELETE FROM idempotency WHERE rowid IN (SELECT rowid FROM idempotency ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+
+    def stats(self):
+        size = self._connection().execute("SELECT count(*) FROM idempotency").fetchone()[0]
+        with self._lock:
+            return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
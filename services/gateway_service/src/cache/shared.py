@@ -0,0 +1,78 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from src.cache.ttl import TTLCache
+
+_SLOT = struct.Struct("q")
+
+
+class SharedVersionTable:
+    """Per-key version counters in a memory-mapped file, visible to every local gateway process.
+
+    Keys hash onto a fixed number of slots, so a collision only causes a spurious invalidation.
+    Reads are lock-free; increments take a byte-range lock on the slot.
+    """
+
+    def __init__(self, path, slots):
+        self.slots = slots
+        size = slots * _SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def _offset(self, key):
+        return (zlib.crc32(key.encode()) % self.slots) * _SLOT.size
+
+    def get(self, key):
+        return _SLOT.unpack_from(self._map, self._offset(key))[0]
+
+    def bump(self, key):
+        offset = self._offset(key)
+        # fcntl locks are held per process, the thread lock covers threads of this process
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                version = _SLOT.unpack_from(self._map, offset)[0] + 1
+                _SLOT.pack_into(self._map, offset, version)
+                return version
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _SLOT.size, offset)
+
+
+class VersionedCache:
+    """TTL/LRU cache whose entries are dropped as soon as their key's shared version moves on"""
+
+    def __init__(self, maxsize, ttl, versions):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.versions = versions
+
+    def version(self, key):
+        return self.versions.get(key)
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        value, version = entry
+        if version != self.versions.get(key):
+            self.cache.invalidate(key)
+            return None
+        return value
+
+    def set(self, key, value, version):
+        """`version` must be read before the value was fetched, so a concurrent write is never masked"""
+        self.cache.set(key, (value, version))
+
+    def invalidate(self, key):
+        """Returns the new version, under which a value written by the invalidating process may be stored"""
+        self.cache.invalidate(key)
+        return self.versions.bump(key)
+
+    def stats(self):
+        return self.cache.stats()
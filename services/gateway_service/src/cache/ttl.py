@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+class CacheEntry:
+    __slots__ = ("value", "etag", "stored_at")
+
+    def __init__(self, value, etag=None):
+        self.value = value
+        self.etag = etag
+        self.stored_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a time-to-live.
+
+    Entries younger than `refresh_after` are fresh. Older entries are still served until `ttl`, but
+    lookup() reports them as stale so the caller can revalidate them in the background.
+    """
+
+    def __init__(self, maxsize, ttl, refresh_after=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.refresh_after = ttl if refresh_after is None else min(refresh_after, ttl)
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """Return (entry, state). Expired entries are kept so their ETag can be used to revalidate."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.age >= self.ttl:
+                self.misses += 1
+                return entry, MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry.age >= self.refresh_after:
+                self.stale_hits += 1
+                return entry, STALE
+            return entry, FRESH
+
+    def get(self, key):
+        entry, state = self.lookup(key)
+        return entry.value if state != MISS else None
+
+    def set(self, key, value, etag=None):
+        with self._lock:
+            self._entries[key] = CacheEntry(value, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, key):
+        """Mark an entry as just revalidated (e.g. the origin answered 304 Not Modified)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def begin_refresh(self, key):
+        """Claim the background refresh of `key`; False if another thread already owns it"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
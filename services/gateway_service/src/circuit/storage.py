@@ -0,0 +1,133 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+import pybreaker
+
+# state, failure counter, opened_at and probe lease expiry (unix timestamps)
+_RECORD = struct.Struct("qqdd")
+_STATES = (pybreaker.STATE_CLOSED, pybreaker.STATE_OPEN, pybreaker.STATE_HALF_OPEN)
+_STATE = 0
+_COUNTER = 8
+_OPENED_AT = 16
+_PROBE_UNTIL = 24
+
+
+def _to_datetime(timestamp):
+    # pybreaker compares opened_at with the naive datetime.utcnow()
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None) if timestamp else None
+
+
+def _to_timestamp(value):
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else 0.0
+
+
+class LocalBreakerStorage(pybreaker.CircuitMemoryStorage):
+    """In-process breaker state, with the same single-probe lease as SharedBreakerStorage"""
+
+    def __init__(self):
+        super().__init__(pybreaker.STATE_CLOSED)
+        self._lock = threading.Lock()
+        self._probe_until = 0.0
+
+    @pybreaker.CircuitMemoryStorage.state.setter
+    def state(self, state):
+        with self._lock:
+            self._state = state
+            if state != pybreaker.STATE_HALF_OPEN:
+                self._probe_until = 0.0
+
+    def increment_counter(self):
+        with self._lock:
+            self._fail_counter += 1
+
+    def acquire_probe(self, lease):
+        """True for the one caller allowed to probe a recovering service, until `lease` seconds pass"""
+        now = time.time()
+        with self._lock:
+            if now < self._probe_until:
+                return False
+            self._probe_until = now + lease
+            return True
+
+
+class SharedBreakerStorage(pybreaker.CircuitBreakerStorage):
+    """Breaker state in a memory-mapped file, shared by every local gateway process.
+
+    All gateway processes and the retry worker count failures against the same counter and see a
+    trip at once. Reads are lock-free; updates take an fcntl lock on the record. Once the reset
+    timeout has elapsed, a single caller across all processes holds the probe lease and calls the
+    service; the lease expires on its own if that process dies mid-probe.
+    """
+
+    def __init__(self, path):
+        super().__init__("shared")
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < _RECORD.size:
+            os.ftruncate(self._fd, _RECORD.size)
+        self._map = mmap.mmap(self._fd, _RECORD.size)
+        self._lock = threading.Lock()
+
+    def _read(self, offset, fmt):
+        return struct.unpack_from(fmt, self._map, offset)[0]
+
+    def _update(self, update):
+        # fcntl locks are held per process, the thread lock covers threads of this process
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _RECORD.size, 0)
+            try:
+                return update(*_RECORD.unpack_from(self._map, 0))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _RECORD.size, 0)
+
+    def _write(self, state, counter, opened_at, probe_until):
+        _RECORD.pack_into(self._map, 0, state, counter, opened_at, probe_until)
+
+    @property
+    def state(self):
+        return _STATES[self._read(_STATE, "q")]
+
+    @state.setter
+    def state(self, state):
+        code = _STATES.index(state)
+
+        def update(_state, counter, opened_at, probe_until):
+            # Leaving half-open ends the probe
+            self._write(code, counter, opened_at, probe_until if state == pybreaker.STATE_HALF_OPEN else 0.0)
+
+        self._update(update)
+
+    def increment_counter(self):
+        self._update(lambda state, counter, opened_at, probe_until: self._write(state, counter + 1, opened_at, probe_until))
+
+    def reset_counter(self):
+        self._update(lambda state, counter, opened_at, probe_until: self._write(state, 0, opened_at, probe_until))
+
+    @property
+    def counter(self):
+        return self._read(_COUNTER, "q")
+
+    @property
+    def opened_at(self):
+        return _to_datetime(self._read(_OPENED_AT, "d"))
+
+    @opened_at.setter
+    def opened_at(self, value):
+        self._update(lambda state, counter, opened_at, probe_until: self._write(state, counter, _to_timestamp(value), probe_until))
+
+    def acquire_probe(self, lease):
+        """True for the one caller, in any process, allowed to probe a recovering service"""
+        now = time.time()
+
+        def update(state, counter, opened_at, probe_until):
+            if now < probe_until:
+                return False
+            self._write(state, counter, opened_at, now + lease)
+            return True
+
+        return self._update(update)
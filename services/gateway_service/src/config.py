@@ -1,14 +1,124 @@
 import os
 
 
+def operation_limits(value):
+    """Parse "create_reservation=8,decrease_loyalty=2" into {"create_reservation": 8, "decrease_loyalty": 2}"""
+    return {name.strip(): int(limit) for name, limit in (item.split("=", 1) for item in value.split(",") if item.strip())}
+
+
+def logger_rates(value):
+    """Parse "src.services=0.1,src.queue.worker=20" into {"src.services": 0.1, "src.queue.worker": 20.0}"""
+    return {name.strip(): float(rate) for name, rate in (item.split("=", 1) for item in value.split(",") if item.strip())}
+
+
 class Config:
     RESERVATION_SERVICE_URL = os.environ.get("RESERVATION_SERVICE_URL", "http://localhost:8070")
     PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL", "http://localhost:8060")
     LOYALTY_SERVICE_URL = os.environ.get("LOYALTY_SERVICE_URL", "http://localhost:8050")
 
+    # "sync" serves Flask on threads, "async" serves the same routes with Quart/asyncio clients
+    GATEWAY_SERVING_MODE = os.environ.get("GATEWAY_SERVING_MODE", "sync")
+    GATEWAY_HOST = os.environ.get("GATEWAY_HOST", "0.0.0.0")
+    GATEWAY_PORT = int(os.environ.get("GATEWAY_PORT", "8080"))
+    # Web server processes: "gunicorn" (prefork workers with threads) or "development" (Flask's single-process server).
+    # Async mode always runs hypercorn with GATEWAY_WORKERS processes. SIGHUP restarts workers gracefully.
+    GATEWAY_SERVER = os.environ.get("GATEWAY_SERVER", "gunicorn")
+    GATEWAY_WORKERS = int(os.environ.get("GATEWAY_WORKERS", str(min(os.cpu_count() or 1, 4))))
+    GATEWAY_THREADS = int(os.environ.get("GATEWAY_THREADS", "8"))
+    GATEWAY_WORKER_TIMEOUT = int(os.environ.get("GATEWAY_WORKER_TIMEOUT", "60"))
+    GATEWAY_GRACEFUL_TIMEOUT = int(os.environ.get("GATEWAY_GRACEFUL_TIMEOUT", "30"))
+    GATEWAY_KEEPALIVE = int(os.environ.get("GATEWAY_KEEPALIVE", "5"))
+
     # Circuit breaker configuration
     CIRCUIT_BREAKER_FAIL_MAX = int(os.environ.get("CIRCUIT_BREAKER_FAIL_MAX", "5"))
     CIRCUIT_BREAKER_RESET_TIMEOUT = int(os.environ.get("CIRCUIT_BREAKER_RESET_TIMEOUT", "60"))
+    # Breaker state lives in one memory-mapped file per service, shared by the gateway processes and the retry worker;
+    # a recovering service is probed by one caller at a time, for at most PROBE_LEASE seconds
+    CIRCUIT_BREAKER_SHARED_STATE = os.environ.get("CIRCUIT_BREAKER_SHARED_STATE", "true").lower() == "true"
+    CIRCUIT_BREAKER_STATE_DIR = os.environ.get("CIRCUIT_BREAKER_STATE_DIR", "/tmp")
+    CIRCUIT_BREAKER_PROBE_LEASE = float(os.environ.get("CIRCUIT_BREAKER_PROBE_LEASE", "15"))
+
+    # Time budget of one gateway request (less if the caller sends a smaller X-Request-Deadline-Ms). Downstream
+    # calls only wait for what is left of it and forward the rest to the services in the same header
+    GATEWAY_REQUEST_BUDGET = float(os.environ.get("GATEWAY_REQUEST_BUDGET", "10"))
+    # Smallest budget a caller can ask for in that header
+    GATEWAY_MIN_REQUEST_BUDGET = float(os.environ.get("GATEWAY_MIN_REQUEST_BUDGET", "1"))
+
+    # Request IDs and span timings, appended to TRACE_FILE (read it with python -m src.utils.critical_path)
+    TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.environ.get("TRACE_FILE", "/tmp/gateway.spans")
+
+    # Responses of our own services are loaded with precompiled schema plans that skip marshmallow's validators
+    # (see src/schemas/compiled.py); false validates them field by field again
+    TRUSTED_INTERNAL_PAYLOADS = os.environ.get("TRUSTED_INTERNAL_PAYLOADS", "true").lower() == "true"
+
+    # Logging (see src/logs.py): request threads only enqueue records, a background thread appends them to LOG_FILE
+    # (and stderr) as batched JSON lines. Below WARNING, LOG_SAMPLING keeps that share of a logger's records;
+    # LOG_RATE_LIMIT caps a logger at that many records per second. Both match logger name prefixes
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+    LOG_FILE = os.environ.get("LOG_FILE", "/var/log/flask_app.log")
+    LOG_STDERR = os.environ.get("LOG_STDERR", "true").lower() == "true"
+    LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+    LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "256"))
+    LOG_SAMPLING = logger_rates(os.environ.get("LOG_SAMPLING", ""))
+    LOG_RATE_LIMIT = logger_rates(os.environ.get("LOG_RATE_LIMIT", ""))
+
+    # Downstream HTTP connection pool configuration (one pool per downstream service)
+    HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "20"))
+    HTTP_POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "false").lower() == "true"
+    HTTP_KEEP_ALIVE = os.environ.get("HTTP_KEEP_ALIVE", "true").lower() == "true"
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "2"))
+    HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "10"))
+
+    # Hotel catalog cache: entries older than REFRESH_AFTER are revalidated in the background, older than TTL refetched
+    HOTEL_CACHE_ENABLED = os.environ.get("HOTEL_CACHE_ENABLED", "true").lower() == "true"
+    HOTEL_CACHE_MAXSIZE = int(os.environ.get("HOTEL_CACHE_MAXSIZE", "1024"))
+    HOTEL_CACHE_TTL = float(os.environ.get("HOTEL_CACHE_TTL", "300"))
+    HOTEL_CACHE_REFRESH_AFTER = float(os.environ.get("HOTEL_CACHE_REFRESH_AFTER", "30"))
+
+    # Read endpoints answer If-None-Match with 304 (see src/api/conditional.py); JSON bodies of at least
+    # RESPONSE_COMPRESSION_MIN_SIZE bytes are sent with brotli or gzip when the client accepts it
+    RESPONSE_COMPRESSION = os.environ.get("RESPONSE_COMPRESSION", "true").lower() == "true"
+    RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+
+    # Per-user loyalty cache. Writes bump a per-user version in a file shared by all local gateway processes
+    LOYALTY_CACHE_ENABLED = os.environ.get("LOYALTY_CACHE_ENABLED", "true").lower() == "true"
+    LOYALTY_CACHE_MAXSIZE = int(os.environ.get("LOYALTY_CACHE_MAXSIZE", "10000"))
+    LOYALTY_CACHE_TTL = float(os.environ.get("LOYALTY_CACHE_TTL", "30"))
+    LOYALTY_CACHE_VERSIONS_PATH = os.environ.get("LOYALTY_CACHE_VERSIONS_PATH", "/tmp/gateway-loyalty-cache.versions")
+    LOYALTY_CACHE_VERSION_SLOTS = int(os.environ.get("LOYALTY_CACHE_VERSION_SLOTS", "4096"))
+
+    # Recorded results of idempotent writes (Idempotency-Key header, queued retry operations),
+    # in a SQLite file shared with the retry worker
+    IDEMPOTENCY_DB_PATH = os.environ.get("IDEMPOTENCY_DB_PATH", "/tmp/gateway-idempotency.sqlite3")
+    IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+    # A request or retry running an operation holds its key; others get 409 (or are retried later) meanwhile.
+    # The claim of a process that died lapses after this many seconds
+    IDEMPOTENCY_CLAIM_LEASE = float(os.environ.get("IDEMPOTENCY_CLAIM_LEASE", "60"))
+
+    # Reservation lists are enriched with one bulk payment lookup per chunk of this many reservations
+    PAYMENT_BATCH_SIZE = int(os.environ.get("PAYMENT_BATCH_SIZE", "500"))
+
+    # Aggregate endpoints (/api/v1/me) fan out independent downstream calls on a bounded pool
+    AGGREGATION_PARALLEL = os.environ.get("AGGREGATION_PARALLEL", "true").lower() == "true"
+    AGGREGATION_MAX_WORKERS = int(os.environ.get("AGGREGATION_MAX_WORKERS", "16"))
 
     # RabbitMQ configuration
     RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
+    # Retry publisher: one connection per process, buffered publishes, confirms settled in batches
+    RABBITMQ_PUBLISH_CHANNELS = int(os.environ.get("RABBITMQ_PUBLISH_CHANNELS", "2"))
+    RABBITMQ_PUBLISH_BUFFER = int(os.environ.get("RABBITMQ_PUBLISH_BUFFER", "10000"))
+    RABBITMQ_PUBLISH_BATCH_SIZE = int(os.environ.get("RABBITMQ_PUBLISH_BATCH_SIZE", "100"))
+
+    # Retry worker: every operation type has its own queue, prefetch window and handler pool
+    RETRY_WORKER_PREFETCH = int(os.environ.get("RETRY_WORKER_PREFETCH", "16"))
+    RETRY_WORKER_CONCURRENCY = operation_limits(
+        os.environ.get("RETRY_WORKER_CONCURRENCY", "create_reservation=8,delete_reservation=4,decrease_loyalty=2")
+    )
+    # Failed retries back off exponentially (with jitter) in broker-side delay queues, one per tier in seconds,
+    # and move to the dead-letter queue after RETRY_MAX_ATTEMPTS failures
+    RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "8"))
+    RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", "1"))
+    RETRY_BACKOFF_MAX = float(os.environ.get("RETRY_BACKOFF_MAX", "600"))
+    RETRY_DELAY_TIERS = [int(tier) for tier in os.environ.get("RETRY_DELAY_TIERS", "1,5,30,120,600").split(",")]
@@ -0,0 +1,231 @@
+"""Non-blocking structured logging.
+
+Request threads never wait for the disk. The root handler applies the per-logger sampling and rate
+limits, tags the record with the current request ID and puts it on a bounded in-memory queue,
+dropping it if the queue is full. A background thread formats queued records as JSON lines and
+appends each batch with a single write to LOG_FILE (opened O_APPEND, so the web workers and the
+retry worker share it without interleaving) and to stderr:
+
+    {"ts": "2026-01-01T12:00:00.000+00:00", "level": "INFO", "logger": "src.queue.worker", "pid": 12, ...}
+
+Messages are only %-formatted by that thread, and never for disabled levels: log with arguments,
+logger.info("queued %s", payload), not f-strings, and do not mutate the arguments afterwards.
+
+A forked process (gunicorn worker, retry worker) starts with an empty queue and its own writer
+thread on first use.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.config import Config
+from src.utils import tracing
+
+_formatter = logging.Formatter()
+
+
+def to_json(record):
+    try:
+        message = record.getMessage()
+    except Exception:
+        message = f"{record.msg!r} % {record.args!r}"
+    entry = {
+        "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+        "level": record.levelname,
+        "logger": record.name,
+        "pid": record.process,
+        "thread": record.threadName,
+        "message": message,
+    }
+    request_id = getattr(record, "request_id", None)
+    if request_id:
+        entry["request_id"] = request_id
+    suppressed = getattr(record, "suppressed", 0)
+    if suppressed:
+        entry["suppressed"] = suppressed
+    if record.exc_info:
+        entry["exception"] = _formatter.formatException(record.exc_info)
+    return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+
+class LoggerPolicy:
+    """Per-logger sampling and rate limits, looked up by the longest configured prefix of the logger name"""
+
+    def __init__(self, sampling=None, rate_limits=None):
+        self.sampling = sampling or {}
+        self.rate_limits = rate_limits or {}
+        self._lock = threading.Lock()
+        self._rules = {}
+        # logger name -> [tokens, refilled_at, suppressed since the last admitted record]
+        self._buckets = {}
+
+    @staticmethod
+    def _lookup(table, name):
+        while name:
+            if name in table:
+                return table[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def rules(self, name):
+        rules = self._rules.get(name)
+        if rules is None:
+            rules = self._rules[name] = (self._lookup(self.sampling, name), self._lookup(self.rate_limits, name))
+        return rules
+
+    def admit(self, record):
+        """False to drop the record. An admitted record carries the number of records the rate limit
+        dropped before it, in record.suppressed"""
+        sample_rate, rate_limit = self.rules(record.name)
+        if sample_rate is not None and record.levelno < logging.WARNING and random.random() >= sample_rate:
+            return False
+        if rate_limit is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [rate_limit, now, 0]
+            # Token bucket allowing bursts of up to one second's worth of records
+            bucket[0] = min(rate_limit, bucket[0] + (now - bucket[1]) * rate_limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class LogWriter:
+    """Bounded queue of records and the thread writing them out in batches"""
+
+    def __init__(self, path=None, stream=None, queue_size=10000, batch_size=256):
+        self.path = path
+        self.stream = stream
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self._fd = None
+        if path:
+            try:
+                self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            except OSError as e:
+                print(f"Cannot open log file {path}: {e}", file=sys.stderr)
+        self._reset()
+        # The writer thread does not survive a fork, and records queued before it belong to the parent
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dropped = 0
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self, records):
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Logging must never take the process down
+                print(f"Cannot write log records: {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    records.task_done()
+
+    def _write(self, batch):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        text = "".join(to_json(record) for record in batch)
+        if dropped:
+            text += to_json(logging.LogRecord(__name__, logging.WARNING, __file__, 0, "Log queue full, dropped %d records", (dropped,), None))
+        if self._fd is not None:
+            data = text.encode()
+            while data:
+                data = data[os.write(self._fd, data):]
+        if self.stream is not None:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def flush(self, timeout=2):
+        """Wait until every queued record is written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+
+class QueueingHandler(logging.Handler):
+    def __init__(self, writer, policy):
+        super().__init__()
+        self.writer = writer
+        self.policy = policy
+
+    def handle(self, record):
+        # No handler lock: filtering and enqueueing are thread-safe on their own
+        if not self.filter(record) or not self.policy.admit(record):
+            return False
+        record.request_id = tracing.request_id()
+        self.writer.put(record)
+        return True
+
+    def emit(self, record):
+        self.writer.put(record)
+
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure(config=Config):
+    """Send the root logger's records through the queue. Once per process tree; forks inherit it."""
+    global _handler
+    with _configure_lock:
+        if _handler is None:
+            writer = LogWriter(
+                config.LOG_FILE, sys.stderr if config.LOG_STDERR else None, queue_size=config.LOG_QUEUE_SIZE, batch_size=config.LOG_BATCH_SIZE
+            )
+            _handler = QueueingHandler(writer, LoggerPolicy(config.LOG_SAMPLING, config.LOG_RATE_LIMIT))
+            root = logging.getLogger()
+            root.addHandler(_handler)
+            root.setLevel(config.LOG_LEVEL)
+            atexit.register(flush)
+        return _handler
+
+
+def flush(timeout=2):
+    if _handler is not None:
+        _handler.writer.flush(timeout)
@@ -0,0 +1,104 @@
+"""Prometheus metrics of the gateway, served on /manage/metrics.
+
+Hot paths only touch per-series values (one short uncontended lock per update, never held across
+I/O); breaker state is read from the breakers when scraped. With PROMETHEUS_MULTIPROC_DIR set (see
+the Dockerfile), every gunicorn or hypercorn worker and the retry worker write their samples to
+files in that directory, and a scrape of any worker aggregates all of them.
+"""
+
+import os
+import shutil
+import time
+
+import pybreaker
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BREAKER_STATES = {pybreaker.STATE_CLOSED: 0, pybreaker.STATE_OPEN: 1, pybreaker.STATE_HALF_OPEN: 2}
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "gateway_http_request_duration_seconds", "Gateway request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+DOWNSTREAM_SECONDS = Histogram(
+    "gateway_downstream_request_duration_seconds",
+    "Latency of calls to the backend services, by outcome (ok, error, open, deadline)",
+    ["service", "method", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+BREAKER_TRIPS = Counter("gateway_circuit_breaker_trips_total", "Times a circuit breaker opened", ["service"])
+RETRY_PUBLISHED = Counter("gateway_retry_published_total", "Retry operations accepted by the publisher, by outcome", ["outcome"])
+RETRY_CONFIRMED = Counter("gateway_retry_confirmed_total", "Retry operations settled by the broker", ["outcome"])
+RETRY_CONFIRM_SECONDS = Histogram(
+    "gateway_retry_confirm_duration_seconds", "Time from publish to broker confirm of retry operations", buckets=LATENCY_BUCKETS
+)
+RETRY_CONSUMED = Counter(
+    "gateway_retry_consumed_total", "Retry operations handled by the worker, by outcome", ["operation", "outcome"]
+)
+RETRY_HANDLE_SECONDS = Histogram(
+    "gateway_retry_handle_duration_seconds", "Time the retry worker spends replaying an operation", ["operation"], buckets=LATENCY_BUCKETS
+)
+
+
+class BreakerCollector:
+    """Current state of every circuit breaker of this process, read at scrape time"""
+
+    @staticmethod
+    def family():
+        return GaugeMetricFamily("gateway_circuit_breaker_state", "Circuit breaker state (0 closed, 1 open, 2 half-open)", labels=["service"])
+
+    def describe(self):
+        # Lets the registry check names without collecting, which would import the breakers too early
+        yield self.family()
+
+    def collect(self):
+        from src.circuit.breaker import CircuitBreakerFactory
+
+        gauge = self.family()
+        for service_name, breaker in list(CircuitBreakerFactory._breakers.items()):
+            gauge.add_metric([service_name], BREAKER_STATES.get(breaker.current_state, 0))
+        yield gauge
+
+
+def multiprocess_dir():
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def reset_multiprocess_dir():
+    """Drop the samples of a previous run; called once before any worker starts"""
+    path = multiprocess_dir()
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def registry():
+    if not multiprocess_dir():
+        return REGISTRY
+    collected = CollectorRegistry()
+    MultiProcessCollector(collected)
+    collected.register(BreakerCollector())
+    return collected
+
+
+def exposition():
+    """(body, content type) of the metrics page"""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+if not multiprocess_dir():
+    REGISTRY.register(BreakerCollector())
+
+
+class Timer:
+    """Elapsed time since creation, for observations whose labels are only known at the end"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
@@ -0,0 +1,93 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from src.config import Config
+
+
+class PoolMetrics:
+    """Counters describing how busy a downstream connection pool is"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= self.maxsize:
+                # Every pooled connection is busy: the request either waits (HTTP_POOL_BLOCK)
+                # or opens an overflow connection that is discarded afterwards
+                self.saturated += 1
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "maxsize": self.maxsize,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "requests": self.requests,
+                "saturated": self.saturated,
+            }
+
+
+class PooledSession(requests.Session):
+    """Keep-alive session bound to a single downstream service"""
+
+    def __init__(self, maxsize, block, keep_alive):
+        super().__init__()
+        self.metrics = PoolMetrics(maxsize)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxsize, pool_block=block)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def request(self, method, url, *args, **kwargs):
+        # The connection goes back to the pool once the body is read, which happens
+        # inside Session.request for non-streamed responses
+        self.metrics.acquire()
+        try:
+            return super().request(method, url, *args, **kwargs)
+        finally:
+            self.metrics.release()
+
+
+class SessionFactory:
+    _sessions = {}
+    _lock = threading.Lock()
+    _pid = None
+
+    @classmethod
+    def get_session(cls, service_name):
+        with cls._lock:
+            if cls._pid != os.getpid():
+                # Sockets inherited from a parent process (e.g. the forked retry worker) must not be reused
+                cls._sessions = {}
+                cls._pid = os.getpid()
+            if service_name not in cls._sessions:
+                cls._sessions[service_name] = PooledSession(
+                    maxsize=Config.HTTP_POOL_MAXSIZE, block=Config.HTTP_POOL_BLOCK, keep_alive=Config.HTTP_KEEP_ALIVE
+                )
+            return cls._sessions[service_name]
+
+    @classmethod
+    def default_timeout(cls):
+        return Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            sessions = dict(cls._sessions)
+        return {service_name: session.metrics.snapshot() for service_name, session in sessions.items()}
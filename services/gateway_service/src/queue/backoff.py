@@ -0,0 +1,30 @@
+import random
+
+from src.config import Config
+
+ATTEMPT_HEADER = "x-retry-attempt"
+ERROR_HEADER = "x-retry-error"
+
+
+def attempts(properties):
+    """Failed attempts recorded on a message so far"""
+    headers = (properties.headers if properties is not None else None) or {}
+    return int(headers.get(ATTEMPT_HEADER, 0))
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Seconds to wait before retry number `attempt`: exponential, capped, with equal jitter
+    (half the delay is fixed, the other half random) so failures of one outage spread out"""
+    base = Config.RETRY_BACKOFF_BASE if base is None else base
+    cap = Config.RETRY_BACKOFF_MAX if cap is None else cap
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def delay_tier(delay, tiers=None):
+    """Shortest delay tier that can hold `delay`; a message's own expiration ends the wait earlier"""
+    tiers = sorted(Config.RETRY_DELAY_TIERS if tiers is None else tiers)
+    for tier in tiers:
+        if delay <= tier:
+            return tier
+    return tiers[-1]
@@ -0,0 +1,114 @@
+"""Inspect and replay the retry dead-letter queue.
+
+    python -m src.queue.dead_letters inspect [--limit 20]
+    python -m src.queue.dead_letters replay [--limit N] [--operation decrease_loyalty]
+
+Replayed operations go back to their operation queue with a fresh attempt count.
+"""
+
+import argparse
+import sys
+
+import pika
+from src import fastjson
+from src.config import Config
+from src.queue.backoff import ATTEMPT_HEADER, ERROR_HEADER, attempts
+from src.queue.topology import DEAD_LETTER_QUEUE, declare, destination
+
+REPLAYED_HEADER = "x-retry-replayed"
+
+
+def connect():
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=Config.RABBITMQ_HOST))
+    channel = connection.channel()
+    declare(channel)
+    return connection, channel
+
+
+def describe(properties, body):
+    try:
+        message = fastjson.loads(body)
+    except ValueError:
+        message = {"body": body.decode(errors="replace")}
+    headers = properties.headers or {}
+    return {
+        "operation_type": message.get("operation_type"),
+        "username": message.get("username"),
+        "timestamp": message.get("timestamp"),
+        "attempts": attempts(properties),
+        "error": headers.get(ERROR_HEADER),
+        "replayed": headers.get(REPLAYED_HEADER, 0),
+    }
+
+
+def inspect(channel, limit=20):
+    """Peek at up to `limit` dead letters; they stay in the queue"""
+    messages = []
+    last_tag = None
+    for _ in range(limit):
+        method, properties, body = channel.basic_get(DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        last_tag = method.delivery_tag
+        messages.append(describe(properties, body))
+    if last_tag is not None:
+        channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+    return messages
+
+
+def replay(channel, limit=None, operation=None):
+    """Move dead letters (optionally only one operation type) back to their retry queues; returns how many"""
+    channel.confirm_delivery()
+    # Only what is dead-lettered now: operations that fail again during the replay are not picked up twice
+    depth = channel.queue_declare(DEAD_LETTER_QUEUE, durable=True, passive=True).method.message_count
+
+    replayed = 0
+    skipped_tag = None
+    for _ in range(depth):
+        if limit is not None and replayed >= limit:
+            break
+        method, properties, body = channel.basic_get(DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        operation_type = describe(properties, body)["operation_type"]
+        if operation is not None and operation_type != operation:
+            # Held unacked until the end, so basic_get does not hand it out again
+            skipped_tag = method.delivery_tag
+            continue
+        headers = dict(properties.headers or {})
+        headers.pop(ERROR_HEADER, None)
+        headers[ATTEMPT_HEADER] = 0
+        headers[REPLAYED_HEADER] = headers.get(REPLAYED_HEADER, 0) + 1
+        exchange, routing_key = destination(operation_type)
+        channel.basic_publish(exchange, routing_key, body, pika.BasicProperties(delivery_mode=2, headers=headers))
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+    if skipped_tag is not None:
+        channel.basic_nack(delivery_tag=skipped_tag, multiple=True, requeue=True)
+    return replayed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    inspect_parser = commands.add_parser("inspect", help="print dead letters as JSON lines, without removing them")
+    inspect_parser.add_argument("--limit", type=int, default=20)
+    replay_parser = commands.add_parser("replay", help="send dead letters back to their retry queues")
+    replay_parser.add_argument("--limit", type=int)
+    replay_parser.add_argument("--operation", help="only replay this operation type")
+    args = parser.parse_args(argv)
+
+    connection, channel = connect()
+    try:
+        if args.command == "inspect":
+            for message in inspect(channel, args.limit):
+                print(fastjson.dumps(message))
+        else:
+            print(f"Replayed {replay(channel, args.limit, args.operation)} dead letters")
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import partial
+
+import pika
+from src import fastjson
+from src.config import Config
+from src.metrics import RETRY_CONFIRM_SECONDS, RETRY_CONFIRMED, RETRY_PUBLISHED
+from src.queue.topology import declare_async, destination
+from src.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+PERSISTENT = pika.BasicProperties(delivery_mode=2)
+
+
+class PublisherMetrics:
+    """Throughput counters of the retry publisher"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.republished = 0
+        self.confirm_frames = 0
+        self.connections = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started_at
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "published": self.published,
+                "confirmed": self.confirmed,
+                "nacked": self.nacked,
+                "republished": self.republished,
+                "connections": self.connections,
+                # Above 1 when the broker acknowledges several deliveries with one multiple=True frame
+                "messages_per_confirm": round((self.confirmed + self.nacked) / self.confirm_frames, 2) if self.confirm_frames else 0,
+                "confirmed_per_second": round(self.confirmed / uptime, 2) if uptime > 0 else 0,
+            }
+
+
+class ConfirmTracker:
+    """Unconfirmed messages of one confirm-mode channel, keyed by delivery tag"""
+
+    def __init__(self):
+        self.next_tag = 1
+        self._pending = OrderedDict()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def sent(self, message):
+        self._pending[self.next_tag] = (message, time.monotonic())
+        self.next_tag += 1
+
+    def settle(self, delivery_tag, multiple):
+        """Remove and return the messages an ack or nack covers"""
+        if not multiple:
+            entry = self._pending.pop(delivery_tag, None)
+            settled = [] if entry is None else [entry]
+        else:
+            settled = []
+            while self._pending:
+                tag = next(iter(self._pending))
+                if tag > delivery_tag:
+                    break
+                settled.append(self._pending.pop(tag))
+        now = time.monotonic()
+        for _, sent_at in settled:
+            RETRY_CONFIRM_SECONDS.observe(now - sent_at)
+        return [message for message, _ in settled]
+
+    def drain(self):
+        messages = [message for message, _ in self._pending.values()]
+        self._pending.clear()
+        return messages
+
+
+class RetryPublisher:
+    """Process-wide publisher of retry operations, shared by every service client.
+
+    pika connections are not thread-safe, so callers only put messages into a bounded buffer and
+    return at once. A single I/O thread owns the connection, publishes from the buffer in batches
+    over a small pool of confirm-mode channels and settles the broker's confirms, which arrive
+    batched (multiple=True). Nacked or unconfirmed messages are buffered again, so delivery is
+    at-least-once. The connection is opened on the first publish.
+    """
+
+    _shared = None
+    _shared_pid = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, host, channels=2, buffer_size=10000, batch_size=100):
+        self.parameters = pika.ConnectionParameters(host=host, heartbeat=60, blocked_connection_timeout=300)
+        self.channel_count = channels
+        self.batch_size = batch_size
+        self.metrics = PublisherMetrics()
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._connection = None
+        self._drain_scheduled = False
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._reconnect_delay = 1
+        # Owned by the I/O thread
+        self._ready = []
+        self._trackers = {}
+        self._next_channel = 0
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared_pid != os.getpid():
+                # The I/O thread and its socket do not survive a fork, each process gets its own publisher
+                cls._shared = cls(
+                    Config.RABBITMQ_HOST,
+                    channels=Config.RABBITMQ_PUBLISH_CHANNELS,
+                    buffer_size=Config.RABBITMQ_PUBLISH_BUFFER,
+                    batch_size=Config.RABBITMQ_PUBLISH_BATCH_SIZE,
+                )
+                cls._shared_pid = os.getpid()
+                atexit.register(cls._shared.close)
+            return cls._shared
+
+    def publish(self, operation_type, payload, username, idempotency_key=None):
+        """Hand a retry operation to the I/O thread. Never blocks; False if the buffer is full.
+        Every operation carries an idempotency key, so its replays can skip work already done."""
+        request_id, parent_span_id = tracing.context()
+        message = {
+            "operation_type": operation_type,
+            "payload": payload,
+            "username": username,
+            "idempotency_key": idempotency_key or f"{operation_type}:{uuid.uuid4()}",
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            # Replays are traced under the request that queued them
+            "request_id": request_id,
+            "parent_span_id": parent_span_id,
+        }
+        try:
+            self._buffer.put_nowait((destination(operation_type), fastjson.dumps_bytes(message)))
+        except queue.Full:
+            self.metrics.add(rejected=1)
+            RETRY_PUBLISHED.labels("rejected").inc()
+            logger.error("Retry buffer full, dropping %s for %s", operation_type, username)
+            return False
+        self.metrics.add(accepted=1)
+        RETRY_PUBLISHED.labels("accepted").inc()
+        self._start()
+        self._schedule_drain()
+        return True
+
+    def stats(self):
+        with self._lock:
+            connection = self._connection
+        stats = self.metrics.snapshot()
+        stats.update(
+            buffered=self._buffer.qsize(),
+            unconfirmed=self._unconfirmed(),
+            channels=len(self._ready),
+            connected=bool(connection is not None and connection.is_open),
+        )
+        return stats
+
+    def flush(self, timeout=5):
+        """Wait until every accepted message is confirmed by the broker; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._buffer.empty() and not self._unconfirmed():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=5):
+        if self._thread is not None:
+            self.flush(timeout)
+        with self._lock:
+            self._stopping = True
+            connection, thread = self._connection, self._thread
+        self._stopped.set()
+        if connection is not None:
+            connection.ioloop.add_callback_threadsafe(connection.close)
+        if thread is not None:
+            thread.join(timeout)
+
+    def _unconfirmed(self):
+        return sum(len(tracker) for tracker in list(self._trackers.values()))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name="retry-publisher", daemon=True)
+                self._thread.start()
+
+    def _schedule_drain(self):
+        # Wake-ups are coalesced: a burst of failures costs one ioloop callback, not one per message
+        with self._lock:
+            if self._drain_scheduled or self._connection is None:
+                return
+            self._drain_scheduled = True
+            connection = self._connection
+        try:
+            connection.ioloop.add_callback_threadsafe(self._drain)
+        except Exception:
+            # The connection is going away; the buffer is drained again once channels reopen
+            with self._lock:
+                self._drain_scheduled = False
+
+    def _run(self):
+        while not self._stopping:
+            connection = pika.SelectConnection(
+                self.parameters, on_open_callback=self._on_open, on_open_error_callback=self._on_open_error, on_close_callback=self._on_close
+            )
+            with self._lock:
+                self._connection = connection
+            connection.ioloop.start()
+            with self._lock:
+                self._connection = None
+                self._drain_scheduled = False
+            if not self._stopping:
+                self._stopped.wait(self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, 30)
+
+    def _on_open(self, connection):
+        logger.info("Retry publisher connected to RabbitMQ")
+        self.metrics.add(connections=1)
+        self._reconnect_delay = 1
+        for _ in range(self.channel_count):
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_open_error(self, connection, error):
+        logger.warning("Retry publisher failed to connect to RabbitMQ: %s", error)
+        connection.ioloop.stop()
+
+    def _on_close(self, connection, reason):
+        if not self._stopping:
+            logger.warning("Retry publisher lost its RabbitMQ connection: %s", reason)
+        for tracker in self._trackers.values():
+            self._requeue(tracker.drain())
+        self._trackers = {}
+        self._ready = []
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._trackers[channel.channel_number] = ConfirmTracker()
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(
+            ack_nack_callback=partial(self._on_confirm, channel.channel_number),
+            callback=lambda _: declare_async(channel, partial(self._on_channel_ready, channel)),
+        )
+
+    def _on_channel_ready(self, channel):
+        self._ready.append(channel)
+        self._drain()
+
+    def _on_channel_closed(self, channel, reason):
+        if channel in self._ready:
+            self._ready.remove(channel)
+        tracker = self._trackers.pop(channel.channel_number, None)
+        if tracker is not None:
+            self._requeue(tracker.drain())
+        connection = channel.connection
+        if not self._stopping and connection.is_open:
+            logger.warning("Retry publisher channel closed: %s", reason)
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_confirm(self, channel_number, frame):
+        tracker = self._trackers.get(channel_number)
+        if tracker is None:
+            return
+        method = frame.method
+        settled = tracker.settle(method.delivery_tag, method.multiple)
+        if isinstance(method, pika.spec.Basic.Ack):
+            self.metrics.add(confirmed=len(settled), confirm_frames=1)
+            RETRY_CONFIRMED.labels("ack").inc(len(settled))
+        else:
+            self.metrics.add(nacked=len(settled), confirm_frames=1)
+            RETRY_CONFIRMED.labels("nack").inc(len(settled))
+            self._requeue(settled)
+
+    def _requeue(self, messages):
+        for message in messages:
+            try:
+                self._buffer.put_nowait(message)
+            except queue.Full:
+                self.metrics.add(rejected=1)
+                logger.error("Retry buffer full, dropping an unconfirmed retry operation")
+                continue
+            self.metrics.add(republished=1)
+        if messages:
+            self._schedule_drain()
+
+    def _drain(self):
+        with self._lock:
+            self._drain_scheduled = False
+        published = 0
+        while self._ready and published < self.batch_size:
+            try:
+                message = self._buffer.get_nowait()
+            except queue.Empty:
+                break
+            channel = self._ready[self._next_channel % len(self._ready)]
+            self._next_channel += 1
+            try:
+                (exchange, routing_key), body = message
+                channel.basic_publish(exchange, routing_key, body, PERSISTENT)
+            except Exception as e:
+                logger.warning("Retry publish failed, buffering it again: %s", e)
+                self._requeue([message])
+                break
+            self._trackers[channel.channel_number].sent(message)
+            published += 1
+        self.metrics.add(published=published)
+        if published == self.batch_size:
+            # Let the ioloop process confirms and heartbeats before the next batch
+            self._schedule_drain()
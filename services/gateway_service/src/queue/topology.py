@@ -0,0 +1,71 @@
+"""Broker topology of the retry pipeline, declared by both the publisher and the worker.
+
+Retry operations go to the direct exchange `retry` with the operation type as routing key, so
+each type has its own durable queue and is consumed with its own prefetch and concurrency.
+`retry_queue` is the single queue of earlier gateways; it is still consumed until it drains.
+
+Failed operations wait in a delay tier before they are retried: a fanout exchange `retry.delay.<n>s`
+feeding a queue whose messages expire after at most n seconds (less with a per-message expiration)
+and are then dead-lettered back to `retry` under their original routing key. Operations that
+exhaust their attempts end in `retry.dead`.
+"""
+
+from functools import partial
+
+from src.config import Config
+
+RETRY_EXCHANGE = "retry"
+LEGACY_RETRY_QUEUE = "retry_queue"
+DEAD_LETTER_QUEUE = "retry.dead"
+OPERATIONS = ("create_reservation", "delete_reservation", "decrease_loyalty")
+
+
+def retry_queue(operation_type):
+    return f"retry.{operation_type}"
+
+
+def delay_exchange(tier):
+    return f"retry.delay.{tier}s"
+
+
+def destination(operation_type):
+    """(exchange, routing key) to publish an operation to. Types without a queue of their own go to the legacy queue."""
+    if operation_type in OPERATIONS:
+        return RETRY_EXCHANGE, operation_type
+    return "", LEGACY_RETRY_QUEUE
+
+
+def declarations(channel):
+    """Declaration calls, in order. Call them directly on a blocking channel; on an asynchronous
+    channel chain them through their `callback` argument (see declare_async)."""
+    steps = [
+        partial(channel.exchange_declare, RETRY_EXCHANGE, exchange_type="direct", durable=True),
+        partial(channel.queue_declare, LEGACY_RETRY_QUEUE, durable=True),
+        partial(channel.queue_declare, DEAD_LETTER_QUEUE, durable=True),
+    ]
+    for tier in Config.RETRY_DELAY_TIERS:
+        arguments = {"x-message-ttl": tier * 1000, "x-dead-letter-exchange": RETRY_EXCHANGE}
+        steps.append(partial(channel.exchange_declare, delay_exchange(tier), exchange_type="fanout", durable=True))
+        steps.append(partial(channel.queue_declare, delay_exchange(tier), durable=True, arguments=arguments))
+        steps.append(partial(channel.queue_bind, delay_exchange(tier), delay_exchange(tier)))
+    for operation_type in OPERATIONS:
+        steps.append(partial(channel.queue_declare, retry_queue(operation_type), durable=True))
+        steps.append(partial(channel.queue_bind, retry_queue(operation_type), RETRY_EXCHANGE, routing_key=operation_type))
+    return steps
+
+
+def declare(channel):
+    for step in declarations(channel):
+        step()
+
+
+def declare_async(channel, on_declared):
+    steps = declarations(channel)
+
+    def next_step(_frame=None):
+        if steps:
+            steps.pop(0)(callback=next_step)
+        else:
+            on_declared()
+
+    next_step()
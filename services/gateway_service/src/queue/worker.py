@@ -1,18 +1,41 @@
 import pika
-import json
 import logging
 import time
-from src.services.base import BaseServiceClient
+from concurrent.futures import ThreadPoolExecutor
+from src import fastjson
 from src.services.reservation import ReservationService
 from src.config import Config
+from src.cache.idempotency import OPERATION_DONE
+from src.metrics import RETRY_CONSUMED, RETRY_HANDLE_SECONDS, Timer
+from src.queue.backoff import ATTEMPT_HEADER, ERROR_HEADER, attempts, backoff_delay, delay_tier
+from src.queue.topology import DEAD_LETTER_QUEUE, LEGACY_RETRY_QUEUE, OPERATIONS, declare, delay_exchange, retry_queue
+from src.utils import tracing
 
 logger = logging.getLogger(__name__)
 
 
 class RetryWorker:
+    """Consumes the retry queues and replays operations on per-operation handler pools.
+
+    Every operation type has its own queue, consumed on its own channel with a prefetch window of
+    RETRY_WORKER_PREFETCH, and its own pool of RETRY_WORKER_CONCURRENCY handler threads, so a flood
+    of one type cannot starve the others. pika connections are not thread-safe: handlers hand their
+    ack or nack back to the connection thread with add_callback_threadsafe.
+
+    A failed operation is not requeued right away: it is republished to a delay tier with its
+    attempt count and an exponential, jittered expiration, or to the dead-letter queue once it has
+    failed RETRY_MAX_ATTEMPTS times, and the original delivery is acked.
+    """
+
     def __init__(self):
         self.reservation_service = ReservationService()
-        self.base_service = BaseServiceClient()
+        self.idempotency = self.reservation_service.idempotency
+        self.executors = {
+            operation_type: ThreadPoolExecutor(
+                max_workers=Config.RETRY_WORKER_CONCURRENCY.get(operation_type, 1), thread_name_prefix=f"retry-{operation_type}"
+            )
+            for operation_type in OPERATIONS
+        }
         self._connect()
 
     def _connect(self):
@@ -30,73 +53,180 @@ class RetryWorker:
                 )
                 self.connection = pika.BlockingConnection(parameters)
                 self.channel = self.connection.channel()
-                self.channel.queue_declare(queue="retry_queue", durable=True)
+                declare(self.channel)
+                # Used to republish failed operations; the original is only acked once the broker confirms
+                self.channel.confirm_delivery()
                 logger.info("Successfully connected to RabbitMQ")
                 return
             except pika.exceptions.AMQPConnectionError:
                 retries += 1
-                logger.warning(f"Failed to connect to RabbitMQ. Retry {retries}/{max_retries}")
+                logger.warning("Failed to connect to RabbitMQ. Retry %s/%s", retries, max_retries)
                 time.sleep(5)
 
         raise Exception("Failed to connect to RabbitMQ after multiple attempts")
 
-    def process_message(self, ch, method, properties, body):
+    def _consume(self):
+        for queue in [retry_queue(operation_type) for operation_type in OPERATIONS] + [LEGACY_RETRY_QUEUE]:
+            channel = self.connection.channel()
+            channel.basic_qos(prefetch_count=Config.RETRY_WORKER_PREFETCH)
+            channel.basic_consume(queue=queue, on_message_callback=self.dispatch)
+
+    def dispatch(self, ch, method, properties, body):
+        """Runs on the connection thread: hands the message to the pool of its operation type"""
         try:
-            message = json.loads(body)
+            message = fastjson.loads(body)
             operation_type = message["operation_type"]
-            payload = message["payload"]
-            username = message["username"]
-
-            if operation_type == "create_reservation":
-                result = self.reservation_service.create_reservation(username, payload["reservation"])
-                if result and "status" not in result:
-                    logger.info("Successfully processed retry for reservation")
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-                else:
-                    logger.warning("Failed to process retry, will retry later")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-            elif operation_type == "delete_reservation":
-                result = self.reservation_service.delete_reservation(username, payload["reservation_uid"])
-                if result:
-                    logger.info("Successfully processed retry for reservation deletion")
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-                else:
-                    logger.warning("Failed to process retry, will retry later")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-            elif operation_type == "decrease_loyalty":
+        except Exception as e:
+            # Malformed messages can never succeed
+            logger.error("Error processing message: %s", e)
+            try:
+                self._dead_letter(properties, body, f"malformed message: {e}")
+            except Exception:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                return
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        executor = self.executors.get(operation_type)
+        if executor is None:
+            logger.warning("Unknown operation type: %s", operation_type)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        executor.submit(self._handle, ch, method.delivery_tag, properties, body, message)
+
+    def _handle(self, ch, delivery_tag, properties, body, message):
+        error = "operation failed"
+        timer = Timer()
+        root = tracing.start_trace(f"retry {message['operation_type']}", message.get("request_id"), message.get("parent_span_id"))
+        try:
+            success = self.process_message(message)
+        except Exception as e:
+            logger.error("Error processing message: %s", e)
+            success, error = False, str(e)
+        tracing.finish_trace(root, "ok" if success else "error")
+        RETRY_HANDLE_SECONDS.labels(message["operation_type"]).observe(timer.elapsed())
+        RETRY_CONSUMED.labels(message["operation_type"], "succeeded" if success else "failed").inc()
+        self._settle(ch, delivery_tag, success, properties, body, message["operation_type"], error)
+
+    def _settle(self, ch, delivery_tag, success, properties, body, operation_type, error):
+        def settle():
+            if not ch.is_open:
+                # The broker redelivers the unacked messages of a closed channel
+                return
+            if not success:
                 try:
-                    result = self.base_service.circuit_breaker_request(
-                        "loyalty", "POST", f"{Config.LOYALTY_SERVICE_URL}/loyalty/decrease", headers={"X-User-Name": username}
-                    )
-                    if result:
-                        logger.info("Successfully processed retry for loyalty decrease")
-                        ch.basic_ack(delivery_tag=method.delivery_tag)
-                    else:
-                        logger.warning("Failed to process retry, will retry later")
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                    self._retry_later(properties, body, operation_type, error)
                 except Exception as e:
-                    logger.error(f"Error decreasing loyalty: {str(e)}")
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-
-            else:
-                logger.warning(f"Unknown operation type: {operation_type}")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                    logger.error("Could not schedule retry, requeueing: %s", e)
+                    ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                    return
+            ch.basic_ack(delivery_tag=delivery_tag)
 
+        try:
+            ch.connection.add_callback_threadsafe(settle)
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            logger.warning("Could not settle retry message, it will be redelivered: %s", e)
+
+    def _retry_later(self, properties, body, operation_type, error):
+        attempt = attempts(properties) + 1
+        if attempt >= Config.RETRY_MAX_ATTEMPTS:
+            logger.error("Giving up on %s after %s attempts: %s", operation_type, attempt, error)
+            self._dead_letter(properties, body, error, attempt)
+            RETRY_CONSUMED.labels(operation_type, "dead_lettered").inc()
+            return
+        delay = backoff_delay(attempt)
+        tier = delay_tier(delay)
+        headers = dict((properties.headers if properties is not None else None) or {}, **{ATTEMPT_HEADER: attempt})
+        retry_properties = pika.BasicProperties(delivery_mode=2, headers=headers, expiration=str(int(delay * 1000)))
+        self.channel.basic_publish(delay_exchange(tier), operation_type, body, retry_properties)
+        logger.info("Retrying %s in %.1fs (attempt %s)", operation_type, delay, attempt)
+
+    def _dead_letter(self, properties, body, error, attempt=None):
+        headers = dict((properties.headers if properties is not None else None) or {}, **{ERROR_HEADER: error})
+        if attempt is not None:
+            headers[ATTEMPT_HEADER] = attempt
+        self.channel.basic_publish("", DEAD_LETTER_QUEUE, body, pika.BasicProperties(delivery_mode=2, headers=headers))
+
+    def process_message(self, message):
+        """Replays one operation; True when it succeeded and the message can be acked.
+        Redeliveries of an operation that already succeeded are acked without any downstream call, and one
+        whose key is claimed by a running request or retry is retried later."""
+        key = message.get("idempotency_key")
+        if not key:
+            return self._replay(message, key)
+        if self.idempotency.get(key, OPERATION_DONE):
+            logger.info("Skipping %s, already processed", message["operation_type"])
+            return True
+        token = self.idempotency.claim(key)
+        if token is None:
+            logger.info("%s is in progress elsewhere, will retry later", message["operation_type"])
+            return False
+        try:
+            if self.idempotency.get(key, OPERATION_DONE):
+                return True
+            success = self._replay(message, key)
+            if success:
+                self.idempotency.put(key, OPERATION_DONE, True)
+            return success
+        finally:
+            self.idempotency.release(key, token)
+
+    def _replay(self, message, key):
+        operation_type = message["operation_type"]
+        payload = message["payload"]
+        username = message["username"]
+
+        if operation_type == "create_reservation":
+            result = self.reservation_service.create_reservation(username, payload["reservation"], idempotency_key=key, queue_retry=False)
+            if self._reservation_created(result):
+                logger.info("Successfully processed retry for reservation")
+                return True
+        elif operation_type == "delete_reservation":
+            result = self.reservation_service.delete_reservation(username, payload["reservation_uid"], idempotency_key=key)
+            if result:
+                logger.info("Successfully processed retry for reservation deletion")
+                return True
+        elif operation_type == "decrease_loyalty":
+            try:
+                result = self.idempotency.step(key, "loyalty_decrease", lambda: self.reservation_service.loyalty_service.decrease_loyalty(username))
+            except Exception as e:
+                logger.error("Error decreasing loyalty: %s", e)
+                return False
+            if result:
+                logger.info("Successfully processed retry for loyalty decrease")
+                return True
+
+        logger.warning("Failed to process retry, will retry later")
+        return False
+
+    @staticmethod
+    def _reservation_created(result):
+        """create_reservation returns the paid reservation on success; a PENDING answer means it queued
+        the operation again, and error answers carry a status_code"""
+        return (
+            isinstance(result, dict)
+            and "reservationUid" in result
+            and "status_code" not in result
+            and result.get("status") not in (None, "PENDING")
+        )
 
     def start(self):
         while True:
             try:
-                self.channel.basic_qos(prefetch_count=1)
-                self.channel.basic_consume(queue="retry_queue", on_message_callback=self.process_message)
-                logger.info("Started consuming messages from retry queue")
-                self.channel.start_consuming()
+                self._consume()
+                logger.info("Started consuming messages from retry queues")
+                while self.connection.is_open:
+                    # Also runs the acks and nacks queued by handlers with add_callback_threadsafe
+                    self.connection.process_data_events(time_limit=1)
+                logger.error("Lost connection to RabbitMQ. Attempting to reconnect...")
             except pika.exceptions.AMQPConnectionError:
                 logger.error("Lost connection to RabbitMQ. Attempting to reconnect...")
-                time.sleep(5)
-                self._connect()
             except Exception as e:
-                logger.error(f"Unexpected error in worker: {str(e)}")
-                time.sleep(5)
+                logger.error("Unexpected error in worker: %s", e)
+            try:
+                # Start over on a fresh connection, unacked messages are redelivered
+                self.connection.close()
+            except Exception:
+                pass
+            time.sleep(5)
+            self._connect()
@@ -0,0 +1,10 @@
+"""Precompiled loaders for payloads of our own services.
+
+Responses of the backend services are built by our own code from database rows and already went
+through the service's schemas, so by default (TRUSTED_INTERNAL_PAYLOADS) the gateway loads them with
+a plan compiled once per schema instead of a full marshmallow load: validators are skipped, the
+result is the same dict. The implementation is services/common/compiled.py, which the backend
+services use for their own responses; the image copies it next to src/.
+"""
+
+from compiled import CompiledSchema  # noqa: F401
@@ -45,3 +45,4 @@ class HotelPaginationSchema(Schema):
     pageSize = fields.Int(required=True)
     totalElements = fields.Int(required=True)
     items = fields.List(fields.Nested(HotelResponseSchema), required=True)
+    nextCursor = fields.Str(allow_none=True)
@@ -1,5 +1,4 @@
-from marshmallow import Schema, fields, post_load, validate, EXCLUDE
-from typing import Any, Dict
+from marshmallow import Schema, fields, validate, EXCLUDE
 from src.schemas.hotel import HotelInfoSchema
 from src.schemas.payment import PaymentInfoSchema
 from src.schemas.enums import ReservationStatus
@@ -14,12 +13,6 @@ class ReservationResponseSchema(Schema):
     startDate = fields.Date(format="%Y-%m-%d")
     endDate = fields.Date(format="%Y-%m-%d")
 
-    @post_load
-    def change_dates_to_str(self, data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-        data["startDate"] = data["startDate"].strftime("%Y-%m-%d")
-        data["endDate"] = data["endDate"].strftime("%Y-%m-%d")
-        return data
-
 
 class ReservationSchema(Schema):
     class Meta:
@@ -0,0 +1,347 @@
+"""Asyncio counterparts of the service clients, used by the async serving mode.
+
+Request building, schemas and pure helpers are inherited from the sync clients; only the methods
+that wait on a downstream service are overridden as coroutines.
+"""
+
+import asyncio
+import contextvars
+import logging
+from http import HTTPStatus
+
+import aiohttp
+import pybreaker
+from src.api.exceptions import SchemaValidationError, ServiceUnavailableError
+from src.cache.ttl import FRESH, STALE
+from src import fastjson
+from src.circuit.breaker import CircuitBreakerFactory
+from src.config import Config
+from src.metrics import DOWNSTREAM_SECONDS, Timer
+from src.services.base import BaseServiceClient, fallback_response
+from src.services.hotel import HotelService
+from src.services.loyalty import LoyaltyService
+from src.services.payment import PaymentService
+from src.services.reservation import ReservationService
+from src.utils import deadline, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSessionFactory:
+    """One aiohttp session (and connection pool) per downstream service, bound to the running loop"""
+
+    _sessions = {}
+
+    @classmethod
+    def get_session(cls, service_name):
+        session = cls._sessions.get(service_name)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=Config.HTTP_POOL_MAXSIZE, force_close=not Config.HTTP_KEEP_ALIVE)
+            timeout = aiohttp.ClientTimeout(connect=Config.HTTP_CONNECT_TIMEOUT, sock_read=Config.HTTP_READ_TIMEOUT)
+            session = cls._sessions[service_name] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return session
+
+    @classmethod
+    def stats(cls):
+        """Counterpart of SessionFactory.stats(). aiohttp keeps no counters of its own, so in-flight, idle
+        and waiting requests are read off the connector's internals (zero where a version lacks them)."""
+        stats = {}
+        for service_name, session in list(cls._sessions.items()):
+            connector = session.connector
+            if session.closed or connector is None:
+                continue
+            stats[service_name] = {
+                "maxsize": connector.limit,
+                "in_flight": len(getattr(connector, "_acquired", ())),
+                "idle": sum(len(connections) for connections in getattr(connector, "_conns", {}).values()),
+                "waiting": sum(len(waiters) for waiters in getattr(connector, "_waiters", {}).values()),
+            }
+        return stats
+
+    @classmethod
+    async def close_all(cls):
+        sessions, cls._sessions = cls._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+
+class AsyncBaseServiceClient(BaseServiceClient):
+    async def circuit_breaker_request(self, service_name, method, url, schema=None, response_meta=None, **kwargs):
+        try:
+            connect_timeout, read_timeout = deadline.timeout(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+        except deadline.DeadlineExceeded:
+            logger.warning("Request deadline exceeded before calling %s", service_name)
+            DOWNSTREAM_SECONDS.labels(service_name, method, "deadline").observe(0)
+            return fallback_response(service_name)
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=deadline.remaining(), connect=connect_timeout, sock_read=read_timeout))
+        breaker = CircuitBreakerFactory.get_breaker(service_name)
+        session = AsyncSessionFactory.get_session(service_name)
+        span = tracing.start_span(f"{service_name} {method}")
+        kwargs["headers"] = tracing.headers(deadline.headers(kwargs.get("headers")))
+
+        async def make_request():
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    content = await response.read()
+            except asyncio.TimeoutError:
+                if deadline.expired():
+                    raise deadline.DeadlineExceeded(f"Request deadline exceeded calling {service_name}")
+                raise
+            if response_meta is not None:
+                response_meta.update(status=response.status)
+            if response.status == HTTPStatus.NOT_FOUND:
+                raise SchemaValidationError("Resource not found")
+            if response.status == HTTPStatus.SERVICE_UNAVAILABLE:
+                raise ServiceUnavailableError(f"{service_name} is unavailable")
+            if response.status == HTTPStatus.GATEWAY_TIMEOUT and deadline.remaining() is not None:
+                raise deadline.DeadlineExceeded(f"Request deadline exceeded in {service_name}")
+            response.raise_for_status()
+
+            if response_meta is not None:
+                response_meta.update(etag=response.headers.get("ETag"))
+            return self.load_response_body(fastjson.loads(content) if content else None, schema)
+
+        timer, outcome = Timer(), "ok"
+        try:
+            return await breaker.call_coroutine(make_request)
+        except pybreaker.CircuitBreakerError:
+            outcome = "open"
+            return fallback_response(service_name)
+        except ServiceUnavailableError:
+            outcome = "error"
+            raise
+        except deadline.DeadlineExceeded as e:
+            outcome = "deadline"
+            logger.warning("%s", e)
+            return fallback_response(service_name)
+        except Exception as e:
+            outcome = "error"
+            logger.error("Error making request to %s: %s", service_name, e)
+            return fallback_response(service_name)
+        finally:
+            tracing.end_span(span, outcome)
+            DOWNSTREAM_SECONDS.labels(service_name, method, outcome).observe(timer.elapsed())
+
+    async def queue_for_retry(self, operation_type, payload, username, idempotency_key=None):
+        # Only hands the message to the publisher's I/O thread, safe to call on the event loop
+        return super().queue_for_retry(operation_type, payload, username, idempotency_key)
+
+
+class AsyncHotelService(AsyncBaseServiceClient, HotelService):
+    def __init__(self):
+        super().__init__()
+        self._refresh_tasks = set()
+
+    async def _cached_get(self, key, url, schema, validators=(), meta=None, **kwargs):
+        if self.cache is None:
+            response_meta = {}
+            data = await self.circuit_breaker_request(
+                "hotel", "GET", url, schema=schema, headers=self._conditional_headers(None, validators), response_meta=response_meta, **kwargs
+            )
+            return self._report(data, response_meta, meta)
+
+        entry, state = self.cache.lookup(key)
+        if state == FRESH:
+            return self._report(entry.value, {"etag": entry.etag}, meta)
+        if state == STALE:
+            if self.cache.begin_refresh(key):
+                # In a fresh context, like the refresh threads of the sync client: the refresh must not inherit
+                # this request's deadline or trace. (create_task(context=...) needs Python 3.11, the image runs 3.9)
+                task = contextvars.Context().run(asyncio.create_task, self._refresh(key, entry, url, schema, **kwargs))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return self._report(entry.value, {"etag": entry.etag}, meta)
+        return await self._revalidate(key, entry, url, schema, validators, meta, **kwargs)
+
+    async def _revalidate(self, key, entry, url, schema, validators=(), meta=None, **kwargs):
+        response_meta = {}
+        data = await self.circuit_breaker_request(
+            "hotel", "GET", url, schema=schema, headers=self._conditional_headers(entry, validators), response_meta=response_meta, **kwargs
+        )
+        return self._report(self._store(key, entry, data, response_meta), response_meta, meta)
+
+    async def _refresh(self, key, entry, url, schema, **kwargs):
+        try:
+            await self._revalidate(key, entry, url, schema, **kwargs)
+        finally:
+            self.cache.end_refresh(key)
+
+
+class AsyncPaymentService(AsyncBaseServiceClient, PaymentService):
+    async def get_payments(self, username, reservation_uids):
+        """Bulk lookup keyed by reservationUid. Returns None when the payment service has no bulk endpoint;
+        reservations of a chunk the lookup failed for are left out, and get the payment fallback."""
+        payments = {}
+        for start in range(0, len(reservation_uids), Config.PAYMENT_BATCH_SIZE):
+            chunk = reservation_uids[start : start + Config.PAYMENT_BATCH_SIZE]
+            response_meta = {}
+            try:
+                response = await self.circuit_breaker_request(
+                    "payment",
+                    "POST",
+                    f"{self.base_url}/payment/batch",
+                    headers={"X-User-Name": username},
+                    json={"reservationUids": chunk},
+                    response_meta=response_meta,
+                )
+            except ServiceUnavailableError:
+                continue
+            if self.missing_bulk_endpoint(response_meta):
+                return None
+            if response and "items" in response:
+                payments.update(response["items"])
+        return payments
+
+
+class AsyncLoyaltyService(AsyncBaseServiceClient, LoyaltyService):
+    async def fetch_loyalty(self, username, schema=None):
+        loyalty = self.cache.get(username) if self.cache else None
+        if loyalty is None:
+            # Like the breaker state, the shared version table is a lock-free mmap read: fine on the event loop
+            version = self.cache.version(username) if self.cache else None
+            response_meta = {}
+            loyalty = await self.circuit_breaker_request(
+                "loyalty", "GET", f"{self.base_url}/loyalty", headers={"X-User-Name": username}, response_meta=response_meta
+            )
+            if response_meta.get("status") != HTTPStatus.OK or not loyalty:
+                return loyalty
+            if self.cache:
+                self.cache.set(username, loyalty, version)
+
+        try:
+            return self.load_response_body(dict(loyalty), schema)
+        except SchemaValidationError:
+            return fallback_response("loyalty")
+
+    async def get_loyalty(self, username, direct=False):
+        """`direct` replaces is_direct_loyalty_request(), which needs a Flask request context"""
+        response = await self.fetch_loyalty(username, schema=self.schema)
+        if response:
+            return response, HTTPStatus.OK
+        if direct:
+            return {"message": "Loyalty Service unavailable"}, HTTPStatus.SERVICE_UNAVAILABLE
+        return {}, HTTPStatus.OK
+
+    async def update_loyalty(self, username):
+        response = await self.circuit_breaker_request("loyalty", "POST", f"{self.base_url}/loyalty", headers={"X-User-Name": username})
+        self.invalidate(username, response)
+        return response
+
+    async def decrease_loyalty(self, username):
+        response = await self.circuit_breaker_request(
+            "loyalty", "POST", f"{self.base_url}/loyalty/decrease", headers={"X-User-Name": username}
+        )
+        self.invalidate(username, response)
+        return response
+
+
+class AsyncReservationService(AsyncBaseServiceClient, ReservationService):
+    def __init__(self):
+        super().__init__(payment_service=AsyncPaymentService(), loyalty_service=AsyncLoyaltyService())
+
+    async def get_user_reservations(self, username):
+        reservations = await self.circuit_breaker_request(
+            "reservation", "GET", f"{self.base_url}/reservations", headers={"X-User-Name": username}, schema=self.many_schema
+        )
+
+        if reservations:
+            return await self._enrich_reservations(username, reservations)
+        return []
+
+    async def get_reservation(self, username, reservation_uid):
+        reservation = await self.circuit_breaker_request(
+            "reservation", "GET", f"{self.base_url}/reservations/{reservation_uid}", headers={"X-User-Name": username}, schema=self.schema
+        )
+
+        if reservation:
+            return await self._enrich_reservation(username, reservation)
+        return None
+
+    async def create_reservation(self, username, request_data, idempotency_key=None, queue_retry=True):
+        try:
+            loyalty = await self.idempotency.step_coroutine(idempotency_key, "loyalty", lambda: self.loyalty_service.fetch_loyalty(username))
+
+            if not loyalty:
+                return {"message": "Loyalty Service unavailable", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
+            reservation = await self.idempotency.step_coroutine(
+                idempotency_key,
+                "reservation",
+                lambda: self.circuit_breaker_request(
+                    "reservation", "POST", f"{self.base_url}/reservations", headers={"X-User-Name": username}, json=request_data
+                ),
+                succeeded=lambda created: bool(created) and "reservationUid" in created,
+            )
+
+            if not reservation:
+                raise Exception("Failed to create reservation")
+
+            # Create payment
+            payment_data = self._build_payment_data(reservation, loyalty)
+            payment = await self.idempotency.step_coroutine(
+                idempotency_key, "payment", lambda: self.payment_service.create_payment(username, payment_data)
+            )
+
+            if not payment:
+                # Rollback reservation if payment fails
+                await self.delete_reservation(username, reservation["reservationUid"])
+                if idempotency_key:
+                    await asyncio.to_thread(self.idempotency.forget, idempotency_key, "reservation")
+
+                # Queue for retry
+                if queue_retry:
+                    retry_data = {"reservation": request_data, "payment": payment_data}
+                    await self.queue_for_retry("create_reservation", retry_data, username, idempotency_key)
+
+                # Return success to user
+                return {"message": "Reservation queued for processing", "status": "PENDING", "reservationUid": reservation["reservationUid"]}
+
+            reservation["payment"] = payment
+            reservation["status"] = payment["status"]
+            await self.idempotency.step_coroutine(idempotency_key, "loyalty_update", lambda: self.loyalty_service.update_loyalty(username))
+
+            del reservation["price"]
+            return reservation
+
+        except aiohttp.ClientError:
+            return {"message": "Service unavailable", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
+
+        except Exception:
+            # Queue for retry
+            if queue_retry:
+                retry_data = {"reservation": request_data}
+                await self.queue_for_retry("create_reservation", retry_data, username, idempotency_key)
+
+            # Return temporary response
+            return {"message": "Reservation queued for processing", "status": "PENDING", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
+
+    async def delete_reservation(self, username, reservation_uid, idempotency_key=None):
+        reservation = await self.circuit_breaker_request(
+            "reservation", "DELETE", f"{self.base_url}/reservations/{reservation_uid}", headers={"X-User-Name": username}
+        )
+
+        if reservation is None:
+            payment = await self.payment_service.get_payment(username, reservation_uid)
+            if payment:
+
+                await self.payment_service.delete_payment(username, payment["paymentUid"])
+
+                x = await self.idempotency.step_coroutine(
+                    idempotency_key, "loyalty_decrease", lambda: self.loyalty_service.decrease_loyalty(username)
+                )
+                if x == {}:
+                    retry_data = {"operation_type": "decrease_loyalty", "username": username}
+                    child_key = f"{idempotency_key}:decrease_loyalty" if idempotency_key else None
+                    await self.queue_for_retry("decrease_loyalty", retry_data, username, child_key)
+                return True
+        return False
+
+    async def _enrich_reservations(self, username, reservations):
+        payments = await self.payment_service.get_payments(username, [str(reservation["reservationUid"]) for reservation in reservations])
+        if payments is None:
+            # Payment service without the bulk endpoint: one lookup per reservation, concurrently
+            return list(await asyncio.gather(*(self._enrich_reservation(username, reservation) for reservation in reservations)))
+        return [self._apply_payment(reservation, payments.get(str(reservation["reservationUid"]))) for reservation in reservations]
+
+    async def _enrich_reservation(self, username, reservation):
+        payment = await self.payment_service.get_payment(username, reservation["reservationUid"])
+        return self._apply_payment(reservation, payment)
@@ -4,16 +4,13 @@ from http import HTTPStatus
 import requests
 from marshmallow import ValidationError
 import pybreaker
+from src import fastjson
 from src.api.exceptions import SchemaValidationError, ServiceUnavailableError
 from src.circuit.breaker import CircuitBreakerFactory
-from src.queue.rabbitmq import RabbitMQClient
-
-logging.basicConfig(
-    level=logging.INFO,  # Set the desired log level
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("/var/log/flask_app.log"), logging.StreamHandler()],  # Log to a file  # Also log to stdout (for Docker logs)
-)
-
+from src.pool.session import SessionFactory
+from src.metrics import DOWNSTREAM_SECONDS, Timer
+from src.queue.publisher import RetryPublisher
+from src.utils import deadline, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -25,59 +22,90 @@ def fallback_response(service_name):
 
 
 class BaseServiceClient:
-    def __init__(self):
-        self.rabbitmq_client = RabbitMQClient()
-
     @staticmethod
     def check_user_header(headers):
         if "X-User-Name" not in headers:
             raise SchemaValidationError("X-User-Name header is required")
         return headers.get("X-User-Name")
 
-    def circuit_breaker_request(self, service_name, method, url, schema=None, **kwargs):
+    @staticmethod
+    def load_response_body(data, schema=None):
+        if schema and data is not None:
+            try:
+                return schema.load(data)
+            except ValidationError as e:
+                raise SchemaValidationError("Invalid response format", e.messages)
+
+        return data
+
+    def circuit_breaker_request(self, service_name, method, url, schema=None, response_meta=None, **kwargs):
+        """`response_meta`, when given, is filled with the status code of the response and, if it succeeded, its ETag"""
 
+        try:
+            kwargs.setdefault("timeout", deadline.timeout(*SessionFactory.default_timeout()))
+        except deadline.DeadlineExceeded:
+            # Nobody waits for the answer anymore; not a failure of the service
+            logger.warning("Request deadline exceeded before calling %s", service_name)
+            DOWNSTREAM_SECONDS.labels(service_name, method, "deadline").observe(0)
+            return fallback_response(service_name)
         breaker = CircuitBreakerFactory.get_breaker(service_name)
+        session = SessionFactory.get_session(service_name)
+        span = tracing.start_span(f"{service_name} {method}")
+        kwargs["headers"] = tracing.headers(deadline.headers(kwargs.get("headers")))
 
         @breaker
         def make_request():
             try:
-                response = requests.request(method, url, **kwargs)
+                response = session.request(method, url, **kwargs)
                 response.raise_for_status()
 
-                if schema and response.content:
-                    try:
-                        return schema.load(response.json())
-                    except ValidationError as e:
-
-                        raise SchemaValidationError("Invalid response format", e.messages)
+                if response_meta is not None:
+                    response_meta.update(status=response.status_code, etag=response.headers.get("ETag"))
+                return self.load_response_body(fastjson.loads(response.content) if response.content else None, schema)
 
-                return response.json() if response.content else None
+            except requests.exceptions.Timeout:
+                if deadline.expired():
+                    raise deadline.DeadlineExceeded(f"Request deadline exceeded calling {service_name}")
+                raise
 
             except requests.exceptions.HTTPError as e:
-
+                if response_meta is not None:
+                    response_meta.update(status=response.status_code)
                 if response.status_code == HTTPStatus.NOT_FOUND:
                     raise SchemaValidationError("Resource not found")
                 if response.status_code == HTTPStatus.SERVICE_UNAVAILABLE:
                     raise ServiceUnavailableError(f"{service_name} is unavailable")
+                if response.status_code == HTTPStatus.GATEWAY_TIMEOUT and deadline.remaining() is not None:
+                    # The service stopped working on it when the budget we forwarded ran out
+                    raise deadline.DeadlineExceeded(f"Request deadline exceeded in {service_name}")
                 raise e
 
+        timer, outcome = Timer(), "ok"
         try:
-
             return make_request()
         except pybreaker.CircuitBreakerError:
+            outcome = "open"
             return fallback_response(service_name)
         except ServiceUnavailableError:
+            outcome = "error"
             raise
+        except deadline.DeadlineExceeded as e:
+            outcome = "deadline"
+            logger.warning("%s", e)
+            return fallback_response(service_name)
         except Exception as e:
-            logger.error(f"Error making request to {service_name}: {str(e)}")
+            outcome = "error"
+            logger.error("Error making request to %s: %s", service_name, e)
             return fallback_response(service_name)
+        finally:
+            tracing.end_span(span, outcome)
+            DOWNSTREAM_SECONDS.labels(service_name, method, outcome).observe(timer.elapsed())
 
-    def queue_for_retry(self, operation_type, payload, username):
+    def queue_for_retry(self, operation_type, payload, username, idempotency_key=None):
         try:
-            logger.info(f"queue for retry {operation_type}, {payload}")
+            logger.info("queue for retry %s, %s", operation_type, payload)
 
-            self.rabbitmq_client.publish_retry_operation(operation_type, payload, username)
-            return True
+            return RetryPublisher.shared().publish(operation_type, payload, username, idempotency_key)
         except Exception as e:
-            logger.error(f"Failed to queue retry operation: {str(e)}")
+            logger.error("Failed to queue retry operation: %s", e)
             return False
@@ -1,4 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from src.cache.ttl import TTLCache, FRESH, STALE
 from src.services.base import BaseServiceClient
+from src.schemas.compiled import CompiledSchema
 from src.schemas.hotel import HotelResponseSchema, HotelPaginationSchema
 from src.config import Config
 
@@ -7,11 +12,87 @@ class HotelService(BaseServiceClient):
     def __init__(self):
         super().__init__()
         self.base_url = Config.RESERVATION_SERVICE_URL
-        self.hotel_schema = HotelResponseSchema()
-        self.pagination_schema = HotelPaginationSchema()
+        self.hotel_schema = CompiledSchema(HotelResponseSchema(), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
+        self.pagination_schema = CompiledSchema(HotelPaginationSchema(), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
+        self.cache = None
+        self._refresh_executor = None
+        if Config.HOTEL_CACHE_ENABLED:
+            self.cache = TTLCache(maxsize=Config.HOTEL_CACHE_MAXSIZE, ttl=Config.HOTEL_CACHE_TTL, refresh_after=Config.HOTEL_CACHE_REFRESH_AFTER)
+            self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hotel-cache-refresh")
 
     def get_hotel(self, hotel_uid):
-        return self.circuit_breaker_request("hotel", "GET", f"{self.base_url}/hotels/{hotel_uid}", schema=self.hotel_schema)
+        return self._cached_get(("hotel", hotel_uid), f"{self.base_url}/hotels/{hotel_uid}", self.hotel_schema)
+
+    def get_hotels(self, page, size, after=None, validators=(), meta=None):
+        """`after` is the opaque nextCursor of a previous page; it takes precedence over `page`.
+
+        `validators` are reservation service ETags the client already has the page for. `meta` is filled
+        with the ETag of the returned page, and not_modified=True when the service answered 304 for one of
+        the validators and there is no page to return.
+        """
+        if after is not None:
+            params = {"after": after, "size": size}
+            return self._cached_get(("after", after, size), f"{self.base_url}/hotels", self.pagination_schema, validators, meta, params=params)
+        params = {"page": page, "size": size}
+        return self._cached_get(("page", page, size), f"{self.base_url}/hotels", self.pagination_schema, validators, meta, params=params)
+
+    def _cached_get(self, key, url, schema, validators=(), meta=None, **kwargs):
+        if self.cache is None:
+            response_meta = {}
+            data = self.circuit_breaker_request(
+                "hotel", "GET", url, schema=schema, headers=self._conditional_headers(None, validators), response_meta=response_meta, **kwargs
+            )
+            return self._report(data, response_meta, meta)
+
+        entry, state = self.cache.lookup(key)
+        if state == FRESH:
+            return self._report(entry.value, {"etag": entry.etag}, meta)
+        if state == STALE:
+            # Serve the cached copy and revalidate it off the request path
+            if self.cache.begin_refresh(key):
+                self._refresh_executor.submit(self._refresh, key, entry, url, schema, **kwargs)
+            return self._report(entry.value, {"etag": entry.etag}, meta)
+        return self._revalidate(key, entry, url, schema, validators, meta, **kwargs)
+
+    def _revalidate(self, key, entry, url, schema, validators=(), meta=None, **kwargs):
+        response_meta = {}
+        data = self.circuit_breaker_request(
+            "hotel", "GET", url, schema=schema, headers=self._conditional_headers(entry, validators), response_meta=response_meta, **kwargs
+        )
+        return self._report(self._store(key, entry, data, response_meta), response_meta, meta)
+
+    def _refresh(self, key, entry, url, schema, **kwargs):
+        try:
+            self._revalidate(key, entry, url, schema, **kwargs)
+        finally:
+            self.cache.end_refresh(key)
+
+    def _store(self, key, entry, data, response_meta):
+        """Record the outcome of a (conditional) request. Fallback responses are never cached."""
+        status = response_meta.get("status")
+        if status == HTTPStatus.NOT_MODIFIED:
+            etag = response_meta.get("etag")
+            if entry is not None and etag in (None, entry.etag):
+                self.cache.touch(key)
+                response_meta.update(status=HTTPStatus.OK, etag=entry.etag)
+                return entry.value
+            # Only a validator of the client is current: it has the page, the cache does not
+            return None
+        if status == HTTPStatus.OK:
+            self.cache.set(key, data, response_meta.get("etag"))
+        return data
+
+    @staticmethod
+    def _report(data, response_meta, meta):
+        if meta is not None:
+            meta["etag"] = response_meta.get("etag")
+            meta["not_modified"] = response_meta.get("status") == HTTPStatus.NOT_MODIFIED
+        return data
 
-    def get_hotels(self, page, size):
-        return self.circuit_breaker_request("hotel", "GET", f"{self.base_url}/hotels", params={"page": page, "size": size}, schema=self.pagination_schema)
+    @staticmethod
+    def _conditional_headers(entry, validators=()):
+        etags = [entry.etag] if entry is not None and entry.etag else []
+        etags += [etag for etag in validators if etag not in etags]
+        if etags:
+            return {"If-None-Match": ", ".join(etags)}
+        return {}
@@ -1,19 +1,55 @@
+import threading
 from http import HTTPStatus
 from requests.exceptions import ConnectionError, RequestException
-from src.services.base import BaseServiceClient
+from src.api.exceptions import SchemaValidationError
+from src.cache.shared import SharedVersionTable, VersionedCache
+from src.services.base import BaseServiceClient, fallback_response
+from src.schemas.compiled import CompiledSchema
 from src.schemas.loyalty import LoyaltySchema
 from src.config import Config
 
 
 class LoyaltyService(BaseServiceClient):
+    _cache = None
+    _cache_lock = threading.Lock()
+
     def __init__(self):
         super().__init__()
         self.base_url = Config.LOYALTY_SERVICE_URL
-        self.schema = LoyaltySchema()
+        self.schema = CompiledSchema(LoyaltySchema(), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
+        self.cache = self.shared_cache()
+
+    @classmethod
+    def shared_cache(cls):
+        """Per-process loyalty cache; invalidations reach every local process through the version file"""
+        if not Config.LOYALTY_CACHE_ENABLED:
+            return None
+        with cls._cache_lock:
+            if cls._cache is None:
+                versions = SharedVersionTable(Config.LOYALTY_CACHE_VERSIONS_PATH, Config.LOYALTY_CACHE_VERSION_SLOTS)
+                cls._cache = VersionedCache(maxsize=Config.LOYALTY_CACHE_MAXSIZE, ttl=Config.LOYALTY_CACHE_TTL, versions=versions)
+            return cls._cache
+
+    def fetch_loyalty(self, username, schema=None):
+        """Read-through lookup of the raw loyalty record. Returns the fallback response when the service is unavailable."""
+        loyalty = self.cache.get(username) if self.cache else None
+        if loyalty is None:
+            version = self.cache.version(username) if self.cache else None
+            response_meta = {}
+            loyalty = self.circuit_breaker_request("loyalty", "GET", f"{self.base_url}/loyalty", headers={"X-User-Name": username}, response_meta=response_meta)
+            if response_meta.get("status") != HTTPStatus.OK or not loyalty:
+                return loyalty
+            if self.cache:
+                self.cache.set(username, loyalty, version)
+
+        try:
+            return self.load_response_body(dict(loyalty), schema)
+        except SchemaValidationError:
+            return fallback_response("loyalty")
 
     def get_loyalty(self, username):
         try:
-            response = self.circuit_breaker_request("loyalty", "GET", f"{self.base_url}/loyalty", headers={"X-User-Name": username}, schema=self.schema)
+            response = self.fetch_loyalty(username, schema=self.schema)
             if not response:
                 raise ConnectionError("Loyalty Service unavailable")
             return response, HTTPStatus.OK
@@ -27,12 +63,27 @@ class LoyaltyService(BaseServiceClient):
     def update_loyalty(self, username):
         try:
             response = self.circuit_breaker_request("loyalty", "POST", f"{self.base_url}/loyalty", headers={"X-User-Name": username})
+            self.invalidate(username, response)
             if response is None:
                 raise ConnectionError("Loyalty Service unavailable")
             return response
         except (ConnectionError, RequestException):
             return None
 
+    def decrease_loyalty(self, username):
+        response = self.circuit_breaker_request("loyalty", "POST", f"{self.base_url}/loyalty/decrease", headers={"X-User-Name": username})
+        self.invalidate(username, response)
+        return response
+
+    def invalidate(self, username, written=None):
+        """Called after every loyalty write, successful or not. A successful write response
+        is the new record, so it replaces the cached one instead of forcing a refetch."""
+        if not self.cache:
+            return
+        version = self.cache.invalidate(username)
+        if written:
+            self.cache.set(username, written, version)
+
     @staticmethod
     def is_direct_loyalty_request():
         """Check if the current request is directly to the loyalty endpoint"""
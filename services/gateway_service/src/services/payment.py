@@ -1,4 +1,8 @@
+from http import HTTPStatus
+
+from src.api.exceptions import ServiceUnavailableError
 from src.services.base import BaseServiceClient
+from src.schemas.compiled import CompiledSchema
 from src.schemas.payment import PaymentSchema
 from src.config import Config
 
@@ -7,11 +11,40 @@ class PaymentService(BaseServiceClient):
     def __init__(self):
         super().__init__()
         self.base_url = Config.PAYMENT_SERVICE_URL
-        self.schema = PaymentSchema()
+        self.schema = CompiledSchema(PaymentSchema(), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
 
     def get_payment(self, username, reservation_uid):
         return self.circuit_breaker_request("payment", "GET", f"{self.base_url}/payment/{reservation_uid}", headers={"X-User-Name": username})
 
+    def get_payments(self, username, reservation_uids):
+        """Bulk lookup keyed by reservationUid. Returns None when the payment service has no bulk endpoint;
+        reservations of a chunk the lookup failed for are left out, and get the payment fallback."""
+        payments = {}
+        for start in range(0, len(reservation_uids), Config.PAYMENT_BATCH_SIZE):
+            chunk = reservation_uids[start : start + Config.PAYMENT_BATCH_SIZE]
+            response_meta = {}
+            try:
+                response = self.circuit_breaker_request(
+                    "payment",
+                    "POST",
+                    f"{self.base_url}/payment/batch",
+                    headers={"X-User-Name": username},
+                    json={"reservationUids": chunk},
+                    response_meta=response_meta,
+                )
+            except ServiceUnavailableError:
+                continue
+            if self.missing_bulk_endpoint(response_meta):
+                return None
+            if response and "items" in response:
+                payments.update(response["items"])
+        return payments
+
+    @staticmethod
+    def missing_bulk_endpoint(response_meta):
+        # Only then is one lookup per reservation worth it; a failing service would fail those calls as well
+        return response_meta.get("status") in (HTTPStatus.NOT_FOUND, HTTPStatus.METHOD_NOT_ALLOWED)
+
     def create_payment(self, username, payment_data):
         return self.circuit_breaker_request("payment", "POST", f"{self.base_url}/payment", headers={"X-User-Name": username}, json=payment_data)
 
@@ -1,8 +1,9 @@
 from datetime import datetime
 from http import HTTPStatus
 from requests.exceptions import ConnectionError, RequestException
-from flask import jsonify
+from src.cache.idempotency import IdempotencyStore
 from src.services.base import BaseServiceClient
+from src.schemas.compiled import CompiledSchema
 from src.schemas.reservation import ReservationResponseSchema
 from src.services.payment import PaymentService
 from src.services.loyalty import LoyaltyService
@@ -10,20 +11,22 @@ from src.config import Config
 
 
 class ReservationService(BaseServiceClient):
-    def __init__(self):
+    def __init__(self, payment_service=None, loyalty_service=None, idempotency_store=None):
         super().__init__()
         self.base_url = Config.RESERVATION_SERVICE_URL
-        self.schema = ReservationResponseSchema()
-        self.payment_service = PaymentService()
-        self.loyalty_service = LoyaltyService()
+        self.schema = CompiledSchema(ReservationResponseSchema(), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
+        self.many_schema = CompiledSchema(ReservationResponseSchema(many=True), trusted=Config.TRUSTED_INTERNAL_PAYLOADS)
+        self.payment_service = payment_service or PaymentService()
+        self.loyalty_service = loyalty_service or LoyaltyService()
+        self.idempotency = idempotency_store or IdempotencyStore.shared()
 
     def get_user_reservations(self, username):
         reservations = self.circuit_breaker_request(
-            "reservation", "GET", f"{self.base_url}/reservations", headers={"X-User-Name": username}, schema=ReservationResponseSchema(many=True)
+            "reservation", "GET", f"{self.base_url}/reservations", headers={"X-User-Name": username}, schema=self.many_schema
         )
 
         if reservations:
-            return [self._enrich_reservation(username, reservation) for reservation in reservations]
+            return self._enrich_reservations(username, reservations)
         return []
 
     def get_reservation(self, username, reservation_uid):
@@ -35,65 +38,69 @@ class ReservationService(BaseServiceClient):
             return self._enrich_reservation(username, reservation)
         return None
 
-    def create_reservation(self, username, request_data):
+    def create_reservation(self, username, request_data, idempotency_key=None, queue_retry=True):
+        """With an idempotency key, every downstream step that already succeeded for that key
+        (in an earlier request or retry) is answered from the idempotency store instead of redone.
+        The retry worker replays with queue_retry=False: its own backoff schedules the next attempt."""
+        steps = self.idempotency
         try:
-            loyalty = self.circuit_breaker_request("loyalty", "GET", f"{Config.LOYALTY_SERVICE_URL}/loyalty", headers={"X-User-Name": username})
+            loyalty = steps.step(idempotency_key, "loyalty", lambda: self.loyalty_service.fetch_loyalty(username))
 
             if not loyalty:
                 return {"message": "Loyalty Service unavailable", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
-            reservation = self.circuit_breaker_request(
-                "reservation", "POST", f"{self.base_url}/reservations", headers={"X-User-Name": username}, json=request_data
+            reservation = steps.step(
+                idempotency_key,
+                "reservation",
+                lambda: self.circuit_breaker_request(
+                    "reservation", "POST", f"{self.base_url}/reservations", headers={"X-User-Name": username}, json=request_data
+                ),
+                succeeded=lambda created: bool(created) and "reservationUid" in created,
             )
 
             if not reservation:
                 raise Exception("Failed to create reservation")
             if reservation:
-                # Calculate payment
-                start_date = datetime.fromisoformat(reservation["startDate"])
-                end_date = datetime.fromisoformat(reservation["endDate"])
-                nights = (end_date - start_date).days
-                total_price = reservation["price"] * nights
-
-                # Get loyalty discount
-                discounted_price = total_price * (1 - loyalty["discount"] / 100)
-                reservation["discount"] = loyalty["discount"]
-
                 # Create payment
-                payment_data = {"price": discounted_price, "reservationUid": reservation["reservationUid"], "status": "PAID"}
-                payment = self.payment_service.create_payment(username, payment_data)
+                payment_data = self._build_payment_data(reservation, loyalty)
+                payment = steps.step(idempotency_key, "payment", lambda: self.payment_service.create_payment(username, payment_data))
 
                 if not payment:
                     # Rollback reservation if payment fails
                     self.delete_reservation(username, reservation["reservationUid"])
+                    if idempotency_key:
+                        # The retry must create a new reservation instead of reusing the rolled back one
+                        steps.forget(idempotency_key, "reservation")
 
                     # Queue for retry
-                    retry_data = {"reservation": request_data, "payment": payment_data}
-                    self.queue_for_retry("create_reservation", retry_data, username)
+                    if queue_retry:
+                        retry_data = {"reservation": request_data, "payment": payment_data}
+                        self.queue_for_retry("create_reservation", retry_data, username, idempotency_key)
 
                     # Return success to user
                     return {"message": "Reservation queued for processing", "status": "PENDING", "reservationUid": reservation["reservationUid"]}
                 if payment:
                     reservation["payment"] = payment
                     reservation["status"] = payment["status"]
-                    self.loyalty_service.update_loyalty(username)
+                    steps.step(idempotency_key, "loyalty_update", lambda: self.loyalty_service.update_loyalty(username))
 
                 del reservation["price"]
                 return reservation
 
-        except (ConnectionError, RequestException) as e:
-            return jsonify({"message": "Service unavailable"}), HTTPStatus.SERVICE_UNAVAILABLE
+        except (ConnectionError, RequestException):
+            return {"message": "Service unavailable", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
 
         except Exception as e:
             # Queue for retry
-            retry_data = {"reservation": request_data}
-            self.queue_for_retry("create_reservation", retry_data, username)
+            if queue_retry:
+                retry_data = {"reservation": request_data}
+                self.queue_for_retry("create_reservation", retry_data, username, idempotency_key)
 
             # Return temporary response
-            return jsonify({"message": "Reservation queued for processing", "status": "PENDING"}), HTTPStatus.SERVICE_UNAVAILABLE
+            return {"message": "Reservation queued for processing", "status": "PENDING", "status_code": HTTPStatus.SERVICE_UNAVAILABLE}
 
-        return jsonify({"message": "Failed to create reservation"}), HTTPStatus.BAD_REQUEST
+        return {"message": "Failed to create reservation", "status_code": HTTPStatus.BAD_REQUEST}
 
-    def delete_reservation(self, username, reservation_uid):
+    def delete_reservation(self, username, reservation_uid, idempotency_key=None):
         reservation = self.circuit_breaker_request(
             "reservation", "DELETE", f"{self.base_url}/reservations/{reservation_uid}", headers={"X-User-Name": username}
         )
@@ -104,15 +111,41 @@ class ReservationService(BaseServiceClient):
 
                 self.payment_service.delete_payment(username, payment["paymentUid"])
 
-                x = self.circuit_breaker_request("loyalty", "POST", f"{Config.LOYALTY_SERVICE_URL}/loyalty/decrease", headers={"X-User-Name": username})
+                x = self.idempotency.step(idempotency_key, "loyalty_decrease", lambda: self.loyalty_service.decrease_loyalty(username))
                 if x == {}:
                     retry_data = {"operation_type": "decrease_loyalty", "username": username}
-                    self.queue_for_retry("decrease_loyalty", retry_data, username)
+                    child_key = f"{idempotency_key}:decrease_loyalty" if idempotency_key else None
+                    self.queue_for_retry("decrease_loyalty", retry_data, username, child_key)
                 return True
         return False
 
+    @staticmethod
+    def _build_payment_data(reservation, loyalty):
+        # Calculate payment
+        start_date = datetime.fromisoformat(reservation["startDate"])
+        end_date = datetime.fromisoformat(reservation["endDate"])
+        nights = (end_date - start_date).days
+        total_price = reservation["price"] * nights
+
+        # Get loyalty discount
+        discounted_price = total_price * (1 - loyalty["discount"] / 100)
+        reservation["discount"] = loyalty["discount"]
+
+        return {"price": discounted_price, "reservationUid": reservation["reservationUid"], "status": "PAID"}
+
+    def _enrich_reservations(self, username, reservations):
+        payments = self.payment_service.get_payments(username, [str(reservation["reservationUid"]) for reservation in reservations])
+        if payments is None:
+            # Payment service without the bulk endpoint: one lookup per reservation
+            return [self._enrich_reservation(username, reservation) for reservation in reservations]
+        return [self._apply_payment(reservation, payments.get(str(reservation["reservationUid"]))) for reservation in reservations]
+
     def _enrich_reservation(self, username, reservation):
         payment = self.payment_service.get_payment(username, reservation["reservationUid"])
+        return self._apply_payment(reservation, payment)
+
+    @staticmethod
+    def _apply_payment(reservation, payment):
         if not payment:
             reservation["payment"] = {}
             reservation["status"] = "RESERVED"
@@ -0,0 +1,191 @@
+"""Production serving of the gateway.
+
+`python -m src.app` runs a small supervisor owning two child processes: the web server and the
+retry worker. The web server is a gunicorn master with prefork gthread workers in sync mode, or a
+hypercorn master with worker processes in async mode; either restarts its workers gracefully on
+SIGHUP. The retry worker is restarted, with backoff, whenever it exits. SIGTERM or SIGINT stop
+both children gracefully; if the web server dies the supervisor exits so the container restarts.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from src import logs
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def gunicorn_options():
+    return {
+        "bind": f"{Config.GATEWAY_HOST}:{Config.GATEWAY_PORT}",
+        "workers": Config.GATEWAY_WORKERS,
+        "threads": Config.GATEWAY_THREADS,
+        "worker_class": "gthread",
+        "timeout": Config.GATEWAY_WORKER_TIMEOUT,
+        "graceful_timeout": Config.GATEWAY_GRACEFUL_TIMEOUT,
+        "keepalive": Config.GATEWAY_KEEPALIVE,
+        # Apps are created in each worker, after the fork: thread pools, sockets and broker
+        # connections never cross it
+        "preload_app": False,
+    }
+
+
+def serve_sync():
+    from gunicorn.app.base import BaseApplication
+    from src import create_app
+
+    class GatewayApplication(BaseApplication):
+        def load_config(self):
+            for name, value in gunicorn_options().items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return create_app()
+
+    GatewayApplication().run()
+
+
+def serve_async():
+    from hypercorn.config import Config as HypercornConfig
+    from hypercorn.run import run
+
+    hypercorn_config = HypercornConfig()
+    hypercorn_config.bind = [f"{Config.GATEWAY_HOST}:{Config.GATEWAY_PORT}"]
+    hypercorn_config.workers = Config.GATEWAY_WORKERS
+    hypercorn_config.graceful_timeout = Config.GATEWAY_GRACEFUL_TIMEOUT
+    hypercorn_config.keep_alive_timeout = Config.GATEWAY_KEEPALIVE
+    hypercorn_config.application_path = "src:create_async_app()"
+    run(hypercorn_config)
+
+
+def serve_development():
+    """Flask's development server, single process. The reloader would start the retry worker twice."""
+    from src import create_app
+
+    create_app().run(host=Config.GATEWAY_HOST, port=Config.GATEWAY_PORT, debug=True, use_reloader=False)
+
+
+def web_server():
+    if Config.GATEWAY_SERVING_MODE == "async":
+        return serve_async
+    if Config.GATEWAY_SERVER == "development":
+        return serve_development
+    return serve_sync
+
+
+class ManagedProcess:
+    def __init__(self, name, target, restart):
+        self.name = name
+        self.target = target
+        self.restart = restart
+        self.process = None
+        self.restarts = 0
+        self.started_at = None
+
+    def _run(self):
+        # Forked children inherit the supervisor's handlers, which would swallow SIGTERM
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        try:
+            self.target()
+        finally:
+            # multiprocessing ends the child with os._exit, which skips atexit handlers
+            logs.flush()
+
+    def start(self):
+        self.process = multiprocessing.Process(target=self._run, name=self.name)
+        self.process.start()
+        self.started_at = time.monotonic()
+        logger.info("Started %s (pid %s)", self.name, self.process.pid)
+
+    def signal(self, signum):
+        if self.process is not None and self.process.is_alive():
+            os.kill(self.process.pid, signum)
+
+
+class Supervisor:
+    """Starts, watches and stops the gateway's child processes"""
+
+    def __init__(self, graceful_timeout=30, max_restart_delay=30, poll_interval=0.5):
+        self.graceful_timeout = graceful_timeout
+        self.max_restart_delay = max_restart_delay
+        self.poll_interval = poll_interval
+        self.children = []
+        self._stopping = False
+        self._reload = False
+
+    def add(self, name, target, restart):
+        """`restart` children are started again when they exit; the others end the supervisor"""
+        self.children.append(ManagedProcess(name, target, restart))
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for child in self.children:
+            child.start()
+        try:
+            return self._watch()
+        finally:
+            self.stop()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _watch(self):
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self.reload()
+            for child in self.children:
+                if child.process.is_alive():
+                    continue
+                exitcode = child.process.exitcode
+                if not child.restart:
+                    logger.error("%s exited with code %s, shutting down", child.name, exitcode)
+                    return exitcode or 1
+                self._restart(child, exitcode)
+            time.sleep(self.poll_interval)
+        return 0
+
+    def _restart(self, child, exitcode):
+        # Back off when the child keeps dying right after it started (e.g. the broker is down)
+        if time.monotonic() - child.started_at > self.max_restart_delay:
+            child.restarts = 0
+        delay = min(2**child.restarts, self.max_restart_delay)
+        child.restarts += 1
+        logger.warning("%s exited with code %s, restarting in %ss", child.name, exitcode, delay)
+        deadline = time.monotonic() + delay
+        while not self._stopping and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+        if not self._stopping:
+            child.start()
+
+    def reload(self):
+        """Graceful restart: the web server replaces its workers, restartable children are stopped and started again"""
+        for child in self.children:
+            if child.restart:
+                child.restarts = 0
+                child.signal(signal.SIGTERM)
+            else:
+                child.signal(signal.SIGHUP)
+
+    def stop(self):
+        for child in self.children:
+            child.signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        for child in self.children:
+            if child.process is None:
+                continue
+            child.process.join(max(deadline - time.monotonic(), 0))
+            if child.process.is_alive():
+                logger.warning("%s did not stop in %ss, killing it", child.name, self.graceful_timeout)
+                child.process.kill()
+                child.process.join()
@@ -0,0 +1,122 @@
+"""Show where the time of slow requests went, from the span files of the services.
+
+    python -m src.utils.critical_path /var/spans/*.spans [--slowest 3]
+    python -m src.utils.critical_path /var/spans/*.spans --request-id 3f2a...
+
+Prints the span tree of each request; spans marked * are on its critical path, the chain of
+spans that determined its latency. Spans starting after their parent ended (queued retries) are
+shown but are never on the path.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+class SpanRecord:
+    __slots__ = ("request_id", "span_id", "parent_id", "service", "name", "start", "duration", "status")
+
+    def __init__(self, request_id, span_id, parent_id, service, name, start, duration, status):
+        self.request_id = request_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.service = service
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.status = status
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+
+def load(paths):
+    """Spans grouped by request ID; unreadable lines are skipped"""
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    span = SpanRecord(*json.loads(line))
+                except (TypeError, ValueError):
+                    continue
+                traces[span.request_id].append(span)
+    return traces
+
+
+def roots(spans):
+    ids = {span.span_id for span in spans}
+    return sorted((span for span in spans if span.parent_id not in ids), key=lambda span: span.start)
+
+
+def children_of(spans):
+    children = defaultdict(list)
+    for span in spans:
+        children[span.parent_id].append(span)
+    return children
+
+
+def critical_path(span, children):
+    """Spans on the critical path below `span` (included), in start order.
+
+    Walks back from the end of `span`: the child that ended last before that point is on the path,
+    then the search continues from where that child started. Clocks of different hosts may be a
+    little off, so a child only has to start before the point, not end before it."""
+    path = []
+    point = span.end
+    for child in sorted(children[span.span_id], key=lambda child: child.end, reverse=True):
+        if child.start < point and child.start < span.end:
+            path = critical_path(child, children) + path
+            point = child.start
+    return [span] + path
+
+
+def request_duration(spans):
+    return max((root.duration for root in roots(spans)), default=0)
+
+
+def render(spans):
+    children = children_of(spans)
+    trace_roots = roots(spans)
+    on_path = {span.span_id for span in critical_path(trace_roots[0], children)} if trace_roots else set()
+    origin = trace_roots[0].start if trace_roots else 0
+    lines = [f"request {spans[0].request_id}  {request_duration(spans) / 1000:.1f} ms"]
+
+    def visit(span, depth):
+        marker = "*" if span.span_id in on_path else " "
+        status = "" if span.status == "ok" else f"  [{span.status}]"
+        lines.append(
+            f"{marker} +{(span.start - origin) / 1000:8.1f} ms {span.duration / 1000:8.1f} ms  "
+            f"{'  ' * depth}{span.service}: {span.name}{status}"
+        )
+        for child in sorted(children[span.span_id], key=lambda child: child.start):
+            visit(child, depth + 1)
+
+    for root in trace_roots:
+        visit(root, 0)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="span files of the gateway and the services")
+    parser.add_argument("--request-id", help="show this request")
+    parser.add_argument("--slowest", type=int, default=1, help="show the N slowest requests")
+    args = parser.parse_args(argv)
+
+    traces = load(args.files)
+    if args.request_id:
+        if args.request_id not in traces:
+            print(f"No spans for request {args.request_id}", file=sys.stderr)
+            return 1
+        selected = [traces[args.request_id]]
+    else:
+        selected = sorted(traces.values(), key=request_duration, reverse=True)[: args.slowest]
+    print("\n\n".join(render(spans) for spans in selected))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Per-request deadline budget.
+
+Each incoming request gets a deadline (GATEWAY_REQUEST_BUDGET seconds, or less if the caller sent a
+smaller budget in DEADLINE_HEADER). Downstream calls made while serving it only wait for the time
+that is left, and forward it in the same header so the services can drop work nobody waits for.
+The deadline is kept in a context variable: thread pools must run calls in a copied context.
+
+A call cut short by the deadline (its capped timeout fired, or the service answered 504 because the
+forwarded budget ran out) raises DeadlineExceeded, which the circuit breakers do not count: a caller
+sending a tiny budget must not open the breaker for everybody.
+"""
+
+import contextvars
+import time
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def start(budget, header_value=None, minimum=0):
+    """Set the deadline of the current request; returns a token for reset(). A budget sent by the
+    caller is not taken below `minimum` seconds: any client can send the header"""
+    if header_value is not None:
+        try:
+            budget = min(budget, max(int(header_value) / 1000, minimum))
+        except ValueError:
+            pass
+    return _deadline.set(time.monotonic() + budget)
+
+
+def reset(token):
+    _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left, or None outside of a request (e.g. in the retry worker)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired(slack=0.05):
+    """True once the current request's budget is (about) spent; False outside of requests.
+    A downstream timeout firing then was cut short by the deadline, not by the service"""
+    left = remaining()
+    return left is not None and left <= slack
+
+
+def timeout(connect, read):
+    """(connect, read) timeouts capped by the remaining budget; raises DeadlineExceeded once it is spent"""
+    left = remaining()
+    if left is None:
+        return connect, read
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(connect, left), min(read, left)
+
+
+def headers(headers=None):
+    """`headers` plus the remaining budget, for a downstream call"""
+    left = remaining()
+    if left is None:
+        return headers
+    return dict(headers or {}, **{DEADLINE_HEADER: str(max(int(left * 1000), 0))})
@@ -0,0 +1,34 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FanOutExecutor:
+    """Runs independent downstream calls of one request concurrently on a bounded thread pool"""
+
+    def __init__(self, max_workers, parallel=True):
+        self.parallel = parallel
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fan-out") if parallel else None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(max_workers=config["AGGREGATION_MAX_WORKERS"], parallel=config["AGGREGATION_PARALLEL"])
+
+    def run(self, *calls):
+        """Run zero-argument callables and return their results in the same order.
+        Exceptions are re-raised in the caller, just as in sequential mode."""
+        if not self.parallel or len(calls) < 2:
+            return [call() for call in calls]
+
+        first, *rest = calls
+        # The first call runs on the request thread, so a saturated pool never stalls the request entirely.
+        # Pool threads run in a copy of the caller's context: they see the Flask request (services read it,
+        # e.g. LoyaltyService.is_direct_loyalty_request), the deadline and the trace. Pushing the request
+        # context again would run its teardown handlers, which end the deadline and trace, in the pool thread.
+        futures = [self._executor.submit(contextvars.copy_context().run, call) for call in rest]
+        results = [first()]
+        results.extend(future.result() for future in futures)
+        return results
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,132 @@
+"""Request IDs and span timings.
+
+Every gateway request (and every replay in the retry worker) is a trace identified by its request
+ID, taken from X-Request-ID or generated. Downstream calls are child spans; their IDs are sent in
+X-Request-ID and X-Parent-Span-ID, so the services record their handler spans under them, and
+queued retry operations carry both in the message.
+
+Spans of a trace are buffered and appended to TRACE_FILE with a single write when the trace ends,
+one compact JSON array per span:
+
+    [request_id, span_id, parent_span_id, service, name, start_us, duration_us, status]
+
+`python -m src.utils.critical_path` reads these files back.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+
+from src.config import Config
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+SERVICE = "gateway"
+
+# (trace, id of the innermost open span)
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def new_id():
+    return os.urandom(8).hex()
+
+
+class SpanFile:
+    """Append-only span file. O_APPEND writes of whole lines do not interleave between processes."""
+
+    _shared = None
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    @classmethod
+    def shared(cls):
+        with cls._lock:
+            if cls._shared is None:
+                cls._shared = cls(Config.TRACE_FILE)
+            return cls._shared
+
+    def write(self, records):
+        os.write(self._fd, b"".join(json.dumps(record, separators=(",", ":")).encode() + b"\n" for record in records))
+
+
+class Trace:
+    def __init__(self, request_id):
+        self.request_id = request_id
+        # Appended to from fan-out threads; list.append is atomic
+        self.records = []
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "started_at", "perf_started_at", "token")
+
+    def __init__(self, trace, parent_id, name):
+        self.trace = trace
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.started_at = time.time()
+        self.perf_started_at = time.perf_counter()
+        self.token = _current.set((trace, self.span_id))
+
+    def end(self, status):
+        duration = time.perf_counter() - self.perf_started_at
+        self.trace.records.append(
+            [self.trace.request_id, self.span_id, self.parent_id, SERVICE, self.name, int(self.started_at * 1e6), int(duration * 1e6), status]
+        )
+        _current.reset(self.token)
+
+
+def start_trace(name, request_id=None, parent_id=None):
+    """Root span of a request or retry replay; None when tracing is off"""
+    if not Config.TRACING_ENABLED:
+        return None
+    return Span(Trace(request_id or new_id()), parent_id, name)
+
+
+def finish_trace(root, status="ok"):
+    if root is None:
+        return
+    root.end(status)
+    try:
+        SpanFile.shared().write(root.trace.records)
+    except OSError:
+        # Tracing must never fail a request
+        pass
+
+
+def start_span(name):
+    """Child of the innermost open span; None outside of a trace"""
+    current = _current.get()
+    if current is None:
+        return None
+    trace, parent_id = current
+    return Span(trace, parent_id, name)
+
+
+def end_span(span, status="ok"):
+    if span is not None:
+        span.end(status)
+
+
+def request_id():
+    current = _current.get()
+    return current[0].request_id if current else None
+
+
+def context():
+    """(request ID, current span ID) to carry in a queued message, or (None, None)"""
+    current = _current.get()
+    return (current[0].request_id, current[1]) if current else (None, None)
+
+
+def headers(headers=None):
+    """`headers` plus the trace headers of the current span, for a downstream call"""
+    current = _current.get()
+    if current is None:
+        return headers
+    trace, span_id = current
+    return dict(headers or {}, **{REQUEST_ID_HEADER: trace.request_id, PARENT_SPAN_HEADER: span_id})
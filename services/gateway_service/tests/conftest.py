@@ -1,3 +1,8 @@
+import os
+
+# Breaker state must not leak between test runs through the shared state files
+os.environ.setdefault("CIRCUIT_BREAKER_SHARED_STATE", "false")
+
 import pytest
 from src import create_app
 from src.config import Config
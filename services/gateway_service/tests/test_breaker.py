@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import time
+
+import pybreaker
+import pytest
+
+from src.circuit.breaker import ConcurrentCircuitBreaker
+from src.circuit.storage import LocalBreakerStorage, SharedBreakerStorage
+
+
+def breaker(storage, reset_timeout=60):
+    return ConcurrentCircuitBreaker(fail_max=2, reset_timeout=reset_timeout, state_storage=storage, probe_lease=5)
+
+
+def fail():
+    raise IOError("service down")
+
+
+def test_trip_is_seen_by_every_process(tmp_path):
+    path = str(tmp_path / "breaker.state")
+    breaker(SharedBreakerStorage(path)).call(lambda: None)
+
+    def trip():
+        local = breaker(SharedBreakerStorage(path))
+        for _ in range(2):
+            try:
+                local.call(fail)
+            except (IOError, pybreaker.CircuitBreakerError):
+                pass
+
+    # e.g. another gateway worker paying the failures
+    process = multiprocessing.get_context("fork").Process(target=trip)
+    process.start()
+    process.join()
+
+    calls = []
+    with pytest.raises(pybreaker.CircuitBreakerError):
+        breaker(SharedBreakerStorage(path)).call(calls.append, 1)
+    assert calls == []
+
+
+def test_failures_add_up_across_processes(tmp_path):
+    path = str(tmp_path / "breaker.state")
+    first, second = breaker(SharedBreakerStorage(path)), breaker(SharedBreakerStorage(path))
+    with pytest.raises(IOError):
+        first.call(fail)
+    with pytest.raises(pybreaker.CircuitBreakerError):
+        second.call(fail)
+    assert first.current_state == pybreaker.STATE_OPEN
+
+
+@pytest.mark.parametrize("shared", [True, False])
+def test_single_probe_after_reset_timeout(tmp_path, shared):
+    path = str(tmp_path / "breaker.state")
+    storages = [SharedBreakerStorage(path), SharedBreakerStorage(path)] if shared else [LocalBreakerStorage()] * 2
+    prober, other = breaker(storages[0], reset_timeout=0.05), breaker(storages[1], reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises((IOError, pybreaker.CircuitBreakerError)):
+            prober.call(fail)
+    time.sleep(0.06)
+
+    def probe():
+        # Everyone else is turned away while the probe is in flight
+        with pytest.raises(pybreaker.CircuitBreakerError):
+            other.call(lambda: None)
+        return "ok"
+
+    assert prober.call(probe) == "ok"
+    assert other.current_state == pybreaker.STATE_CLOSED
+    assert other.call(lambda: "ok") == "ok"
+
+
+def test_failed_probe_reopens_and_releases_the_lease(tmp_path):
+    storage = SharedBreakerStorage(str(tmp_path / "breaker.state"))
+    local = breaker(storage, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises((IOError, pybreaker.CircuitBreakerError)):
+            local.call(fail)
+    time.sleep(0.06)
+    with pytest.raises(pybreaker.CircuitBreakerError):
+        local.call(fail)
+    assert storage.state == pybreaker.STATE_OPEN
+    time.sleep(0.06)
+    assert storage.acquire_probe(5)
+
+
+def test_probe_lease_is_granted_once_across_processes(tmp_path):
+    path = str(tmp_path / "breaker.state")
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def acquire():
+        results.put(SharedBreakerStorage(path).acquire_probe(5))
+
+    processes = [context.Process(target=acquire) for _ in range(8)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert sorted(results.get() for _ in processes) == [False] * 7 + [True]
+
+
+def test_cancelled_calls_do_not_count_as_failures():
+    cb = breaker(LocalBreakerStorage())
+
+    async def cancelled():
+        task = asyncio.ensure_future(cb.call_coroutine(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    for _ in range(3):
+        asyncio.run(cancelled())
+    assert cb.current_state == pybreaker.STATE_CLOSED
+    assert cb.fail_counter == 0
@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+
+from src.cache.shared import SharedVersionTable, VersionedCache
+from src.cache.ttl import TTLCache, FRESH, STALE, MISS
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_go_stale_then_expire():
+    cache = TTLCache(maxsize=2, ttl=0.2, refresh_after=0.05)
+    cache.set("a", 1, etag='"v1"')
+    assert cache.lookup("a")[1] == FRESH
+    time.sleep(0.06)
+    assert cache.lookup("a")[1] == STALE
+    time.sleep(0.15)
+    entry, state = cache.lookup("a")
+    assert state == MISS
+    # Expired entries keep their ETag for revalidation
+    assert entry.etag == '"v1"'
+    cache.touch("a")
+    assert cache.lookup("a")[1] == FRESH
+
+
+def test_single_background_refresh_per_key():
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.begin_refresh("a")
+    assert not cache.begin_refresh("a")
+    cache.end_refresh("a")
+    assert cache.begin_refresh("a")
+
+
+def test_version_bump_is_visible_across_processes(tmp_path):
+    versions = SharedVersionTable(str(tmp_path / "versions"), slots=64)
+    cache = VersionedCache(maxsize=8, ttl=60, versions=versions)
+    cache.set("user", {"reservationCount": 1}, cache.version("user"))
+
+    # e.g. the retry worker process decreasing loyalty
+    process = multiprocessing.get_context("fork").Process(target=versions.bump, args=("user",))
+    process.start()
+    process.join()
+
+    assert cache.get("user") is None
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from flask import Flask
+from marshmallow import ValidationError
+from src.schemas.compiled import CompiledSchema
+from src.schemas.hotel import HotelPaginationSchema
+from src.schemas.loyalty import LoyaltySchema
+from src.schemas.payment import PaymentSchema
+from src.schemas.reservation import ReservationResponseSchema
+
+HOTEL = {
+    "hotelUid": "049161bb-badd-4fa8-9d90-87c9a82b0668",
+    "name": "Ararat Park Hyatt Moscow",
+    "country": "Россия",
+    "city": "Москва",
+    "address": "Неглинная ул., 4",
+    "stars": 5,
+    "price": 10000,
+}
+RESERVATION = {
+    "reservationUid": "f9e0ae1f-8a6c-4d35-8a8e-1a4b1a0ad2c4",
+    "hotel": {key: value for key, value in HOTEL.items() if key != "price"},
+    "startDate": "2026-03-01",
+    "endDate": "2026-03-05",
+    "unknownField": "dropped",
+}
+
+
+def wire(data):
+    app = Flask(__name__)
+    with app.app_context():
+        return json.dumps(app.json.loads(app.json.dumps(data)), sort_keys=True)
+
+
+@pytest.mark.parametrize(
+    "schema, payload",
+    [
+        (ReservationResponseSchema(), RESERVATION),
+        (ReservationResponseSchema(many=True), [RESERVATION, dict(RESERVATION, reservationUid="8d0b1a3c-5f3e-4a47-9b5f-1d2e3f4a5b6c")]),
+        (HotelPaginationSchema(), {"page": 1, "pageSize": 10, "totalElements": 1, "items": [HOTEL], "nextCursor": None}),
+        (PaymentSchema(), {"paymentUid": "238c733c-a9c6-4bb8-b1d1-0b5b2fdbb6b7", "status": "PAID", "price": 9000}),
+        (LoyaltySchema(), {"status": "GOLD", "discount": 10, "reservationCount": 25}),
+    ],
+)
+def test_compiled_load_matches_schema_load(schema, payload):
+    compiled = CompiledSchema(schema).load(payload)
+    assert compiled == schema.load(payload)
+    assert wire(compiled) == wire(schema.load(payload))
+
+
+def test_unconvertible_payload_is_reported_by_the_schema():
+    with pytest.raises(ValidationError):
+        CompiledSchema(ReservationResponseSchema()).load(dict(RESERVATION, startDate="someday"))
+
+
+def test_untrusted_mode_validates():
+    # Out of range, only the validators catch it
+    payload = {"status": "PLATINUM", "discount": 10, "reservationCount": 25}
+    assert CompiledSchema(LoyaltySchema()).load(payload)["status"] == "PLATINUM"
+    with pytest.raises(ValidationError):
+        CompiledSchema(LoyaltySchema(), trusted=False).load(payload)
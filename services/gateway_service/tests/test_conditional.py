@@ -0,0 +1,84 @@
+import gzip
+import json
+from http import HTTPStatus
+
+import pytest
+from src import create_app
+from src.api import conditional
+from src.config import Config
+from src.services.hotel import HotelService
+from src.services.reservation import ReservationService
+
+PAGE = {"page": 1, "pageSize": 10, "totalElements": 0, "items": [], "nextCursor": None}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Reservation service answering /hotels with ETag "v1", and 304 when asked If-None-Match: "v1" """
+    calls = []
+
+    def request(self, service_name, method, url, schema=None, response_meta=None, headers=None, **kwargs):
+        calls.append(headers or {})
+        not_modified = '"v1"' in (headers or {}).get("If-None-Match", "")
+        response_meta.update(status=HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK, etag='"v1"')
+        return None if not_modified else dict(PAGE)
+
+    monkeypatch.setattr(HotelService, "circuit_breaker_request", request)
+    return calls
+
+
+def test_cached_hotel_page_is_not_modified_without_calling_upstream(client, upstream):
+    first = client.get("/api/v1/hotels")
+    assert first.status_code == HTTPStatus.OK
+    assert first.headers["ETag"] == '"gw1-v1"'
+
+    second = client.get("/api/v1/hotels", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == HTTPStatus.NOT_MODIFIED
+    assert second.headers["ETag"] == '"gw1-v1"'
+    assert second.data == b""
+    assert len(upstream) == 1
+    assert "Cache-Control" not in second.headers
+
+
+def test_uncached_hotel_page_is_revalidated_upstream(monkeypatch, upstream):
+    monkeypatch.setattr(Config, "HOTEL_CACHE_ENABLED", False)
+    client = create_app(Config).test_client()
+
+    response = client.get("/api/v1/hotels", headers={"If-None-Match": '"gw1-v1-gzip", "other"'})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers["ETag"] == '"gw1-v1-gzip"'
+    # Only the validator the gateway derived goes upstream
+    assert upstream[-1]["If-None-Match"] == '"v1"'
+
+
+def test_large_lists_are_compressed_and_revalidated_per_coding(client, monkeypatch):
+    reservations = [{"reservationUid": str(index), "status": "PAID"} for index in range(200)]
+    monkeypatch.setattr(ReservationService, "get_user_reservations", lambda self, username: reservations)
+    headers = {"X-User-Name": "user", "Accept-Encoding": "gzip"}
+
+    response = client.get("/api/v1/reservations", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.data)) == reservations
+    assert response.headers["ETag"].endswith('-gzip"')
+
+    revalidated = client.get("/api/v1/reservations", headers=dict(headers, **{"If-None-Match": response.headers["ETag"]}))
+    assert revalidated.status_code == HTTPStatus.NOT_MODIFIED
+    assert revalidated.headers["ETag"] == response.headers["ETag"]
+    for per_user in (response, revalidated):
+        assert per_user.headers["Cache-Control"] == "private"
+        assert "X-User-Name" in per_user.headers["Vary"]
+
+    identity = client.get("/api/v1/reservations", headers={"X-User-Name": "user"})
+    assert "Content-Encoding" not in identity.headers
+    assert identity.json == reservations
+    assert identity.headers["ETag"] == response.headers["ETag"].replace("-gzip", "")
+
+
+def test_negotiation():
+    assert conditional.negotiate("gzip, deflate") == "gzip"
+    assert conditional.negotiate("gzip;q=0, identity") is None
+    assert conditional.negotiate(None) is None
+    assert conditional.match("*", '"a"') == '"a"'
+    assert conditional.match('W/"a"', '"a"') == '"a"'
+    assert conditional.match('"b"', '"a"') is None
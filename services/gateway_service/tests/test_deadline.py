@@ -0,0 +1,104 @@
+import time
+
+import pybreaker
+import pytest
+import requests
+
+from src.circuit.breaker import CircuitBreakerFactory
+from src.config import Config
+from src.pool.session import SessionFactory
+from src.services.base import BaseServiceClient
+from src.utils import deadline
+from src.utils.executor import FanOutExecutor
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(kwargs)
+        raise AssertionError("stop after recording")
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = RecordingSession()
+    monkeypatch.setattr(SessionFactory, "get_session", classmethod(lambda cls, service_name: session))
+    return session
+
+
+def test_calls_wait_only_for_the_remaining_budget(session):
+    token = deadline.start(10, header_value="1500")
+    try:
+        BaseServiceClient().circuit_breaker_request("payment", "GET", "http://payment/payment", headers={"X-User-Name": "alice"})
+    finally:
+        deadline.reset(token)
+
+    (call,) = session.calls
+    connect, read = call["timeout"]
+    assert read <= 1.5 and connect <= 1.5
+    assert 0 < int(call["headers"][deadline.DEADLINE_HEADER]) <= 1500
+    assert call["headers"]["X-User-Name"] == "alice"
+
+
+def test_spent_budget_goes_to_the_fallback(session):
+    token = deadline.start(0.01)
+    time.sleep(0.02)
+    try:
+        assert BaseServiceClient().circuit_breaker_request("reservation", "GET", "http://reservation/reservations") == []
+    finally:
+        deadline.reset(token)
+    assert session.calls == []
+
+
+def test_no_deadline_outside_of_requests():
+    assert deadline.remaining() is None
+    assert deadline.timeout(2, 10) == (2, 10)
+    assert deadline.headers({"a": "b"}) == {"a": "b"}
+
+
+def test_fan_out_calls_see_the_request_deadline():
+    executor = FanOutExecutor(max_workers=2)
+    token = deadline.start(5)
+    try:
+        results = executor.run(deadline.remaining, deadline.remaining)
+    finally:
+        deadline.reset(token)
+        executor.shutdown()
+    assert all(result is not None and 0 < result <= 5 for result in results)
+
+
+def test_client_budget_is_clamped():
+    token = deadline.start(10, header_value="1", minimum=0.5)
+    try:
+        assert 0.4 < deadline.remaining() <= 0.5
+    finally:
+        deadline.reset(token)
+
+
+class DeadlineSession:
+    """Times out when the budget the caller forwarded is spent, or answers 504 like the services do"""
+
+    def __init__(self, status_code=None):
+        self.status_code = status_code
+
+    def request(self, method, url, timeout=None, **kwargs):
+        if self.status_code is None:
+            time.sleep(timeout[1])
+            raise requests.exceptions.ReadTimeout("read timed out")
+        response = requests.Response()
+        response.status_code, response.reason, response.url, response._content = self.status_code, "Gateway Timeout", url, b"{}"
+        return response
+
+
+@pytest.mark.parametrize("status_code", [None, 504])
+def test_calls_cut_short_by_the_deadline_do_not_trip_the_breaker(monkeypatch, status_code):
+    monkeypatch.setattr(SessionFactory, "get_session", classmethod(lambda cls, service_name: DeadlineSession(status_code)))
+    for _ in range(Config.CIRCUIT_BREAKER_FAIL_MAX + 1):
+        token = deadline.start(0.02)
+        try:
+            assert BaseServiceClient().circuit_breaker_request("loyalty", "GET", "http://loyalty/loyalty") == {}
+        finally:
+            deadline.reset(token)
+    assert CircuitBreakerFactory.get_breaker("loyalty").current_state == pybreaker.STATE_CLOSED
@@ -0,0 +1,34 @@
+import threading
+
+from flask import Flask, request
+from src.utils.executor import FanOutExecutor
+
+
+def test_fan_out_runs_calls_concurrently_with_request_context():
+    app = Flask(__name__)
+    executor = FanOutExecutor(max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def call():
+        # Both calls must be in flight at once to pass the barrier
+        barrier.wait()
+        return request.endpoint
+
+    with app.test_request_context("/api/v1/me"):
+        assert executor.run(call, call) == [request.endpoint, request.endpoint]
+
+
+def test_fan_out_sequential_mode():
+    executor = FanOutExecutor(max_workers=2, parallel=False)
+    assert executor.run(lambda: 1, lambda: 2) == [1, 2]
+
+
+def test_fan_out_does_not_tear_down_the_request_in_pool_threads():
+    app = Flask(__name__)
+    executor = FanOutExecutor(max_workers=2)
+    torn_down = []
+    app.teardown_request(lambda exc: torn_down.append(threading.current_thread().name))
+
+    with app.test_request_context("/api/v1/me"):
+        executor.run(lambda: 1, lambda: 2)
+        assert torn_down == []
@@ -0,0 +1,40 @@
+import uuid
+from datetime import date, datetime
+
+import pytest
+from src import fastjson
+from src.schemas.compiled import CompiledSchema
+from src.schemas.reservation import ReservationResponseSchema
+
+PAYLOAD = {
+    "reservationUid": uuid.UUID("f9e0ae1f-8a6c-4d35-8a8e-1a4b1a0ad2c4"),
+    "startDate": date(2026, 3, 1),
+    "createdAt": datetime(2026, 3, 1, 12, 30, 5),
+    "hotel": {"name": "Ararat Park Hyatt Moscow", "city": "Москва", "stars": 5, "rating": 4.5},
+    "items": [1, None, True],
+    "byId": {3: "c", 1: "a"},
+}
+
+
+def test_orjson_and_standard_library_encode_the_same_bytes():
+    if fastjson.orjson is None:
+        pytest.skip("orjson is not installed")
+    assert fastjson.dumps_bytes(PAYLOAD) == fastjson._stdlib_dumps_bytes(PAYLOAD)
+
+
+def test_uuids_and_dates_are_encoded_natively():
+    encoded = fastjson.loads(fastjson.dumps_bytes(PAYLOAD))
+    assert encoded["reservationUid"] == "f9e0ae1f-8a6c-4d35-8a8e-1a4b1a0ad2c4"
+    assert encoded["startDate"] == "2026-03-01"
+    assert encoded["createdAt"] == "2026-03-01T12:30:05"
+    assert encoded["hotel"]["city"] == "Москва"
+
+
+def test_responses_render_loaded_reservations(app):
+    reservation = CompiledSchema(ReservationResponseSchema()).load(
+        {"reservationUid": str(PAYLOAD["reservationUid"]), "hotel": {"hotelUid": str(uuid.uuid4()), "name": "Hotel", "stars": 4}, "startDate": "2026-03-01"}
+    )
+    with app.test_request_context():
+        response = app.json.response(reservation)
+    assert response.get_json()["startDate"] == "2026-03-01"
+    assert response.get_json()["reservationUid"] == "f9e0ae1f-8a6c-4d35-8a8e-1a4b1a0ad2c4"
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pytest
+
+from src.cache.idempotency import IdempotencyStore
+from src.services.reservation import ReservationService
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), ttl=60, max_entries=100)
+
+
+class Downstream:
+    """Loyalty, payment and reservation services recording the calls that reach them"""
+
+    def __init__(self, payment_ok=True):
+        self.calls = []
+        self.payment_ok = payment_ok
+
+    def fetch_loyalty(self, username):
+        self.calls.append("loyalty")
+        return {"status": "BRONZE", "discount": 5, "reservationCount": 0}
+
+    def create_payment(self, username, payment_data):
+        self.calls.append("payment")
+        return {"paymentUid": "p-1", "status": "PAID", "price": payment_data["price"]} if self.payment_ok else None
+
+    def get_payment(self, username, reservation_uid):
+        return None
+
+    def update_loyalty(self, username):
+        self.calls.append("loyalty_update")
+        return {"status": "BRONZE", "discount": 5, "reservationCount": 1}
+
+    def request(self, service_name, method, url, **kwargs):
+        self.calls.append(f"{method} {service_name}")
+        if method == "POST":
+            return {"reservationUid": f"r-{len(self.calls)}", "startDate": "2026-01-01", "endDate": "2026-01-03", "price": 100}
+        return None
+
+
+def reservation_service(store, downstream):
+    service = ReservationService(payment_service=downstream, loyalty_service=downstream, idempotency_store=store)
+    service.circuit_breaker_request = downstream.request
+    service.queue_for_retry = lambda *args, **kwargs: True
+    return service
+
+
+def test_step_records_only_successful_results(store):
+    assert store.step("k", "call", lambda: {}) == {}
+    assert store.get("k", "call") is None
+    assert store.step("k", "call", lambda: {"ok": 1}) == {"ok": 1}
+    assert store.step("k", "call", lambda: pytest.fail("must not run again")) == {"ok": 1}
+
+
+def test_step_coroutine_records_like_step(store):
+    async def result(value):
+        return value
+
+    async def steps():
+        assert await store.step_coroutine("k", "call", lambda: result({})) == {}
+        assert await store.step_coroutine("k", "call", lambda: result({"ok": 1})) == {"ok": 1}
+        return await store.step_coroutine("k", "call", lambda: pytest.fail("must not run again"))
+
+    assert asyncio.run(steps()) == {"ok": 1}
+    assert store.step("k", "call", lambda: pytest.fail("must not run again")) == {"ok": 1}
+
+
+def test_records_expire_and_are_bounded(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "bounded.sqlite3"), ttl=0.05, max_entries=3)
+    for index in range(5):
+        store.put(f"k{index}", "done", True)
+    store.evict()
+    assert store.stats()["size"] == 3
+    time.sleep(0.06)
+    assert store.get("k4", "done") is None
+    store.evict()
+    assert store.stats()["size"] == 0
+
+
+def test_replayed_create_reservation_skips_completed_steps(store):
+    downstream = Downstream()
+    service = reservation_service(store, downstream)
+    first = service.create_reservation("alice", {"hotelUid": "h"}, idempotency_key="key-1")
+    second = service.create_reservation("alice", {"hotelUid": "h"}, idempotency_key="key-1")
+
+    assert first == second and first["payment"]["status"] == "PAID"
+    assert downstream.calls == ["loyalty", "POST reservation", "payment", "loyalty_update"]
+
+
+def test_rolled_back_reservation_is_not_reused(store):
+    downstream = Downstream(payment_ok=False)
+    service = reservation_service(store, downstream)
+    assert service.create_reservation("alice", {"hotelUid": "h"}, idempotency_key="key-2")["status"] == "PENDING"
+    downstream.payment_ok = True
+    retried = service.create_reservation("alice", {"hotelUid": "h"}, idempotency_key="key-2")
+    assert retried["status"] == "PAID"
+    assert downstream.calls.count("POST reservation") == 2
+    assert downstream.calls.count("loyalty") == 1
+
+
+def test_idempotency_key_header_replays_the_response(client, monkeypatch, store):
+    monkeypatch.setattr(IdempotencyStore, "_shared", store)
+    calls = []
+
+    def create_reservation(self, username, data, idempotency_key=None):
+        calls.append(idempotency_key)
+        return {"reservationUid": "r-1", "status": "PAID"}
+
+    monkeypatch.setattr(ReservationService, "create_reservation", create_reservation)
+    headers = {"X-User-Name": "alice", "Idempotency-Key": "abc"}
+    first = client.post("/api/v1/reservations", json={"hotelUid": "h"}, headers=headers)
+    second = client.post("/api/v1/reservations", json={"hotelUid": "h"}, headers=headers)
+
+    assert first.status_code == second.status_code == HTTPStatus.OK
+    assert second.json == first.json and second.headers["Idempotent-Replayed"] == "true"
+    assert calls == ["alice:POST:/api/v1/reservations:abc"]
+
+
+def test_claims_exclude_concurrent_holders_until_released_or_lapsed(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), ttl=60, max_entries=100, claim_lease=0.05)
+    token = store.claim("k")
+    assert token and store.claim("k") is None
+
+    store.release("k", token)
+    token = store.claim("k")
+    assert token
+
+    time.sleep(0.1)
+    takeover = store.claim("k")
+    assert takeover
+    # The lapsed holder must not release the claim that replaced its own
+    store.release("k", token)
+    assert store.claim("k") is None
+
+
+def test_concurrent_repeats_run_the_operation_once(app, monkeypatch, store):
+    monkeypatch.setattr(IdempotencyStore, "_shared", store)
+    started, finish = threading.Event(), threading.Event()
+    calls = []
+
+    def create_reservation(self, username, data, idempotency_key=None):
+        calls.append(idempotency_key)
+        started.set()
+        finish.wait(5)
+        return {"reservationUid": "r-1", "status": "PAID"}
+
+    monkeypatch.setattr(ReservationService, "create_reservation", create_reservation)
+    headers = {"X-User-Name": "alice", "Idempotency-Key": "abc"}
+
+    def post():
+        return app.test_client().post("/api/v1/reservations", json={"hotelUid": "h"}, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        first = executor.submit(post)
+        assert started.wait(5)
+        concurrent = post()
+        finish.set()
+        first = first.result()
+
+    assert concurrent.status_code == HTTPStatus.CONFLICT
+    assert first.status_code == HTTPStatus.OK
+    replayed = post()
+    assert replayed.json == first.json and replayed.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+
+from src.logs import LoggerPolicy, LogWriter, QueueingHandler
+
+
+def pipeline(tmp_path, name, sampling=None, rate_limits=None):
+    path = tmp_path / "gateway.log"
+    handler = QueueingHandler(LogWriter(str(path)), LoggerPolicy(sampling, rate_limits))
+    logger = logging.getLogger(name)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger, handler, path
+
+
+def read(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_records_are_written_as_json_lines_by_the_writer_thread(tmp_path):
+    logger, handler, path = pipeline(tmp_path, "test.logs.json")
+    logger.info("queue for retry %s, %s", "create_reservation", {"hotelUid": "h1"})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    assert handler.writer.flush()
+
+    first, second = read(path)
+    assert first["message"] == "queue for retry create_reservation, {'hotelUid': 'h1'}"
+    assert first["level"] == "INFO" and first["logger"] == "test.logs.json" and first["pid"] == os.getpid()
+    assert "ValueError: boom" in second["exception"]
+
+
+def test_disabled_levels_are_never_formatted(tmp_path):
+    logger, handler, path = pipeline(tmp_path, "test.logs.lazy")
+
+    class Payload:
+        formatted = 0
+
+        def __str__(self):
+            Payload.formatted += 1
+            return "payload"
+
+    logger.debug("queue for retry %s", Payload())
+    assert handler.writer.flush()
+    assert Payload.formatted == 0
+    assert not path.exists() or path.read_text() == ""
+
+
+def test_sampling_and_rate_limits_per_logger(tmp_path):
+    logger, handler, path = pipeline(tmp_path, "test.logs.policy", sampling={"test.logs.policy.sampled": 0.0}, rate_limits={"test.logs.policy.limited": 5})
+    sampled, limited = logging.getLogger("test.logs.policy.sampled"), logging.getLogger("test.logs.policy.limited")
+    for _ in range(50):
+        sampled.info("sampled out")
+        limited.info("limited")
+    # Sampling only thins out records below WARNING
+    sampled.warning("kept")
+    assert handler.writer.flush()
+
+    messages = [entry["message"] for entry in read(path)]
+    assert messages.count("sampled out") == 0
+    assert messages.count("kept") == 1
+    assert messages.count("limited") == 5
+
+
+def test_forked_child_writes_its_own_records_once(tmp_path):
+    logger, handler, path = pipeline(tmp_path, "test.logs.fork")
+    logger.info("parent before fork")
+    assert handler.writer.flush()
+
+    pid = os.fork()
+    if pid == 0:
+        logger.info("child")
+        os._exit(0 if handler.writer.flush() else 1)
+    _, status = os.waitpid(pid, 0)
+    logger.info("parent after fork")
+    assert handler.writer.flush()
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    entries = read(path)
+    assert [entry["message"] for entry in entries] == ["parent before fork", "child", "parent after fork"]
+    assert entries[1]["pid"] == pid
@@ -0,0 +1,37 @@
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.services.base import BaseServiceClient
+from src.pool.session import SessionFactory
+
+
+def samples(client):
+    response = client.get("/manage/metrics")
+    assert response.status_code == 200
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.get_data(as_text=True))
+        for sample in family.samples
+    }
+
+
+def test_requests_are_timed_per_route(client):
+    client.get("/manage/health")
+    before = samples(client)
+    client.get("/manage/health")
+    after = samples(client)
+    key = ("gateway_http_request_duration_seconds_count", (("method", "GET"), ("route", "/manage/health"), ("status", "200")))
+    assert after[key] == before[key] + 1
+
+
+def test_downstream_calls_are_timed_per_service_and_outcome(client, monkeypatch):
+    class FailingSession:
+        def request(self, *args, **kwargs):
+            raise IOError("payment service down")
+
+    monkeypatch.setattr(SessionFactory, "get_session", classmethod(lambda cls, service_name: FailingSession()))
+    BaseServiceClient().circuit_breaker_request("payment", "GET", "http://payment/payment")
+
+    metrics = samples(client)
+    key = ("gateway_downstream_request_duration_seconds_count", (("method", "GET"), ("outcome", "error"), ("service", "payment")))
+    assert metrics[key] >= 1
+    assert metrics[("gateway_circuit_breaker_state", (("service", "payment"),))] in (0, 1)
@@ -0,0 +1,55 @@
+from http import HTTPStatus
+
+import pytest
+import requests
+
+from src.circuit.breaker import CircuitBreakerFactory
+from src.config import Config
+from src.pool.session import SessionFactory
+from src.services.reservation import ReservationService
+
+
+class PaymentSession:
+    """Payment service answering the bulk lookup with `batch_status`, and single lookups normally"""
+
+    def __init__(self, batch_status):
+        self.batch_status = batch_status
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        response = requests.Response()
+        response.url = url
+        if url.endswith("/payment/batch"):
+            response.status_code, response._content = self.batch_status, b"{}"
+        else:
+            response.status_code, response._content = HTTPStatus.OK, b'{"paymentUid": "p", "status": "PAID", "price": 100}'
+        return response
+
+
+@pytest.fixture
+def payment_session(monkeypatch, request):
+    session = PaymentSession(request.param)
+    monkeypatch.setattr(SessionFactory, "get_session", classmethod(lambda cls, service_name: session))
+    yield session
+    CircuitBreakerFactory.get_breaker("payment").close()
+
+
+def reservations():
+    return [{"reservationUid": f"r-{index}", "status": "PAID"} for index in range(3)]
+
+
+@pytest.mark.parametrize("payment_session", [HTTPStatus.NOT_FOUND, HTTPStatus.METHOD_NOT_ALLOWED], indirect=True)
+def test_payments_are_looked_up_one_by_one_without_the_bulk_endpoint(payment_session):
+    enriched = ReservationService()._enrich_reservations("alice", reservations())
+
+    assert len(payment_session.calls) == 4
+    assert all(reservation["payment"] == {"status": "PAID", "price": 100} for reservation in enriched)
+
+
+@pytest.mark.parametrize("payment_session", [HTTPStatus.INTERNAL_SERVER_ERROR, HTTPStatus.SERVICE_UNAVAILABLE], indirect=True)
+def test_failed_bulk_lookup_falls_back_for_every_reservation(payment_session):
+    enriched = ReservationService()._enrich_reservations("alice", reservations())
+
+    assert payment_session.calls == [("POST", f"{Config.PAYMENT_SERVICE_URL}/payment/batch")]
+    assert all(reservation["payment"] == {} and reservation["status"] == "RESERVED" for reservation in enriched)
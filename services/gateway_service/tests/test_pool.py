@@ -0,0 +1,39 @@
+import asyncio
+
+from src import create_async_app
+from src.config import Config
+from src.pool.session import PoolMetrics, SessionFactory
+from src.services.aio import AsyncSessionFactory
+
+
+def test_pool_metrics_counts_saturation():
+    metrics = PoolMetrics(maxsize=1)
+    metrics.acquire()
+    metrics.acquire()
+    metrics.release()
+    metrics.release()
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == 2
+    assert snapshot["peak_in_flight"] == 2
+    assert snapshot["saturated"] == 1
+    assert snapshot["in_flight"] == 0
+
+
+def test_session_is_shared_per_service():
+    assert SessionFactory.get_session("payment") is SessionFactory.get_session("payment")
+    assert SessionFactory.get_session("payment") is not SessionFactory.get_session("loyalty")
+
+
+def test_async_pools_are_reported(monkeypatch):
+    monkeypatch.setattr(AsyncSessionFactory, "_sessions", {})
+
+    async def pools():
+        AsyncSessionFactory.get_session("payment")
+        try:
+            response = await create_async_app(Config).test_client().get("/manage/pools")
+            return await response.get_json()
+        finally:
+            await AsyncSessionFactory.close_all()
+
+    stats = asyncio.run(pools())
+    assert stats == {"payment": {"maxsize": Config.HTTP_POOL_MAXSIZE, "in_flight": 0, "idle": 0, "waiting": 0}}
@@ -0,0 +1,65 @@
+import json
+
+import pika
+from pika.frame import Method
+
+from src.queue.backoff import backoff_delay, delay_tier
+from src.queue.publisher import ConfirmTracker, RetryPublisher
+
+
+def confirm(method_class, delivery_tag, multiple=False):
+    return Method(1, method_class(delivery_tag=delivery_tag, multiple=multiple))
+
+
+def offline_publisher(**kwargs):
+    # Closing before the first publish keeps the I/O thread (and any connection attempt) from starting
+    publisher = RetryPublisher("localhost", **kwargs)
+    publisher.close()
+    return publisher
+
+
+def test_confirm_tracker_settles_single_and_multiple():
+    tracker = ConfirmTracker()
+    for body in "abcde":
+        tracker.sent(body)
+    assert tracker.settle(2, multiple=False) == ["b"]
+    assert tracker.settle(4, multiple=True) == ["a", "c", "d"]
+    assert len(tracker) == 1
+    assert tracker.drain() == ["e"]
+
+
+def test_publish_never_blocks_on_a_full_buffer():
+    publisher = offline_publisher(buffer_size=2)
+    assert publisher.publish("create_reservation", {"reservation": {}}, "alice")
+    assert publisher.publish("decrease_loyalty", {}, "alice")
+    assert not publisher.publish("decrease_loyalty", {}, "bob")
+    stats = publisher.stats()
+    assert (stats["accepted"], stats["rejected"], stats["buffered"]) == (2, 1, 2)
+    (exchange, routing_key), body = publisher._buffer.get_nowait()
+    assert (exchange, routing_key) == ("retry", "create_reservation")
+    assert json.loads(body)["operation_type"] == "create_reservation"
+
+
+def test_batched_acks_and_nacks_are_settled():
+    publisher = offline_publisher()
+    tracker = publisher._trackers[1] = ConfirmTracker()
+    for index in range(5):
+        tracker.sent(f"message-{index}")
+
+    publisher._on_confirm(1, confirm(pika.spec.Basic.Ack, 3, multiple=True))
+    publisher._on_confirm(1, confirm(pika.spec.Basic.Nack, 5, multiple=True))
+
+    stats = publisher.stats()
+    assert (stats["confirmed"], stats["nacked"], stats["republished"], stats["unconfirmed"]) == (3, 2, 2, 0)
+    assert stats["messages_per_confirm"] == 2.5
+    # Nacked messages go back to the buffer for another attempt
+    assert stats["buffered"] == 2
+
+
+def test_backoff_grows_exponentially_within_jitter_and_cap():
+    for attempt, (low, high) in {1: (0.5, 1), 2: (1, 2), 4: (4, 8), 20: (300, 600)}.items():
+        delays = [backoff_delay(attempt, base=1, cap=600) for _ in range(50)]
+        assert all(low <= delay <= high for delay in delays)
+    assert delay_tier(0.7, [1, 5, 30]) == 1
+    assert delay_tier(6, [1, 5, 30]) == 30
+    assert delay_tier(400, [1, 5, 30]) == 30
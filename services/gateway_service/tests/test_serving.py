@@ -0,0 +1,35 @@
+import signal
+import sys
+import time
+
+import pytest
+
+from src.serving import Supervisor
+
+
+@pytest.fixture
+def restore_signals():
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+def test_worker_is_restarted_until_the_web_server_exits(tmp_path, restore_signals):
+    starts = tmp_path / "starts"
+
+    def worker():
+        with open(starts, "a") as f:
+            f.write("started\n")
+
+    def web():
+        time.sleep(0.5)
+        sys.exit(3)
+
+    supervisor = Supervisor(graceful_timeout=1, max_restart_delay=0, poll_interval=0.02)
+    supervisor.add("retry-worker", worker, restart=True)
+    supervisor.add("web", web, restart=False)
+
+    assert supervisor.run() == 3
+    assert len(starts.read_text().splitlines()) > 1
+    assert not any(child.process.is_alive() for child in supervisor.children)
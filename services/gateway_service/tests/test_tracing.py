@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from src.pool.session import SessionFactory
+from src.queue.publisher import RetryPublisher
+from src.utils import critical_path, tracing
+
+
+class RecordingSession:
+    def __init__(self):
+        self.headers = []
+
+    def request(self, method, url, **kwargs):
+        self.headers.append(kwargs["headers"])
+        raise IOError("service down")
+
+
+@pytest.fixture
+def span_file(tmp_path, monkeypatch):
+    path = tmp_path / "gateway.spans"
+    monkeypatch.setattr(tracing.SpanFile, "_shared", tracing.SpanFile(str(path)))
+    return path
+
+
+def test_request_spans_and_downstream_headers(client, span_file, monkeypatch):
+    session = RecordingSession()
+    monkeypatch.setattr(SessionFactory, "get_session", classmethod(lambda cls, service_name: session))
+
+    response = client.get("/api/v1/loyalty", headers={"X-User-Name": "alice", "X-Request-ID": "req-1"})
+
+    assert response.headers["X-Request-ID"] == "req-1"
+    spans = [critical_path.SpanRecord(*json.loads(line)) for line in span_file.read_text().splitlines()]
+    (root,) = [span for span in spans if span.name == "GET /api/v1/loyalty"]
+    calls = [span for span in spans if span.parent_id == root.span_id]
+    assert calls and all(span.request_id == "req-1" for span in spans)
+    assert session.headers[0]["X-Request-ID"] == "req-1"
+    assert session.headers[0]["X-Parent-Span-ID"] == calls[0].span_id
+
+
+def test_queued_operations_carry_the_trace(span_file):
+    publisher = RetryPublisher("localhost", buffer_size=1)
+    publisher._start = lambda: None
+    root = tracing.start_trace("POST /api/v1/reservations", request_id="req-2")
+    try:
+        publisher.publish("create_reservation", {}, "alice")
+    finally:
+        tracing.finish_trace(root)
+    _, body = publisher._buffer.get_nowait()
+    message = json.loads(body)
+    assert (message["request_id"], message["parent_span_id"]) == ("req-2", root.span_id)
+
+
+def test_critical_path_follows_the_last_finishing_children():
+    def span(span_id, parent_id, start, duration):
+        return critical_path.SpanRecord("r", span_id, parent_id, "gateway", span_id, start, duration, "ok")
+
+    spans = [
+        span("root", None, 0, 100),
+        span("loyalty", "root", 0, 30),
+        span("payment", "root", 30, 60),
+        span("payment-db", "payment", 35, 50),
+        span("cache", "root", 5, 10),
+        # Queued retry, replayed after the request ended
+        span("retry", "root", 120, 40),
+    ]
+    path = critical_path.critical_path(spans[0], critical_path.children_of(spans))
+    assert [span.span_id for span in path] == ["root", "loyalty", "payment", "payment-db"]
+    assert "* +" in critical_path.render(spans)
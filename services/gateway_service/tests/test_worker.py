@@ -0,0 +1,190 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pika
+import pytest
+
+from src.cache.idempotency import OPERATION_DONE, IdempotencyStore
+from src.config import Config
+from src.queue.backoff import ATTEMPT_HEADER, ERROR_HEADER
+from src.queue.publisher import RetryPublisher
+from src.queue.topology import DEAD_LETTER_QUEUE
+from src.queue.worker import RetryWorker
+from src.services.reservation import ReservationService
+from tests.test_idempotency import Downstream, reservation_service
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.acked = []
+        self.nacked = []
+        self.published = []
+        self.connection = SimpleNamespace(add_callback_threadsafe=lambda callback: callback())
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.nacked.append(delivery_tag)
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((exchange, routing_key, properties))
+
+
+def offline_worker(monkeypatch):
+    monkeypatch.setattr(RetryWorker, "_connect", lambda self: None)
+    worker = RetryWorker()
+    worker.channel = FakeChannel()
+    return worker
+
+
+def deliver(worker, channel, delivery_tag, operation_type, attempt=None):
+    body = json.dumps({"operation_type": operation_type, "payload": {}, "username": "alice"})
+    properties = pika.BasicProperties(headers=None if attempt is None else {ATTEMPT_HEADER: attempt})
+    worker.dispatch(channel, SimpleNamespace(delivery_tag=delivery_tag), properties, body)
+
+
+def settle_all(worker):
+    for executor in worker.executors.values():
+        executor.shutdown(wait=True)
+
+
+def test_flood_of_one_operation_does_not_starve_another(monkeypatch):
+    worker = offline_worker(monkeypatch)
+    release = threading.Event()
+    created = threading.Event()
+
+    def process_message(message):
+        if message["operation_type"] == "decrease_loyalty":
+            release.wait(5)
+            return True
+        created.set()
+        return False
+
+    worker.process_message = process_message
+    channel = FakeChannel()
+    for delivery_tag in range(1, 51):
+        deliver(worker, channel, delivery_tag, "decrease_loyalty")
+    deliver(worker, channel, 51, "create_reservation")
+
+    # Every decrease_loyalty handler is blocked, the reservation retry still runs
+    assert created.wait(2)
+    release.set()
+    settle_all(worker)
+    assert sorted(channel.acked) == list(range(1, 52))
+
+
+def test_unknown_operations_are_acked(monkeypatch):
+    worker = offline_worker(monkeypatch)
+    channel = FakeChannel()
+    deliver(worker, channel, 7, "unknown")
+    assert channel.acked == [7]
+
+
+def test_failures_back_off_then_dead_letter(monkeypatch):
+    monkeypatch.setattr(Config, "RETRY_MAX_ATTEMPTS", 3)
+    worker = offline_worker(monkeypatch)
+    worker.process_message = lambda message: False
+    channel = FakeChannel()
+    deliver(worker, channel, 1, "decrease_loyalty")
+    deliver(worker, channel, 2, "decrease_loyalty", attempt=1)
+    deliver(worker, channel, 3, "decrease_loyalty", attempt=2)
+    settle_all(worker)
+
+    # The original deliveries are acked instead of being requeued in a tight loop
+    assert sorted(channel.acked) == [1, 2, 3] and channel.nacked == []
+    retries = {properties.headers[ATTEMPT_HEADER]: (exchange, routing_key, properties) for exchange, routing_key, properties in worker.channel.published}
+    exchange, routing_key, properties = retries[1]
+    assert exchange.startswith("retry.delay.") and routing_key == "decrease_loyalty"
+    assert 500 <= int(properties.expiration) <= 1000
+    assert 1000 <= int(retries[2][2].expiration) <= 2000
+    assert retries[3][:2] == ("", DEAD_LETTER_QUEUE)
+    assert retries[3][2].headers[ERROR_HEADER] == "operation failed"
+
+
+def test_malformed_messages_are_dead_lettered(monkeypatch):
+    worker = offline_worker(monkeypatch)
+    channel = FakeChannel()
+    worker.dispatch(channel, SimpleNamespace(delivery_tag=4), pika.BasicProperties(), b"not json")
+    assert channel.acked == [4]
+    assert worker.channel.published[0][:2] == ("", DEAD_LETTER_QUEUE)
+
+
+def test_replayed_reservation_is_acked_once_it_is_paid(monkeypatch, tmp_path):
+    worker = offline_worker(monkeypatch)
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), ttl=60, max_entries=100)
+    downstream = Downstream(payment_ok=False)
+    worker.reservation_service = reservation_service(store, downstream)
+    worker.idempotency = store
+    message = {"operation_type": "create_reservation", "payload": {"reservation": {"hotelUid": "h"}}, "username": "alice", "idempotency_key": "k"}
+
+    # Payment still failing: the reservation is rolled back and PENDING, not done
+    assert worker.process_message(message) is False
+    downstream.payment_ok = True
+    assert worker.process_message(message) is True
+    assert store.get("k", "payment")["status"] == "PAID"
+    assert store.get("k", OPERATION_DONE)
+
+    # A redelivery is acked without calling any service
+    calls = list(downstream.calls)
+    assert worker.process_message(message) is True
+    assert downstream.calls == calls
+
+
+def test_retry_of_a_claimed_operation_waits_for_the_holder(monkeypatch, tmp_path):
+    worker = offline_worker(monkeypatch)
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), ttl=60, max_entries=100)
+    downstream = Downstream()
+    worker.reservation_service = reservation_service(store, downstream)
+    worker.idempotency = store
+    message = {"operation_type": "create_reservation", "payload": {"reservation": {"hotelUid": "h"}}, "username": "alice", "idempotency_key": "k"}
+
+    # The client request that queued the retry is still running under the same key
+    token = store.claim("k")
+    assert worker.process_message(message) is False
+    assert downstream.calls == []
+
+    store.release("k", token)
+    assert worker.process_message(message) is True
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, operation_type, payload, username, idempotency_key=None):
+        self.published.append((operation_type, idempotency_key))
+        return True
+
+
+@pytest.mark.parametrize("payment_fails", ["declined", "raises"])
+def test_failed_replay_is_republished_once_by_the_backoff(monkeypatch, tmp_path, payment_fails):
+    worker = offline_worker(monkeypatch)
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), ttl=60, max_entries=100)
+    downstream = Downstream(payment_ok=False)
+    if payment_fails == "raises":
+
+        def create_payment(username, payment_data):
+            raise RuntimeError("payment service down")
+
+        downstream.create_payment = create_payment
+    service = ReservationService(payment_service=downstream, loyalty_service=downstream, idempotency_store=store)
+    service.circuit_breaker_request = downstream.request
+    worker.reservation_service, worker.idempotency = service, store
+    publisher = RecordingPublisher()
+    monkeypatch.setattr(RetryPublisher, "shared", classmethod(lambda cls: publisher))
+
+    channel = FakeChannel()
+    message = {"operation_type": "create_reservation", "payload": {"reservation": {"hotelUid": "h"}}, "username": "alice", "idempotency_key": "k"}
+    properties = pika.BasicProperties(headers={ATTEMPT_HEADER: 3})
+    worker.dispatch(channel, SimpleNamespace(delivery_tag=7), properties, json.dumps(message))
+    settle_all(worker)
+
+    # Only the worker's delayed copy: create_reservation must not queue one of its own
+    assert publisher.published == []
+    ((exchange, routing_key, retry_properties),) = worker.channel.published
+    assert routing_key == "create_reservation" and retry_properties.headers[ATTEMPT_HEADER] == 4
+    assert channel.acked == [7]
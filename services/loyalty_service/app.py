@@ -1,13 +1,25 @@
 from flask import Flask, request, jsonify
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import os
+from compiled import CompiledSchema
+from fastjson import FastJSONProvider
+import instrumentation
+import serving
 from schemas import LoyaltyInfoResponseSchema
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(os.path.abspath(os.path.dirname(__file__)), "app.db")
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(basedir, "app.db")
 
 db = SQLAlchemy(app)
+migrate = Migrate(app, db, directory=os.path.join(basedir, "migrations"))
+instrumentation.init_app(app, db, "loyalty")
 
 
 class Loyalty(db.Model):
@@ -19,6 +31,9 @@ class Loyalty(db.Model):
     discount = db.Column(db.Integer, nullable=False, default=5)
 
 
+loyalty_info_schema = CompiledSchema(LoyaltyInfoResponseSchema())
+
+
 @app.route("/manage/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "OK"}), 200
@@ -33,7 +48,6 @@ def get_loyalty():
         loyalty = Loyalty(username=username)
         db.session.add(loyalty)
         db.session.commit()
-    loyalty_info_schema = LoyaltyInfoResponseSchema()
     loyalty_info_data = {"status": loyalty.status, "discount": loyalty.discount, "reservationCount": loyalty.reservation_count}
     loyalty_info_response = loyalty_info_schema.load(loyalty_info_data)
     return jsonify(loyalty_info_response), 200
@@ -42,49 +56,79 @@ def get_loyalty():
 @app.route("/loyalty", methods=["POST"])
 def update_loyalty():
     username = request.headers.get("X-User-Name")
-    loyalty = Loyalty.query.filter_by(username=username).first()
-
-    if not loyalty:
-        loyalty = Loyalty(username=username)
-        db.session.add(loyalty)
-
-    loyalty.reservation_count += 1
-
-    if loyalty.reservation_count >= 20:
-        loyalty.status = "GOLD"
-        loyalty.discount = 10
-    elif loyalty.reservation_count >= 10:
-        loyalty.status = "SILVER"
-        loyalty.discount = 7
-
-    db.session.commit()
-
+    loyalty = increment_loyalty(username)
     return jsonify({"status": loyalty.status, "discount": loyalty.discount, "reservationCount": loyalty.reservation_count}), 200
 
 
 @app.route("/loyalty/decrease", methods=["POST"])
 def decrease_loyalty():
     username = request.headers.get("X-User-Name")
-    loyalty = Loyalty.query.filter_by(username=username).first()
+    loyalty = decrement_loyalty(username)
 
     if not loyalty:
         return jsonify({"message": "Loyalty record not found"}), 404
 
-    loyalty.reservation_count = max(0, loyalty.reservation_count - 1)
+    return jsonify({"status": loyalty.status, "discount": loyalty.discount, "reservationCount": loyalty.reservation_count}), 200
 
-    if loyalty.reservation_count < 10:
-        loyalty.status = "BRONZE"
-        loyalty.discount = 5
-    elif loyalty.reservation_count < 20:
-        loyalty.status = "SILVER"
-        loyalty.discount = 7
 
+# Tier table, highest threshold first: (minimum reservation count, status, discount)
+LOYALTY_TIERS = (
+    (20, "GOLD", 10),
+    (10, "SILVER", 7),
+    (0, "BRONZE", 5),
+)
+
+
+def tier_for(count):
+    for minimum, status, discount in LOYALTY_TIERS:
+        if count >= minimum:
+            return status, discount
+    return LOYALTY_TIERS[-1][1:]
+
+
+def tier_columns(count):
+    """SQL expressions for the status and discount of the tier that `count` (a column expression) falls in"""
+    *ranked, (_, base_status, base_discount) = LOYALTY_TIERS
+    return {
+        "status": db.case(*((count >= minimum, status) for minimum, status, _ in ranked), else_=base_status),
+        "discount": db.case(*((count >= minimum, discount) for minimum, _, discount in ranked), else_=base_discount),
+    }
+
+
+def increment_loyalty(username):
+    """Count one more reservation in a single upsert, creating the record on the first one.
+    The row is updated in place by the database, so concurrent increments are never lost."""
+    table = Loyalty.__table__
+    insert = postgresql_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    count = table.c.reservation_count + 1
+    status, discount = tier_for(1)
+    statement = (
+        insert(table)
+        .values(username=username, reservation_count=1, status=status, discount=discount)
+        .on_conflict_do_update(index_elements=[table.c.username], set_={"reservation_count": count, **tier_columns(count)})
+        .returning(table.c.status, table.c.discount, table.c.reservation_count)
+    )
+    loyalty = db.session.execute(statement).one()
     db.session.commit()
-
-    return jsonify({"status": loyalty.status, "discount": loyalty.discount, "reservationCount": loyalty.reservation_count}), 200
+    return loyalty
+
+
+def decrement_loyalty(username):
+    """Count one reservation less (never below zero) in a single UPDATE ... RETURNING; None if the user has no record"""
+    table = Loyalty.__table__
+    count = db.case((table.c.reservation_count > 0, table.c.reservation_count - 1), else_=0)
+    statement = (
+        db.update(table)
+        .where(table.c.username == username)
+        .values(reservation_count=count, **tier_columns(count))
+        .returning(table.c.status, table.c.discount, table.c.reservation_count)
+    )
+    loyalty = db.session.execute(statement).first()
+    db.session.commit()
+    return loyalty
 
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
-    app.run(host="0.0.0.0", port=8050)
+        serving.upgrade_database(app, migrate.directory)
+    serving.serve(app, db, 8050)
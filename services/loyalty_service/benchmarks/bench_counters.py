@@ -0,0 +1,111 @@
+"""Correctness and throughput of POST /loyalty under parallel writers.
+
+Compares the single-statement upsert with the previous read-modify-write implementation
+(SELECT the record, update the count and tier in Python, commit). Every writer books
+--bookings reservations for one of --users users; the final counts must add up.
+
+    python benchmarks/bench_counters.py [--writers 1,8,32] [--users 1] [--bookings 50]
+
+DATABASE_URL selects the database (a temporary SQLite file by default).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVICE_DIR, os.path.join(os.path.dirname(SERVICE_DIR), "common")]
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import app, db, migrate, Loyalty  # noqa: E402
+from serving import upgrade_database  # noqa: E402
+
+
+def legacy_update(username):
+    loyalty = Loyalty.query.filter_by(username=username).first()
+
+    if not loyalty:
+        loyalty = Loyalty(username=username)
+        db.session.add(loyalty)
+
+    loyalty.reservation_count += 1
+
+    if loyalty.reservation_count >= 20:
+        loyalty.status = "GOLD"
+        loyalty.discount = 10
+    elif loyalty.reservation_count >= 10:
+        loyalty.status = "SILVER"
+        loyalty.discount = 7
+
+    db.session.commit()
+
+
+def atomic_update(username):
+    response, status = app.view_functions["update_loyalty"]()
+    assert status == 200
+
+
+def run(update, writers, users, bookings):
+    """Returns (bookings/s, reservations counted, failed requests)"""
+    with app.app_context():
+        db.session.query(Loyalty).delete()
+        # Records exist before the first booking, as GET /loyalty creates them
+        db.session.add_all([Loyalty(username=f"user-{index}", reservation_count=0) for index in range(users)])
+        db.session.commit()
+
+    failures = []
+    barrier = threading.Barrier(writers + 1)
+
+    def writer(index):
+        username = f"user-{index % users}"
+        barrier.wait()
+        for _ in range(bookings):
+            with app.test_request_context("/loyalty", method="POST", headers={"X-User-Name": username}):
+                try:
+                    update(username)
+                except OperationalError:
+                    # SQLite gives up on a locked database after its busy timeout
+                    db.session.rollback()
+                    failures.append(1)
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        counted = db.session.query(db.func.coalesce(db.func.sum(Loyalty.reservation_count), 0)).scalar()
+    return writers * bookings / elapsed, counted, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", default="1,8,32")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--bookings", type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade_database(app, migrate.directory)
+
+    print(f"{'writers':>8} {'impl':>8} {'bookings/s':>11} {'expected':>9} {'counted':>8} {'failed':>7}")
+    for writers in [int(writers) for writers in args.writers.split(",")]:
+        for name, update in (("legacy", legacy_update), ("atomic", atomic_update)):
+            throughput, counted, failed = run(update, writers, args.users, args.bookings)
+            print(f"{writers:>8} {name:>8} {throughput:>11.0f} {writers * args.bookings:>9} {counted:>8} {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Initial schema, as previously created by db.create_all()
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The unique constraint on username doubles as the index of the per-user lookup
+    op.create_table(
+        "loyalty",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(length=80), nullable=False),
+        sa.Column("reservation_count", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=80), nullable=False),
+        sa.Column("discount", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username"),
+    )
+
+
+def downgrade():
+    op.drop_table("loyalty")
@@ -0,0 +1,38 @@
+from app import Loyalty, LOYALTY_TIERS, db, tier_for
+
+
+def post(client, path, username="alice"):
+    response = client.post(path, headers={"X-User-Name": username})
+    return response.status_code, response.json
+
+
+def test_first_increment_creates_the_record(client):
+    assert post(client, "/loyalty") == (200, {"status": "BRONZE", "discount": 5, "reservationCount": 1})
+    assert Loyalty.query.filter_by(username="alice").one().reservation_count == 1
+
+
+def test_tiers_follow_the_count_both_ways(client):
+    for count in range(1, 22):
+        status, body = post(client, "/loyalty")
+        assert (body["status"], body["discount"]) == tier_for(count)
+        assert body["reservationCount"] == count
+    for count in range(20, -1, -1):
+        status, body = post(client, "/loyalty/decrease")
+        assert (body["status"], body["discount"]) == tier_for(count)
+        assert body["reservationCount"] == count
+
+
+def test_decrease_stops_at_zero(client):
+    post(client, "/loyalty")
+    post(client, "/loyalty/decrease")
+    assert post(client, "/loyalty/decrease") == (200, {"status": "BRONZE", "discount": 5, "reservationCount": 0})
+
+
+def test_decrease_without_record(client):
+    assert post(client, "/loyalty/decrease", username="nobody")[0] == 404
+    assert db.session.query(Loyalty).count() == 0
+
+
+def test_tier_table_boundaries():
+    assert [tier_for(minimum) for minimum, _, _ in LOYALTY_TIERS] == [(status, discount) for _, status, discount in LOYALTY_TIERS]
+    assert tier_for(9) == ("BRONZE", 5) and tier_for(19) == ("SILVER", 7)
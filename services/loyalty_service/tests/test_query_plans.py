@@ -0,0 +1,21 @@
+import pytest
+
+from app import Loyalty, db
+
+
+@pytest.fixture
+def members(app):
+    db.session.add_all([Loyalty(username=f"user-{i}", reservation_count=i) for i in range(30)])
+    db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "request_for",
+    [
+        pytest.param(lambda client: client.get("/loyalty", headers={"X-User-Name": "user-7"}), id="get"),
+        pytest.param(lambda client: client.post("/loyalty", headers={"X-User-Name": "user-7"}), id="update"),
+        pytest.param(lambda client: client.post("/loyalty/decrease", headers={"X-User-Name": "user-7"}), id="decrease"),
+    ],
+)
+def test_hot_queries_use_an_index(client, members, sequential_scans, request_for):
+    assert sequential_scans(lambda: request_for(client).close()) == []
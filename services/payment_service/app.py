@@ -1,13 +1,21 @@
 from flask import Flask, request, jsonify
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 import os
 import uuid
 
-from schemas import CreatePaymentRequestSchema, PaymentInfoSchema
+from compiled import CompiledSchema
+from fastjson import FastJSONProvider
+import instrumentation
+import serving
+from schemas import PaymentInfoSchema
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 db = SQLAlchemy(app)
+migrate = Migrate(app, db, directory=os.path.join(os.path.abspath(os.path.dirname(__file__)), "migrations"))
+instrumentation.init_app(app, db, "payment")
 
 
 class Payment(db.Model):
@@ -18,6 +26,12 @@ class Payment(db.Model):
     price = db.Column(db.Integer, nullable=False)
     reservationUid = db.Column(db.String(36), nullable=False)
 
+    # Serves the lookups by reservation, which pick the first payment (ORDER BY id) of each
+    __table_args__ = (db.Index("ix_payment_reservation_uid_id", "reservationUid", "id"),)
+
+
+payment_info_schema = CompiledSchema(PaymentInfoSchema())
+
 
 @app.route("/manage/health", methods=["GET"])
 def health_check():
@@ -27,9 +41,6 @@ def health_check():
 @app.route("/payment", methods=["POST"])
 def create_payment():
     data = request.json
-    create_payment_request_schema = CreatePaymentRequestSchema()
-    payment_info_schema = PaymentInfoSchema()
-    payment_creation_data = create_payment_request_schema.dump({"status": data["status"], "price": data["price"], "reservationUid": data["reservationUid"]})
     new_payment = Payment(paymentUid=str(uuid.uuid4()), status=data["status"], price=data["price"], reservationUid=data["reservationUid"])
     db.session.add(new_payment)
     db.session.commit()
@@ -43,13 +54,31 @@ def get_payment(reservationUid):
     payment = Payment.query.filter_by(reservationUid=reservationUid).first()
     if not payment:
         return jsonify({"message": "No payment related to this reservation"}), 404
-    payment_info_schema = PaymentInfoSchema()
     if request.method == "GET":
         payment_info = {"paymentUid": payment.paymentUid, "status": payment.status, "price": payment.price}
         payment_response = payment_info_schema.load(payment_info)
         return jsonify(payment_response), 200
 
 
+@app.route("/payment/batch", methods=["POST"])
+def get_payments_batch():
+    reservation_uids = (request.json or {}).get("reservationUids", [])
+    items = {}
+    if reservation_uids:
+        payments = (
+            db.session.query(Payment.reservationUid, Payment.paymentUid, Payment.status, Payment.price)
+            .filter(Payment.reservationUid.in_(reservation_uids))
+            .order_by(Payment.id)
+            .all()
+        )
+        for payment in payments:
+            # Keep the first payment per reservation, as GET /payment/<reservationUid> does
+            if payment.reservationUid not in items:
+                payment_info = {"paymentUid": payment.paymentUid, "status": payment.status, "price": payment.price}
+                items[payment.reservationUid] = payment_info_schema.load(payment_info)
+    return jsonify({"items": items}), 200
+
+
 @app.route("/payment/<string:payment_uid>", methods=["DELETE"])
 def cancel_payment(payment_uid):
     payment = Payment.query.filter_by(paymentUid=payment_uid).first()
@@ -63,7 +92,7 @@ def cancel_payment(payment_uid):
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        serving.upgrade_database(app, migrate.directory)
 
         payment_data = {
             "paymentUid": str(uuid.uuid4()),
@@ -76,4 +105,4 @@ if __name__ == "__main__":
         db.session.add(payment)
 
         db.session.commit()
-    app.run(host="0.0.0.0", port=8060)
+    serving.serve(app, db, 8060)
@@ -0,0 +1,33 @@
+"""Initial schema, as previously created by db.create_all()
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "payment",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("paymentUid", sa.String(length=36), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.Column("reservationUid", sa.String(length=36), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("paymentUid"),
+    )
+
+
+def downgrade():
+    op.drop_table("payment")
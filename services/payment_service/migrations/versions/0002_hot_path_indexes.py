@@ -0,0 +1,30 @@
+"""Index payments by reservation
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial
+Create Date: 2026-10-18 10:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_hot_path_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+# Single-column index that db.create_all() added while the model declared index=True
+LEGACY_INDEX = "ix_payment_reservationUid"
+
+
+def upgrade():
+    op.create_index("ix_payment_reservation_uid_id", "payment", ["reservationUid", "id"], unique=False)
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("payment")}
+    if LEGACY_INDEX in existing:
+        op.drop_index(LEGACY_INDEX, table_name="payment")
+
+
+def downgrade():
+    op.drop_index("ix_payment_reservation_uid_id", table_name="payment")
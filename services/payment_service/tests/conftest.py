@@ -0,0 +1 @@
+from service_fixtures import app, client, sequential_scans  # noqa: F401  (services/common)
@@ -0,0 +1,34 @@
+import uuid
+
+import pytest
+
+from app import Payment, db
+
+
+@pytest.fixture
+def payments(app):
+    reservation_uids = [str(uuid.uuid4()) for _ in range(20)]
+    payments = [Payment(paymentUid=str(uuid.uuid4()), status="PAID", price=100, reservationUid=reservation_uids[i % 20]) for i in range(60)]
+    db.session.add_all(payments)
+    db.session.commit()
+    return payments
+
+
+def test_migrations_create_the_reservation_index(app):
+    indexes = {index["name"]: index["column_names"] for index in db.inspect(db.engine).get_indexes("payment")}
+    assert indexes["ix_payment_reservation_uid_id"] == ["reservationUid", "id"]
+
+
+@pytest.mark.parametrize(
+    "request_for",
+    [
+        pytest.param(lambda client, payments: client.get(f"/payment/{payments[7].reservationUid}"), id="by-reservation"),
+        pytest.param(
+            lambda client, payments: client.post("/payment/batch", json={"reservationUids": [payment.reservationUid for payment in payments[:10]]}),
+            id="batch",
+        ),
+        pytest.param(lambda client, payments: client.delete(f"/payment/{payments[7].paymentUid}"), id="cancel"),
+    ],
+)
+def test_hot_queries_use_an_index(client, payments, sequential_scans, request_for):
+    assert sequential_scans(lambda: request_for(client, payments).close()) == []
@@ -1,15 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, abort, request, jsonify
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+import base64
+import binascii
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
-from sqlalchemy.orm import joinedload
 
-from schemas import CreateReservationRequestSchema, CreateReservationResponseSchema, ReservationResponseSchema
+from compiled import CompiledSchema
+from fastjson import FastJSONProvider
+import instrumentation
+import serving
+from schemas import CreateReservationResponseSchema, ReservationResponseSchema
+
+basedir = os.path.abspath(os.path.dirname(__file__))
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(os.path.abspath(os.path.dirname(__file__)), "app.db")
+app.json = FastJSONProvider(app)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(basedir, "app.db")
 db = SQLAlchemy(app)
+migrate = Migrate(app, db, directory=os.path.join(basedir, "migrations"))
+instrumentation.init_app(app, db, "reservation")
 
 
 class Hotel(db.Model):
@@ -37,6 +49,14 @@ class Reservation(db.Model):
     end_date = db.Column(db.DateTime, nullable=False)
     hotel_relation = db.relationship("Hotel", foreign_keys=[hotel_id], back_populates="reservations")
 
+    # Serves the per-user listing (WHERE username = ? ORDER BY id) without a sort
+    __table_args__ = (db.Index("ix_reservation_username_id", "username", "id"),)
+
+
+reservation_response_schema = CompiledSchema(ReservationResponseSchema())
+reservations_response_schema = CompiledSchema(ReservationResponseSchema(many=True))
+create_reservation_response_schema = CompiledSchema(CreateReservationResponseSchema())
+
 
 @app.route("/manage/health", methods=["GET"])
 def health_check():
@@ -45,45 +65,64 @@ def health_check():
 
 @app.route("/hotels", methods=["GET"])
 def get_hotels():
-    page = request.args.get("page", 1, type=int)
     size = request.args.get("size", 10, type=int)
-    hotels = Hotel.query.paginate(page=page, per_page=size)
-
-    response = {"page": page, "pageSize": size, "totalElements": hotels.total, "items": [hotel_to_dict(h) for h in hotels.items]}
+    after = request.args.get("after")
+    if after is not None:
+        # Keyset pagination: seek past the last hotel id of the previous page instead of scanning an OFFSET
+        try:
+            last_id, previous_page = decode_cursor(after)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        page = previous_page + 1
+        hotels = Hotel.query.filter(Hotel.id > last_id).order_by(Hotel.id).limit(size + 1).all()
+        has_next = len(hotels) > size
+        hotels = hotels[:size]
+    else:
+        page = request.args.get("page", 1, type=int)
+        if page < 1 or size < 1:
+            abort(404)
+        hotels = Hotel.query.order_by(Hotel.id).offset((page - 1) * size).limit(size + 1).all()
+        if not hotels and page != 1:
+            # A page past the last one, answered like paginate() does
+            abort(404)
+        has_next = len(hotels) > size
+        hotels = hotels[:size]
+
+    response = {
+        "page": page,
+        "pageSize": size,
+        "totalElements": hotel_count(),
+        "items": [hotel_to_dict(h) for h in hotels],
+        "nextCursor": encode_cursor(hotels[-1].id, page) if hotels and has_next else None,
+    }
 
-    return jsonify(response), 200
+    return conditional_response(response)
 
 
 @app.route("/hotels/<string:hotel_uid>", methods=["GET"])
 def get_hotel(hotel_uid):
-    hotel = Hotel.query.filter_by(hotel_uid=hotel_uid).first()
+    hotel = Hotel.query.filter_by(hotelUid=hotel_uid).first()
     if not hotel:
         return jsonify({"message": "Hotel not found"}), 404
 
-    return jsonify(hotel_to_dict(hotel)), 200
+    return conditional_response(hotel_to_dict(hotel))
 
 
 @app.route("/reservations", methods=["GET", "POST"])
 def reservations():
     username = request.headers.get("X-User-Name")
     if request.method == "GET":
-        reservations_response_schema = ReservationResponseSchema(many=True)
-        user_reservations = Reservation.query.filter_by(username=username).options(joinedload(Reservation.hotel_relation)).all()
-        reservation_data = []
-        for reservation in user_reservations:
-            hotel = Hotel.query.get(reservation.hotel_id)
-            if not hotel:
-                continue
-            reservation_dict = {
-                "reservationUid": reservation.reservationUid,
-                "hotel": hotel.__dict__,
-                "startDate": reservation.start_date.strftime("%Y-%m-%d"),
-                "endDate": reservation.end_date.strftime("%Y-%m-%d"),
-            }
-            reservation_data.append(reservation_dict)
-
+        query = reservation_listing_query(username)
+        limit = request.args.get("limit", type=int)
+        offset = request.args.get("offset", type=int)
+        if limit is not None:
+            query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
+
+        reservation_data = [reservation_row_to_dict(row) for row in query]
         user_reservations_response = reservations_response_schema.load(reservation_data)
-        return jsonify(user_reservations_response), 200
+        return conditional_response(user_reservations_response)
     else:  # POST
 
         data = request.json
@@ -91,9 +130,6 @@ def reservations():
         if not hotel:
             return jsonify({"message": "Hotel not found"}), 404
 
-        create_reservation_request_schema = CreateReservationRequestSchema()
-
-        reservation_data = create_reservation_request_schema.dump({"hotel_id": hotel.id, "start_date": data["startDate"], "end_date": data["endDate"]})
         new_reservation = Reservation(
             reservationUid=str(uuid.uuid4()),
             username=username,
@@ -104,7 +140,6 @@ def reservations():
         db.session.add(new_reservation)
         db.session.commit()
 
-        create_reservation_response_schema = CreateReservationResponseSchema()
         response = {
             "reservationUid": new_reservation.reservationUid,
             "hotelUid": hotel.hotelUid,
@@ -119,25 +154,18 @@ def reservations():
 @app.route("/reservations/<string:reservation_uid>", methods=["GET", "DELETE"])
 def reservation(reservation_uid):
     username = request.headers.get("X-User-Name")
-    reservation = Reservation.query.filter_by(reservationUid=reservation_uid, username=username).options(joinedload(Reservation.hotel_relation)).first()
-    if not reservation:
-        return jsonify({"message": "Reservation not found"}), 404
 
     if request.method == "GET":
-        reservations_response_schema = ReservationResponseSchema()
-        hotel = Hotel.query.get(reservation.hotel_id)
-        if not hotel:
-            return jsonify({"message": "Hotel related to this reservation not found"}), 404
-        reservation_dict = {
-            "reservationUid": reservation.reservationUid,
-            "hotel": hotel.__dict__,
-            "startDate": reservation.start_date.strftime("%Y-%m-%d"),
-            "endDate": reservation.end_date.strftime("%Y-%m-%d"),
-        }
-        user_reservations_response = reservations_response_schema.load(reservation_dict)
+        row = reservation_listing_query(username).filter(Reservation.reservationUid == reservation_uid).first()
+        if not row:
+            return jsonify({"message": "Reservation not found"}), 404
+        user_reservations_response = reservation_response_schema.load(reservation_row_to_dict(row))
 
-        return jsonify(user_reservations_response), 200
+        return conditional_response(user_reservations_response)
     else:  # DELETE
+        reservation = Reservation.query.filter_by(reservationUid=reservation_uid, username=username).first()
+        if not reservation:
+            return jsonify({"message": "Reservation not found"}), 404
         reservation.status = "CANCELED"
         db.session.commit()
         return jsonify({"message": "Бронь успешно отменена"}), 204
@@ -154,6 +182,67 @@ def update_reservation(reservation_uid):
     return jsonify({"reservationUid": reservation_uid, "paymentUid": reservation.payment_uid}), 204
 
 
+HOTEL_COUNT_TTL = float(os.environ.get("HOTEL_COUNT_TTL", "60"))
+_hotel_count = {"value": None, "expires_at": 0.0}
+
+
+def hotel_count():
+    """Catalog size for totalElements, recounted at most once per HOTEL_COUNT_TTL seconds"""
+    now = time.monotonic()
+    if _hotel_count["value"] is None or now >= _hotel_count["expires_at"]:
+        _hotel_count["value"] = db.session.query(db.func.count(Hotel.id)).scalar()
+        _hotel_count["expires_at"] = now + HOTEL_COUNT_TTL
+    return _hotel_count["value"]
+
+
+def encode_cursor(last_id, page):
+    return base64.urlsafe_b64encode(f"{last_id}:{page}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        last_id, page = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(last_id), int(page)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def conditional_response(payload):
+    """JSON response with a strong content ETag; answers 304 when it matches If-None-Match"""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def reservation_listing_query(username):
+    """Reservations of a user joined with their hotel, selecting only the columns the response needs"""
+    return (
+        db.session.query(
+            Reservation.reservationUid,
+            Reservation.start_date,
+            Reservation.end_date,
+            Hotel.hotelUid,
+            Hotel.name,
+            Hotel.country,
+            Hotel.city,
+            Hotel.address,
+            Hotel.stars,
+        )
+        .join(Hotel, Reservation.hotel_id == Hotel.id)
+        .filter(Reservation.username == username)
+        .order_by(Reservation.id)
+    )
+
+
+def reservation_row_to_dict(row):
+    return {
+        "reservationUid": row.reservationUid,
+        "hotel": {"hotelUid": row.hotelUid, "name": row.name, "country": row.country, "city": row.city, "address": row.address, "stars": row.stars},
+        "startDate": row.start_date.strftime("%Y-%m-%d"),
+        "endDate": row.end_date.strftime("%Y-%m-%d"),
+    }
+
+
 def hotel_to_dict(hotel):
     return {
         "hotelUid": hotel.hotelUid,
@@ -180,7 +269,7 @@ def reservation_to_dict(reservation):
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        serving.upgrade_database(app, migrate.directory)
         hotels_data = [
             {
                 "hotelUid": "049161bb-badd-4fa8-9d90-87c9a82b0668",
@@ -238,4 +327,4 @@ if __name__ == "__main__":
             db.session.add(reservation)
 
         db.session.commit()
-    app.run(host="0.0.0.0", port=8070)
+    serving.serve(app, db, 8070)
@@ -0,0 +1,135 @@
+"""Query count and latency of GET /reservations for users with 10, 1k and 100k reservations.
+
+Compares the single-statement projection listing with the previous ORM implementation
+(full entities, per-row Hotel lookup, schema load of hotel.__dict__).
+
+    python benchmarks/bench_listing.py [--sizes 10,1000,100000] [--repeat 5]
+
+DATABASE_URL selects the database (a temporary SQLite file by default).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVICE_DIR, os.path.join(os.path.dirname(SERVICE_DIR), "common")]
+
+from flask import jsonify  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import app, db, Hotel, Reservation  # noqa: E402
+from schemas import ReservationResponseSchema  # noqa: E402
+
+
+def legacy_listing(username):
+    reservations_response_schema = ReservationResponseSchema(many=True)
+    user_reservations = Reservation.query.filter_by(username=username).options(joinedload(Reservation.hotel_relation)).all()
+    reservation_data = []
+    for reservation in user_reservations:
+        hotel = Hotel.query.get(reservation.hotel_id)
+        if not hotel:
+            continue
+        reservation_data.append(
+            {
+                "reservationUid": reservation.reservationUid,
+                "hotel": hotel.__dict__,
+                "startDate": reservation.start_date.strftime("%Y-%m-%d"),
+                "endDate": reservation.end_date.strftime("%Y-%m-%d"),
+            }
+        )
+    return jsonify(reservations_response_schema.load(reservation_data))
+
+
+def seed(sizes):
+    db.drop_all()
+    db.create_all()
+    hotels = [
+        Hotel(hotelUid=str(uuid.uuid4()), name=f"Hotel {i}", country="Country", city="City", address=f"{i} Street", stars=4, price=100)
+        for i in range(10)
+    ]
+    db.session.add_all(hotels)
+    db.session.commit()
+    hotel_ids = [hotel.id for hotel in hotels]
+    start = datetime(2024, 1, 1)
+    for size in sizes:
+        rows = [
+            {
+                "reservationUid": str(uuid.uuid4()),
+                "username": f"user-{size}",
+                "hotel_id": hotel_ids[i % len(hotel_ids)],
+                "status": "PAID",
+                "start_date": start,
+                "end_date": start + timedelta(days=3),
+            }
+            for i in range(size)
+        ]
+        db.session.execute(Reservation.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(func, repeat):
+    statements = []
+
+    def count(*args, **kwargs):
+        statements.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        timings = []
+        for _ in range(repeat):
+            db.session.expire_all()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+            db.session.remove()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return len(statements) / repeat, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with app.app_context():
+        seed(sizes)
+
+    print(f"{'reservations':>12} {'impl':>16} {'queries':>8} {'median ms':>10}")
+    for size in sizes:
+        username = f"user-{size}"
+        headers = {"X-User-Name": username}
+
+        def legacy():
+            with app.test_request_context("/reservations", headers=headers):
+                assert len(legacy_listing(username).json) == size
+
+        def projection():
+            with app.test_request_context("/reservations", headers=headers):
+                response, status = app.view_functions["reservations"]()
+                assert status == 200 and len(response.json) == size
+
+        def projection_page():
+            with app.test_request_context("/reservations?limit=100&offset=0", headers=headers):
+                response, status = app.view_functions["reservations"]()
+                assert status == 200 and len(response.json) == min(size, 100)
+
+        with app.app_context():
+            for name, func in (("legacy", legacy), ("projection", projection), ("projection limit", projection_page)):
+                queries, latency = measure(func, args.repeat)
+                print(f"{size:>12} {name:>16} {queries:>8.0f} {latency:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Initial schema, as previously created by db.create_all()
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "hotels",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("hotelUid", sa.String(length=36), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("country", sa.String(length=80), nullable=False),
+        sa.Column("city", sa.String(length=80), nullable=False),
+        sa.Column("address", sa.String(length=255), nullable=False),
+        sa.Column("stars", sa.Integer(), nullable=True),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("hotelUid"),
+    )
+    op.create_table(
+        "reservation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("reservationUid", sa.String(length=36), nullable=False),
+        sa.Column("username", sa.String(length=80), nullable=False),
+        sa.Column("paymentUid", sa.String(length=36), nullable=True),
+        sa.Column("hotel_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("start_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["hotel_id"], ["hotels.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("reservationUid"),
+    )
+
+
+def downgrade():
+    op.drop_table("reservation")
+    op.drop_table("hotels")
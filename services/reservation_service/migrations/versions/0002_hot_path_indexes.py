@@ -0,0 +1,23 @@
+"""Index the per-user reservation listing
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial
+Create Date: 2026-10-18 10:05:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_hot_path_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_reservation_username_id", "reservation", ["username", "id"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_reservation_username_id", table_name="reservation")
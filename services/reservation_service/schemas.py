@@ -65,14 +65,6 @@ class ReservationResponseSchema(Schema):
     startDate = fields.Date(format="%Y-%m-%d")
     endDate = fields.Date(format="%Y-%m-%d")
 
-    @post_load
-    def change_dates_to_str(self, data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-
-        data["startDate"] = data["startDate"].strftime("%Y-%m-%d")
-        data["endDate"] = data["endDate"].strftime("%Y-%m-%d")
-
-        return data
-
 
 class CreateReservationRequestSchema(Schema):
     class Meta:
@@ -92,11 +84,3 @@ class CreateReservationResponseSchema(Schema):
     price = fields.Integer()
     startDate = fields.Date(format="%Y-%m-%d", required=True)
     endDate = fields.Date(format="%Y-%m-%d", required=True)
-
-    @post_load
-    def change_dates_to_str(self, data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-
-        data["startDate"] = data["startDate"].strftime("%Y-%m-%d")
-        data["endDate"] = data["endDate"].strftime("%Y-%m-%d")
-
-        return data
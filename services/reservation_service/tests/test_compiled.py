@@ -0,0 +1,38 @@
+import uuid
+from datetime import datetime
+
+from app import Hotel, Reservation, db
+from compiled import CompiledSchema
+from schemas import ReservationResponseSchema
+
+
+def test_trusted_listing_has_the_wire_format_of_the_schema_load(client):
+    hotel = Hotel(hotelUid=str(uuid.uuid4()), name="Ararat Park Hyatt", country="Россия", city="Москва", address="Неглинная ул., 4", stars=5, price=10000)
+    db.session.add(hotel)
+    db.session.flush()
+    db.session.add(
+        Reservation(
+            reservationUid=str(uuid.uuid4()), username="user", hotel_id=hotel.id, status="PAID", start_date=datetime(2026, 3, 1), end_date=datetime(2026, 3, 5)
+        )
+    )
+    db.session.commit()
+
+    listing = client.get("/reservations", headers={"X-User-Name": "user"})
+    reservation = client.get(f"/reservations/{listing.get_json()[0]['reservationUid']}", headers={"X-User-Name": "user"})
+
+    assert listing.get_json()[0] == reservation.get_json()
+    assert set(reservation.get_json()) == {"reservationUid", "hotel", "startDate", "endDate"}
+    assert set(reservation.get_json()["hotel"]) == {"hotelUid", "name", "fullAddress", "stars"}
+    assert reservation.get_json()["hotel"]["fullAddress"] == "Россия, Москва, Неглинная ул., 4"
+    assert reservation.get_json()["startDate"] == "2026-03-01"
+
+
+def test_compiled_load_matches_schema_load():
+    row = {
+        "reservationUid": str(uuid.uuid4()),
+        "hotel": {"hotelUid": str(uuid.uuid4()), "name": "Hotel", "country": "Country", "city": "City", "address": "1 Street", "stars": 4},
+        "startDate": "2026-03-01",
+        "endDate": "2026-03-05",
+    }
+    assert CompiledSchema(ReservationResponseSchema()).load(row) == ReservationResponseSchema().load(row)
+    assert CompiledSchema(ReservationResponseSchema(many=True)).load([row]) == ReservationResponseSchema(many=True).load([row])
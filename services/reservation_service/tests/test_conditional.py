@@ -0,0 +1,28 @@
+import uuid
+from datetime import datetime
+
+from app import Hotel, Reservation, db
+
+
+def test_reservations_are_not_modified_until_they_change(client):
+    hotel = Hotel(hotelUid=str(uuid.uuid4()), name="Ararat Park Hyatt", country="Россия", city="Москва", address="Неглинная ул., 4", stars=5, price=10000)
+    db.session.add(hotel)
+    db.session.flush()
+    reservation_uid = str(uuid.uuid4())
+    db.session.add(
+        Reservation(reservationUid=reservation_uid, username="user", hotel_id=hotel.id, start_date=datetime(2026, 3, 1), end_date=datetime(2026, 3, 5))
+    )
+    db.session.commit()
+    headers = {"X-User-Name": "user"}
+
+    for path in ("/reservations", f"/reservations/{reservation_uid}"):
+        listing = client.get(path, headers=headers)
+        assert listing.headers["ETag"]
+        unchanged = client.get(path, headers=dict(headers, **{"If-None-Match": listing.headers["ETag"]}))
+        assert unchanged.status_code == 304
+        assert unchanged.headers["ETag"] == listing.headers["ETag"]
+
+    listing = client.get("/reservations", headers=headers)
+    client.post("/reservations", headers=headers, json={"hotelUid": hotel.hotelUid, "startDate": "2026-04-01", "endDate": "2026-04-03"})
+    changed = client.get("/reservations", headers=dict(headers, **{"If-None-Match": listing.headers["ETag"]}))
+    assert changed.status_code == 200
@@ -0,0 +1,8 @@
+def test_spent_budget_is_not_served(client):
+    response = client.get("/hotels", headers={"X-Request-Deadline-Ms": "0"})
+    assert response.status_code == 504
+
+
+def test_remaining_budget_is_served(client):
+    response = client.get("/hotels", headers={"X-Request-Deadline-Ms": "5000"})
+    assert response.status_code == 200
@@ -0,0 +1,5 @@
+def test_requests_and_queries_are_measured(client):
+    client.get("/hotels")
+    page = client.get("/manage/metrics").get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/hotels",status="200"}' in page
+    assert 'db_query_duration_seconds_count{statement="SELECT"}' in page
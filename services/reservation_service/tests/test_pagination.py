@@ -0,0 +1,29 @@
+import uuid
+
+from app import Hotel, db
+
+
+def add_hotels(count):
+    for index in range(count):
+        db.session.add(Hotel(hotelUid=str(uuid.uuid4()), name=f"Hotel {index}", country="Россия", city="Москва", address="Тверская ул., 3", stars=4, price=5000))
+    db.session.commit()
+
+
+def test_last_page_has_no_next_cursor(client):
+    add_hotels(4)
+
+    first = client.get("/hotels?page=1&size=2").json
+    assert len(first["items"]) == 2 and first["nextCursor"]
+    # A full last page: nothing comes after it
+    last = client.get("/hotels?page=2&size=2").json
+    assert len(last["items"]) == 2 and last["nextCursor"] is None
+    assert client.get("/hotels?page=1&size=4").json["nextCursor"] is None
+
+    following = client.get(f"/hotels?size=2&after={first['nextCursor']}").json
+    assert following["items"] == last["items"] and following["nextCursor"] is None
+
+
+def test_pages_past_the_end_are_not_found(client):
+    add_hotels(1)
+    assert client.get("/hotels?page=3&size=2").status_code == 404
+    assert client.get("/hotels?page=1&size=2").json["nextCursor"] is None
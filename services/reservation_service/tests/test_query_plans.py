@@ -0,0 +1,63 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app import Hotel, Reservation, db, encode_cursor, hotel_count
+
+
+@pytest.fixture
+def seeded(app):
+    hotels = [
+        Hotel(hotelUid=str(uuid.uuid4()), name=f"Hotel {i}", country="Country", city="City", address=f"{i} Street", stars=4, price=100 + i)
+        for i in range(20)
+    ]
+    db.session.add_all(hotels)
+    db.session.flush()
+    reservations = [
+        Reservation(
+            reservationUid=str(uuid.uuid4()),
+            username=f"user-{i % 5}",
+            hotel_id=hotels[i % len(hotels)].id,
+            status="PAID",
+            start_date=datetime(2026, 1, 1),
+            end_date=datetime(2026, 1, 5),
+        )
+        for i in range(50)
+    ]
+    db.session.add_all(reservations)
+    db.session.commit()
+    # totalElements is a deliberate full count, cached outside the hot path
+    hotel_count()
+    return hotels, reservations
+
+
+def test_migrations_create_the_listing_index(app):
+    indexes = {index["name"]: index["column_names"] for index in db.inspect(db.engine).get_indexes("reservation")}
+    assert indexes["ix_reservation_username_id"] == ["username", "id"]
+
+
+@pytest.mark.parametrize(
+    "request_for",
+    [
+        pytest.param(lambda client, hotels, reservation: client.get("/reservations", headers={"X-User-Name": "user-1"}), id="listing"),
+        pytest.param(
+            lambda client, hotels, reservation: client.get("/reservations", query_string={"limit": 5}, headers={"X-User-Name": "user-1"}),
+            id="listing-limit",
+        ),
+        pytest.param(
+            lambda client, hotels, reservation: client.get(f"/reservations/{reservation.reservationUid}", headers={"X-User-Name": reservation.username}),
+            id="reservation",
+        ),
+        pytest.param(lambda client, hotels, reservation: client.get(f"/hotels/{hotels[3].hotelUid}"), id="hotel"),
+        pytest.param(lambda client, hotels, reservation: client.get("/hotels", query_string={"after": encode_cursor(hotels[4].id, 1), "size": 5}), id="hotels-after"),
+        pytest.param(
+            lambda client, hotels, reservation: client.delete(f"/reservations/{reservation.reservationUid}", headers={"X-User-Name": reservation.username}),
+            id="cancel",
+        ),
+    ],
+)
+def test_hot_queries_use_an_index(client, seeded, sequential_scans, request_for):
+    hotels, reservations = seeded
+    reservation = reservations[6]
+    assert sequential_scans(lambda: request_for(client, hotels, reservation).close()) == []